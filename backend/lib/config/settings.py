@@ -41,12 +41,159 @@ class AppSettings(BaseSettings):
         default=10, description="Compilation timeout in seconds"
     )
     max_input_kb: int = Field(default=100, description="Maximum input size in KB")
+    disconnect_cancel_grace: float = Field(
+        default=5.0,
+        description="Seconds a disconnected client has to resume before its job is cancelled",
+    )
+
+    # Compile Profile Configuration
+    # Unset profile timeouts fall back to compilation_timeout / execution_timeout
+    compile_profile: str = Field(
+        default="fast", description="Default compile profile: fast or optimized"
+    )
+    fast_compile_timeout: Optional[int] = Field(
+        default=None, description="Compilation timeout of the fast profile"
+    )
+    fast_execution_timeout: Optional[int] = Field(
+        default=None, description="Execution timeout of the fast profile"
+    )
+    optimized_compile_timeout: Optional[int] = Field(
+        default=30, description="Compilation timeout of the optimized profile"
+    )
+    optimized_execution_timeout: Optional[int] = Field(
+        default=None, description="Execution timeout of the optimized profile"
+    )
+
+    # Sandbox Configuration
+    sandbox_backend: str = Field(
+        default="firejail",
+        description="Sandbox backend: firejail, bubblewrap, unshare or none (dev only)",
+    )
+    firejail_profile: str = Field(
+        default="/etc/firejail/sandbox.profile", description="Firejail profile path"
+    )
+
+    # cgroup v2 Configuration
+    # Delegated cgroup holding one child per job, unset falls back to rlimits
+    cgroup_root: Optional[str] = Field(
+        default=None, description="cgroup v2 directory for per-job cgroups"
+    )
+    cgroup_cpus: float = Field(default=1.0, description="CPUs per job (cpu.max)")
+    cgroup_max_processes: int = Field(
+        default=60, description="Processes per job (pids.max)"
+    )
+    sandbox_max_processes: int = Field(
+        default=60,
+        description="Processes per job without cgroups (RLIMIT_NPROC, per user: "
+        "concurrent jobs share it)",
+    )
+
+    # Precompiled Header Configuration
+    # Bundles are ';'-separated, headers within a bundle ','-separated. A bundle is
+    # only used for programs including exactly its headers (or bits/stdc++.h).
+    pch_enabled: bool = Field(
+        default=True, description="Precompile common C/C++ header bundles"
+    )
+    pch_dir: str = Field(
+        default="/tmp/codr-pch", description="Precompiled header directory"
+    )
+    pch_cpp_bundles: str = Field(
+        default=(
+            "bits/stdc++.h;iostream;iostream,string;iostream,vector;"
+            "iostream,string,vector;iostream,vector,algorithm"
+        ),
+        description="C++ header bundles to precompile",
+    )
+    pch_c_bundles: str = Field(
+        default="stdio.h;stdio.h,stdlib.h;stdio.h,string.h;stdio.h,stdlib.h,string.h",
+        description="C header bundles to precompile",
+    )
+
+    # Compiled Artifact Cache Configuration
+    artifact_cache_enabled: bool = Field(
+        default=True, description="Reuse binaries of byte-identical submissions"
+    )
+    artifact_cache_dir: str = Field(
+        default="/tmp/codr-artifacts", description="Compiled artifact cache directory"
+    )
+    artifact_cache_max_mb: int = Field(
+        default=512, description="Maximum artifact cache size in MB (LRU eviction)"
+    )
+    artifact_cache_failure_ttl: int = Field(
+        default=300, description="Seconds a compile failure stays cached"
+    )
+
+    # Workspace Configuration
+    # Point the root at a size-capped tmpfs, the size caps all workspaces together
+    workspace_root: str = Field(
+        default="/dev/shm/codr-workspaces", description="Directory holding job workspaces"
+    )
+    workspace_pool_size: int = Field(
+        default=4, description="Empty workspaces kept ready per worker"
+    )
+    workspace_quota_mb: int = Field(
+        default=64, description="Disk quota per workspace in MB, 0 disables"
+    )
+    workspace_quota_check_ms: int = Field(
+        default=200, description="Interval between workspace quota checks"
+    )
+
+    # Resource Accounting Configuration
+    resource_sample_interval_ms: int = Field(
+        default=0, description="Live /proc resource sampling interval, 0 disables"
+    )
+    resource_max_samples: int = Field(
+        default=300, description="Maximum live resource samples kept per job"
+    )
+
+    # Warm Pool Configuration
+    # Pre-spawned sandboxed interpreters kept per worker, 0 disables
+    warm_pool_python: int = Field(
+        default=2, description="Parked Python interpreters per worker"
+    )
+    warm_pool_javascript: int = Field(
+        default=1, description="Parked Node.js interpreters per worker"
+    )
+
+    # Execution Engine Configuration
+    execution_engine: str = Field(
+        default="inline",
+        description="Where jobs run: 'inline' (worker event loop) or 'process' (engine pool)",
+    )
+    engine_processes: int = Field(
+        default=0, description="Engine processes per worker, 0 for one per CPU"
+    )
+
+    # Output Streaming Configuration
+    output_batch_bytes: int = Field(
+        default=16384, description="Flush a job's buffered output at this size"
+    )
+    output_flush_interval_ms: int = Field(
+        default=20, description="Maximum delay before buffered output is published"
+    )
+    output_buffer_max_kb: int = Field(
+        default=1024, description="Worker output buffer size before producers pause"
+    )
+    output_capture_mode: str = Field(
+        default="stream",
+        description="Output kept in ExecutionResult.stdout: 'stream' (none) or 'ring'",
+    )
+    output_capture_kb: int = Field(
+        default=64, description="Head + tail bytes kept in 'ring' capture mode"
+    )
 
     # Redis Configuration
     redis_url: str = Field(
         default="redis://localhost:6379/0", description="Redis connection URL"
     )
     redis_ttl: int = Field(default=3600, description="Job TTL in seconds")
+    output_log_max_entries: int = Field(
+        default=1000, description="Messages kept in a job's output log for replay"
+    )
+    node_id: Optional[str] = Field(
+        default=None,
+        description="WebSocket node identifier for output routing (auto-generated if not set)",
+    )
 
     # Polling Configuration
     max_poll_attempts: int = Field(default=60, description="Maximum polling attempts")
@@ -67,10 +214,56 @@ class AppSettings(BaseSettings):
     worker_poll_timeout: int = Field(
         default=5, description="Worker queue poll timeout in seconds"
     )
+    worker_concurrency: int = Field(
+        default=1,
+        description="Jobs executed concurrently by one worker, each may use "
+        "max_memory_mb (raise with the machine's memory, or with cgroups)",
+    )
+    queue_weight_interactive: int = Field(
+        default=8, description="Dequeue weight of interactive jobs"
+    )
+    queue_weight_batch: int = Field(
+        default=1, description="Dequeue weight of batch jobs"
+    )
+    worker_affinity: str = Field(
+        default="", description="Comma-separated languages this worker prefers"
+    )
+    worker_affinity_weight: int = Field(
+        default=4, description="Dequeue weight multiplier for the worker's languages"
+    )
+    worker_heartbeat_interval: float = Field(
+        default=2.0, description="Seconds between worker heartbeats"
+    )
+    worker_heartbeat_ttl: int = Field(
+        default=10, description="Seconds without a heartbeat before a worker's jobs are recovered"
+    )
+    queue_reap_interval: float = Field(
+        default=5.0, description="Seconds between checks for jobs of dead workers"
+    )
+    job_max_attempts: int = Field(
+        default=2, description="Deliveries of a job before it is failed instead of retried"
+    )
     worker_id: Optional[str] = Field(
         default=None, description="Worker identifier (auto-generated if not set)"
     )
-    max_queue_size: int = Field(default=1000, description="Maximum job queue size")
+    max_queue_size: int = Field(
+        default=1000, description="Submissions are refused once this many jobs are queued"
+    )
+    tenant_max_running: int = Field(
+        default=4, description="Jobs one client may run at once, others wait (0 disables)"
+    )
+    tenant_header: str = Field(
+        default="X-Client-IP",
+        description="Header the frontend proxy names the end user's address in, "
+        "trusted on job creation as it comes with the API key",
+    )
+    max_queue_wait_seconds: float = Field(
+        default=120.0,
+        description="Submissions are refused when the estimated wait is longer (0 disables)",
+    )
+    queue_status_interval: float = Field(
+        default=2.0, description="Seconds between queue position updates to waiting clients"
+    )
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
@@ -80,6 +273,14 @@ class AppSettings(BaseSettings):
             return ["*"]
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
+    def get_worker_affinity_list(self) -> List[str]:
+        """Parse worker affinity from comma-separated string"""
+        return [
+            language.strip().lower()
+            for language in self.worker_affinity.split(",")
+            if language.strip()
+        ]
+
 
 @lru_cache()
 def get_settings() -> AppSettings:
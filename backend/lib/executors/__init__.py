@@ -1,9 +1,12 @@
+from typing import Optional
+
 from .base import BaseExecutor
 from .python import PythonExecutor
 from .javascript import JavaScriptExecutor
 from .rust import RustExecutor
 from .c import CExecutor
 from .cpp import CppExecutor
+from .sandbox import SandboxBackend, get_sandbox_backend
 
 EXECUTORS = {
     "python": PythonExecutor,
@@ -27,18 +30,24 @@ def get_default_filename(language: str) -> str:
     return f"main{LANGUAGE_EXTENSIONS.get(language, '.txt')}"
 
 
-def get_executor(language: str) -> BaseExecutor:
+def get_executor(
+    language: str,
+    sandbox: Optional[SandboxBackend] = None,
+    profile: Optional[str] = None,
+) -> BaseExecutor:
     """
     Get executor instance for the specified language
 
     Args:
         language: Programming language name (lowercase)
+        sandbox: Sandbox backend, defaults to settings.sandbox_backend
+        profile: Compile profile (fast, optimized), defaults to settings.compile_profile
 
     Returns:
         BaseExecutor instance for the language
 
     Raises:
-        ValueError: If language is not supported
+        ValueError: If language or compile profile is not supported
     """
     language = language.lower().strip()
     executor_class = EXECUTORS.get(language)
@@ -49,7 +58,7 @@ def get_executor(language: str) -> BaseExecutor:
             f"Unsupported language: {language}. " f"Supported languages: {supported}"
         )
 
-    return executor_class()  # type: ignore[abstract]
+    return executor_class(sandbox, profile)  # type: ignore[abstract]
 
 
 def get_supported_languages() -> set:
@@ -69,6 +78,8 @@ def get_supported_languages() -> set:
 
 __all__ = [
     "BaseExecutor",
+    "SandboxBackend",
+    "get_sandbox_backend",
     "get_executor",
     "get_supported_languages",
     "get_default_filename",
@@ -0,0 +1,227 @@
+"""
+Content-addressed cache of compiled binaries
+
+Keyed by a hash of (source, filename, compiler, compiler version, flags), so
+a byte-identical rerun skips compilation entirely. Compile failures are
+cached too (negative entries) with their error output, for failure_ttl
+seconds from when they were stored: only real diagnostics are cached (see
+CompiledExecutor), but a toolchain upgrade or a flaky host should not keep
+a source failing until it is evicted.
+
+Layout on disk:
+    <root>/<key[:2]>/<key>.bin   compiled binary
+    <root>/<key[:2]>/<key>.err   compiler error output
+
+Entries are written atomically (temp file + os.replace) so several worker
+processes can share one cache directory. Least recently used entries (by
+mtime, refreshed on every hit) are evicted once the cache exceeds its size
+limit.
+
+Binaries are copied into the job workspace rather than hard linked, a
+sandboxed program must never be able to modify the cached copy. The copy
+happens in get(): another process may evict an entry at any time, and an
+entry gone before it was copied is a miss.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from lib.config import get_settings
+from lib.logger import log
+
+
+@dataclass
+class CachedArtifact:
+    """A cache hit: either a compiled binary or a compile error"""
+
+    binary_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def get_compiler_version(compiler: str) -> str:
+    """First line of `<compiler> --version`, cached for the process lifetime"""
+    try:
+        result = subprocess.run(
+            [compiler, "--version"], capture_output=True, text=True, timeout=10
+        )
+        return result.stdout.splitlines()[0] if result.stdout else ""
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+class ArtifactCache:
+
+    def __init__(self, root: str, max_bytes: int, failure_ttl: float = 300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.failure_hits = 0
+        self.evictions = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._size = self._scan_size()
+
+    def make_key(
+        self, source: bytes, filename: str, compiler: str, flags: List[str]
+    ) -> str:
+        digest = hashlib.sha256()
+        for part in (compiler, get_compiler_version(compiler), filename, *flags):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key: str, destination: str) -> Optional[CachedArtifact]:
+        """Look up an entry, copying a cached binary to destination"""
+        binary_path = self._path(key, ".bin")
+        error_path = self._path(key, ".err")
+
+        try:
+            os.utime(binary_path)
+            shutil.copyfile(binary_path, destination)
+            os.chmod(destination, 0o755)
+            with self._lock:
+                self.hits += 1
+            return CachedArtifact(binary_path=destination)
+        except FileNotFoundError:
+            pass
+
+        try:
+            # Not refreshed on hits, the ttl counts from when it was stored
+            if time.time() - os.path.getmtime(error_path) <= self.failure_ttl:
+                with open(error_path, encoding="utf-8") as f:
+                    error = f.read()
+                with self._lock:
+                    self.failure_hits += 1
+                return CachedArtifact(error=error)
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put_binary(self, key: str, binary_path: str) -> None:
+        self._store(key, ".bin", lambda tmp: shutil.copyfile(binary_path, tmp))
+
+    def put_failure(self, key: str, error: str) -> None:
+        def write(tmp: str):
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(error)
+
+        self._store(key, ".err", write)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "failure_hits": self.failure_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+        }
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _store(self, key: str, suffix: str, write) -> None:
+        path = self._path(key, suffix)
+        directory = os.path.dirname(path)
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(fd)
+            try:
+                write(tmp)
+                os.chmod(tmp, 0o755)
+                size = os.path.getsize(tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            # A full or read-only cache must never fail the job
+            log.warning(f"Failed to store compiled artifact {key[:12]}: {e}")
+            return
+
+        with self._lock:
+            self._size += size
+            over_limit = self._size > self.max_bytes
+
+        if over_limit:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until under 90% of the limit"""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith((".bin", ".err")):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+        with self._lock:
+            self._size = total
+
+    def _scan_size(self) -> int:
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+        return total
+
+
+# Singleton instance
+_artifact_cache: Optional[ArtifactCache] = None
+
+
+def get_artifact_cache() -> Optional[ArtifactCache]:
+    """Get or create the ArtifactCache singleton, None if caching is disabled"""
+    global _artifact_cache
+    settings = get_settings()
+    if not settings.artifact_cache_enabled:
+        return None
+    if _artifact_cache is None:
+        _artifact_cache = ArtifactCache(
+            settings.artifact_cache_dir,
+            settings.artifact_cache_max_mb * 1024 * 1024,
+            settings.artifact_cache_failure_ttl,
+        )
+    return _artifact_cache
@@ -1,56 +1,103 @@
-import subprocess
+import asyncio
 import os
-import tempfile
 import re
 import time
 import traceback
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Callable
+from typing import Awaitable, List, Callable, Optional, Tuple
 
 from lib.config import get_settings
-from lib.logger import log
-from lib.models import ExecutionResult
-from lib.utils import format_error_message
+from lib.models import ExecutionResult, ResourceSample
+from lib.utils import OutputStreamProcessor
+from .cgroups import JobCgroup, get_cgroup_controller
+from .output_capture import OutputCapture
+from .pty_session import PtySession
+from .resource_monitor import ProcessTreeSampler, usage_from_rusage
+from .sandbox import SandboxBackend, SandboxLimits, get_sandbox_backend
+from .warm_pool import WarmProcess, get_warm_pool
+from .workspace_pool import Workspace, get_workspace_pool
 
 
 class BaseExecutor(ABC):
     """Base class for language-specific code executors"""
 
-    def __init__(self):
+    # Language name, used to format tracebacks in the output stream
+    language: str = ""
+
+    # Whether memory can be limited with RLIMIT_AS when cgroups are not in use.
+    # Runtimes reserving far more virtual memory than they use opt out.
+    rlimit_address_space = True
+
+    def __init__(
+        self, sandbox: Optional[SandboxBackend] = None, profile: Optional[str] = None
+    ):
+        """
+        Args:
+            sandbox: Sandbox backend, defaults to settings.sandbox_backend
+            profile: Compile profile name, only used by compiled languages
+        """
         settings = get_settings()
+        self.sandbox = sandbox or get_sandbox_backend()
         self.timeout = settings.execution_timeout
         self.maxMemory = settings.max_memory_mb
         self.maxFileSize = settings.max_file_size_mb
         self.env = settings.env
 
-    def execute(
+    async def execute(
         self,
         code: str,
         filename: str,
-        on_output: Callable[[bytes], None],
-        input_queue: Any,
+        on_output: Callable[[str], None],
+        on_start: Optional[Callable[[PtySession], None]] = None,
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]] = None,
     ) -> ExecutionResult:
         """
-        Execute code with PTY streaming
+        Execute code with PTY streaming on the running event loop
 
         Args:
             code: Source code to execute
             filename: Filename for the code
-            on_output: Callback function(data) called with raw PTY output
-            input_queue: Queue to get user input from
+            on_output: Callback function(text) called with cleaned PTY output
+            on_start: Callback receiving the PtySession once the process is
+                running, used to write user input straight to the PTY
+            on_sample: Async callback receiving live resource samples, only
+                called when settings.resource_sample_interval_ms is set
 
         Returns:
-            {"success": bool, "exit_code": int, "execution_time": float}
+            {"success": bool, "exit_code": int, "execution_time": float,
+             "resources": {...}}
         """
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Ensure directory is writable (verified for Firejail compatibility)
-            if not os.path.isdir(tmpdir):
-                raise RuntimeError(f"Workspace {tmpdir} not created")
+        workspaces = get_workspace_pool()
 
-            filepath = self._writeToFile(tmpdir, code, filename)
-            command = self._build_command(filepath, tmpdir)
-            result = self._execute_pty(command, tmpdir, on_output, input_queue)
-            return result
+        pool = get_warm_pool()
+        warm = pool.acquire(self.language) if pool else None
+        if warm:
+            try:
+                filepath = self._writeToFile(warm.workdir, code, filename)
+            except BaseException:
+                # Not handed to _execute_pty yet, which tears the sandbox down
+                await warm.discard()
+                raise
+            try:
+                return await self._execute_pty(
+                    [filepath], warm.workspace, on_output, on_start, on_sample, warm
+                )
+            finally:
+                workspaces.release(warm.workspace)
+
+        # Wiped in the background once the job is done
+        workspace = workspaces.acquire()
+        try:
+            filepath = self._writeToFile(workspace.path, code, filename)
+            # Compilation is blocking, keep it off the event loop
+            command = await asyncio.to_thread(
+                self._build_command, filepath, workspace.path
+            )
+            return await self._execute_pty(
+                command, workspace, on_output, on_start, on_sample
+            )
+        finally:
+            workspaces.release(workspace)
 
     def _writeToFile(self, tmpDir: str, code: str, filename: str) -> str:
         """
@@ -77,42 +124,75 @@ class BaseExecutor(ABC):
         if ".." in filename or filename.startswith("/"):
             raise ValueError(f"Invalid filename: {filename}")
 
-    def _build_sandbox_command(self, command: List[str], workdir: str) -> List[str]:
+    def _build_warm_command(self) -> Optional[List[str]]:
         """
-        Build Firejail sandbox command with security restrictions
+        Bootstrap command for a pre-spawned interpreter, None if unsupported
 
-        Args:
-            command: Command to execute
-            workdir: Working directory
+        The bootstrap reads the script path as the first line of its input,
+        then runs that script as if it had been started directly.
+        """
+        return None
+
+    def spawn_warm_process(self) -> Optional[WarmProcess]:
+        """Start a sandboxed interpreter parked on the warm bootstrap"""
+        command = self._build_warm_command()
+        if command is None:
+            return None
+
+        workspaces = get_workspace_pool()
+        workspace = workspaces.acquire()
+        # Parked processes have no wall timeout, the session enforces it once used
+        session, cgroup = self._create_session(
+            command, workspace.path, wall_timeout=False
+        )
+        try:
+            session.start()
+        except Exception:
+            workspaces.release(workspace)
+            if cgroup:
+                cgroup.release()
+            raise
+        return WarmProcess(self.language, workspace, session, cgroup)
+
+    def _sandbox_limits(
+        self, wall_timeout: bool = True, cgroup: bool = False
+    ) -> SandboxLimits:
+        """
+        Resource limits applied by the sandbox
 
-        Returns:
-            Complete firejail command with restrictions
+        Args:
+            wall_timeout: Let the sandbox kill the program after the timeout
+            cgroup: Memory and processes are already limited by the job's cgroup
         """
+        limit_memory = self.rlimit_address_space and not cgroup
+
+        return SandboxLimits(
+            cpu_seconds=self.timeout,
+            file_size_bytes=self.maxFileSize * 1024 * 1024,
+            # Per user: the job's own with one slot, shared by concurrent jobs
+            max_processes=None if cgroup else get_settings().sandbox_max_processes,
+            memory_bytes=self.maxMemory * 1024 * 1024 if limit_memory else None,
+            wall_timeout=self.timeout if wall_timeout else None,
+        )
 
+    def _create_session(
+        self, command: List[str], workdir: str, wall_timeout: bool = True
+    ) -> Tuple[PtySession, Optional[JobCgroup]]:
+        """PTY session running command inside the configured sandbox and cgroup"""
+        controller = get_cgroup_controller()
+        cgroup = controller.create() if controller else None
 
-        base_cmd = [
-            "/usr/bin/firejail",
-            "--quiet", # Suppress warning that were in docker container
-            "--profile=/etc/firejail/sandbox.profile",
-            "--nodbus",
-            f"--private={workdir}",  # Isolated workspace (files only in this tmpdir)
-            f"--rlimit-cpu={self.timeout}",
-            f"--rlimit-fsize={self.maxFileSize * 1024 * 1024}",
-            f"--rlimit-nproc=60",   # Allow 60 processes for threading/concurrency
-            f"--timeout=00:00:{self.timeout:02d}",
-        ] 
-
-        # Js/Node needs more waaay more vram than other languages. 
-        is_javascript = any(
-            keyword in cmd.lower() 
-            for cmd in command 
-            for keyword in ['node', 'nodejs', 'javascript']
-        )
+        limits = self._sandbox_limits(wall_timeout, cgroup=cgroup is not None)
+        launch = self.sandbox.wrap(command, workdir, limits)
 
-        if not is_javascript:
-            base_cmd.append(f"--rlimit-as={self.maxMemory * 1024 * 1024}")
-        
-        return base_cmd + command
+        def preexec():
+            if cgroup:
+                cgroup.join()
+            if launch.preexec_fn:
+                launch.preexec_fn()
+
+        session = PtySession(launch.command, workdir, preexec_fn=preexec)
+        return session, cgroup
 
     def _format_error_result(
         self, error: Exception, execution_time: float
@@ -125,90 +205,120 @@ class BaseExecutor(ABC):
             execution_time=execution_time,
         )
 
-    def _execute_pty(
+    async def _execute_pty(
         self,
         command: List[str],
-        workdir: str,
-        on_output: Callable[[bytes], None],
-        input_queue: Any,
-    ) -> Dict[str, Any]:
-        import pty
-        import select
-        import os
-        import fcntl
-        import struct
-        import termios
+        workspace: Workspace,
+        on_output: Callable[[str], None],
+        on_start: Optional[Callable[[PtySession], None]] = None,
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]] = None,
+        warm: Optional[WarmProcess] = None,
+    ) -> ExecutionResult:
+        """
+        Run a command in the sandbox, streaming its output
+
+        With a warm process, command is [script path] and is handed to the
+        already running interpreter instead of spawning a new sandbox.
+        """
 
+        workdir = workspace.path
         start_time = time.time()
+        capture = OutputCapture.from_settings()
+        processor = OutputStreamProcessor(self.language, workdir)
+        echoed = 0  # Bytes of the warm activation line echoed by the PTY
+        output_bytes = 0
+        loop = asyncio.get_running_loop()
+        stale_timer: Optional[asyncio.TimerHandle] = None
+
+        def flush_stale():
+            nonlocal stale_timer
+            stale_timer = None
+            text = processor.flush_stale()
+            if text:
+                on_output(text)
+            watch_stale()
+
+        def watch_stale():
+            # Output held for what may not be a traceback is released shortly
+            nonlocal stale_timer
+            if stale_timer is None and processor.holds_unconfirmed:
+                stale_timer = loop.call_later(processor.UNCONFIRMED_TIMEOUT, flush_stale)
+
+        def handle_output(data: memoryview):
+            nonlocal echoed, output_bytes
+            if echoed:
+                skipped = min(echoed, len(data))
+                echoed -= skipped
+                data = data[skipped:]
+                if not data:
+                    return
+
+            output_bytes += len(data)
+            capture.append(data)
+            text = processor.feed(data)
+            if text:
+                on_output(text)
+            watch_stale()
+
+        if warm:
+            session, cgroup = warm.session, warm.cgroup
+        else:
+            session, cgroup = self._create_session(command, workdir)
+        session.on_output = handle_output
+        quota_task: Optional[asyncio.Task] = None
+        sampler: Optional[ProcessTreeSampler] = None
+        sampler_task: Optional[asyncio.Task] = None
 
         try:
-            master_fd, slave_fd = pty.openpty()
-            winsize = struct.pack("HHHH", 24, 80, 0, 0)
-            fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, winsize)
-
-            sandbox_command = self._build_sandbox_command(command, workdir)
-            process = subprocess.Popen(
-                sandbox_command,
-                stdin=slave_fd,
-                stdout=slave_fd,
-                stderr=slave_fd,
-                cwd=workdir,
-                preexec_fn=os.setsid,
-            )
-
-            os.close(slave_fd)
-            flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
-            fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
-            complete_output = b""
-
-            while True:
-                # Check for PTY output
-                readable, _, _ = select.select([master_fd], [], [], 0.01)
-
-                if master_fd in readable:
-                    try:
-                        data = os.read(master_fd, 4096)
-                        if data:
-                            complete_output += data
-                            cleaned_data = self._clean_output(data, workdir)
-                            on_output(cleaned_data.encode("utf-8"))
-                        else:
-                            break # Break early to not wait for cleanup
-                    except OSError:
-                        break
-
-                # Check for user input
-                try:
-                    user_input = input_queue.get_nowait()
-                    os.write(master_fd, user_input.encode("utf-8"))
-                except Exception:
-                    pass
-
-                # Safety timeout
-                if time.time() - start_time > self.timeout:
-                    process.kill()
-                    break
-
-            os.close(master_fd)
-            
-            # Wait for process cleanup (but don't block UI on this)
-            # Use a short timeout so Firejail cleanup doesn't delay response
-            try:
-                process.wait(timeout=0.5)  # ← Give it 500ms max
-            except subprocess.TimeoutExpired:
-                process.kill()  # Force kill if still cleaning up
-                process.wait()
+            if warm:
+                echoed = warm.activate(command[0])
+            else:
+                session.start()
+            if on_start:
+                on_start(session)
+            if workspace.quota_bytes:
+                quota_task = asyncio.create_task(
+                    self._enforce_quota(session, workspace, on_output)
+                )
+            settings = get_settings()
+            if settings.resource_sample_interval_ms and session.process:
+                sampler = ProcessTreeSampler(
+                    session.process.pid,
+                    settings.resource_sample_interval_ms / 1000,
+                    settings.resource_max_samples,
+                    on_sample,
+                )
+                sampler_task = asyncio.create_task(sampler.run())
 
+            return_code = await session.wait(self.timeout)
             execution_time = time.time() - start_time
-            return_code = process.returncode if process.returncode is not None else -1
+            if sampler_task:
+                sampler_task.cancel()
+            if stale_timer:
+                stale_timer.cancel()
+                stale_timer = None
+
+            # Tracebacks and partial sequences held back until the end
+            remaining = processor.finish()
+            if remaining:
+                on_output(remaining)
 
             return ExecutionResult(
-                success=process.returncode == 0,
+                success=return_code == 0,
                 exit_code=return_code,
                 execution_time=execution_time,
-                stdout=complete_output.decode("utf-8", errors="replace"),
+                stdout=capture.text(),
                 stderr="",
+                resources=(
+                    usage_from_rusage(
+                        session.rusage,
+                        output_bytes,
+                        sampler.samples if sampler else None,
+                        cgroup.stats() if cgroup else None,
+                    )
+                    if session.rusage
+                    else None
+                ),
             )
 
         except Exception as e:
@@ -216,31 +326,35 @@ class BaseExecutor(ABC):
                 traceback.print_exc()
             execution_time = time.time() - start_time
             return self._format_error_result(e, execution_time)
-
-    def _clean_output(self, data: bytes, workdir: str) -> str:
-
-        try:
-            text = data.decode("utf-8", errors="replace")
-
-            # Only format looks error (contains "Error" or "Traceback")
-            if "Error:" in text or "Traceback" in text or "Exception" in text:
-                # Determine language from command (stored in self if needed)
-                # For now, detect from error format
-                language = (
-                    "javascript" if "Error:" in text and "at " in text else "python"
+        finally:
+            for task in (quota_task, sampler_task):
+                if task:
+                    task.cancel()
+            if stale_timer:
+                stale_timer.cancel()
+            # No-op after a normal exit, tears the sandbox down if cancelled
+            session.kill()
+            session.close()
+            if cgroup:
+                cgroup.release()
+
+    async def _enforce_quota(
+        self,
+        session: PtySession,
+        workspace: Workspace,
+        on_output: Callable[[str], None],
+    ) -> None:
+        """Kill the program once its workspace grows past the disk quota"""
+        interval = get_settings().workspace_quota_check_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            if await asyncio.to_thread(workspace.over_quota):
+                quota_mb = workspace.quota_bytes // (1024 * 1024)
+                on_output(
+                    f"\r\nDisk quota of {quota_mb}MB exceeded, program terminated\r\n"
                 )
-                text = format_error_message(text, language, workdir)
-            else:
-                # Just strip ANSI codes from regular output
-                from lib.utils.output_formatter import strip_ansi_codes
-
-                text = strip_ansi_codes(text)
-
-            return text
-        except Exception as e:
-            # If cleaning fails, return original
-            log.warning(f"Failed to clean output: {e}")
-            return data.decode("utf-8", errors="replace")
+                session.kill()
+                return
 
     @abstractmethod
     def _build_command(self, filepath: str, workdir: str) -> List[str]:
@@ -1,11 +1,16 @@
 from typing import List, Tuple
 from .compiled_base import CompiledExecutor
+from .compile_profiles import gcc_profile_flags
 
 
 class CExecutor(CompiledExecutor):
     """C code executor with gcc compilation"""
 
+    language = "c"
+    supports_pch = True
+
     def _get_compiler_config(self) -> Tuple[str, List[str]]:
         compiler = "gcc"
-        flags = ["-std=c11", "-lm"]  # C11 standard, link math library
+        # C11 standard, link math library
+        flags = ["-std=c11", *gcc_profile_flags(self.profile), "-lm"]
         return (compiler, flags)
@@ -0,0 +1,178 @@
+"""
+cgroup v2 resource control for sandboxed jobs
+
+rlimits are per process and RLIMIT_AS counts virtual memory, which runtimes
+like V8 reserve far beyond what they use. A cgroup per job limits the whole
+process tree by what it actually uses:
+- memory.max (and memory.swap.max = 0)
+- cpu.max, as a number of CPUs
+- pids.max
+
+and reports memory.peak, cpu.stat and OOM kills afterwards.
+
+CGROUP_ROOT must be a cgroup v2 directory delegated to the worker, with the
+memory, cpu and pids controllers available, and must not contain the worker
+process itself (cgroup v2 only allows processes in leaf cgroups). Each job
+gets a child cgroup; the program joins it in the child, before exec.
+
+When CGROUP_ROOT is unset the sandbox falls back to rlimits.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from lib.config import get_settings
+from lib.logger import log
+
+CONTROLLERS = ("memory", "cpu", "pids")
+CPU_PERIOD_USEC = 100_000
+
+
+@dataclass
+class CgroupLimits:
+    memory_bytes: int
+    cpus: float
+    max_processes: int
+
+
+@dataclass
+class CgroupStats:
+    memory_peak_bytes: Optional[int]
+    cpu_usage_usec: int
+    cpu_throttled_usec: int
+    oom_kills: int
+
+
+class JobCgroup:
+    """The cgroup of a single job"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def apply(self, limits: CgroupLimits) -> None:
+        self._write("memory.max", str(limits.memory_bytes))
+        self._write("memory.swap.max", "0")
+        quota = max(int(limits.cpus * CPU_PERIOD_USEC), 1000)
+        self._write("cpu.max", f"{quota} {CPU_PERIOD_USEC}")
+        self._write("pids.max", str(limits.max_processes))
+
+    def join(self) -> None:
+        """Move the calling process into the cgroup (used in the child before exec)"""
+        self._write("cgroup.procs", str(os.getpid()))
+
+    def stats(self) -> CgroupStats:
+        cpu = self._read_keyed("cpu.stat")
+        events = self._read_keyed("memory.events")
+        peak = self._read("memory.peak")  # Linux 5.19+
+
+        return CgroupStats(
+            memory_peak_bytes=int(peak) if peak else None,
+            cpu_usage_usec=cpu.get("usage_usec", 0),
+            cpu_throttled_usec=cpu.get("throttled_usec", 0),
+            oom_kills=events.get("oom_kill", 0),
+        )
+
+    def remove(self) -> None:
+        """Kill whatever is left in the cgroup and delete it"""
+        try:
+            self._write("cgroup.kill", "1")  # Linux 5.14+
+        except OSError:
+            pass
+
+        # The kernel empties the cgroup asynchronously after the kill
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+        log.warning(f"Failed to remove cgroup {self.path}")
+
+    def release(self) -> None:
+        """Remove the cgroup in the background when called from the event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.remove()
+            return
+        loop.run_in_executor(None, self.remove)
+
+    def _write(self, name: str, value: str) -> None:
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(value)
+
+    def _read(self, name: str) -> str:
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def _read_keyed(self, name: str) -> Dict[str, int]:
+        values = {}
+        for line in self._read(name).splitlines():
+            key, _, value = line.partition(" ")
+            if value.isdigit():
+                values[key] = int(value)
+        return values
+
+
+class CgroupController:
+
+    def __init__(self, root: str, limits: CgroupLimits):
+        self.root = root
+        self.limits = limits
+        self._enable_controllers()
+
+    def create(self) -> JobCgroup:
+        path = os.path.join(self.root, f"job-{uuid.uuid4().hex[:12]}")
+        os.mkdir(path)
+        cgroup = JobCgroup(path)
+        try:
+            cgroup.apply(self.limits)
+        except OSError:
+            cgroup.remove()
+            raise
+        return cgroup
+
+    def _enable_controllers(self) -> None:
+        with open(os.path.join(self.root, "cgroup.controllers")) as f:
+            available = set(f.read().split())
+
+        missing = [name for name in CONTROLLERS if name not in available]
+        if missing:
+            raise RuntimeError(
+                f"cgroup {self.root} lacks controllers: {', '.join(missing)}"
+            )
+
+        with open(os.path.join(self.root, "cgroup.subtree_control"), "w") as f:
+            f.write(" ".join(f"+{name}" for name in CONTROLLERS))
+
+
+# Singleton instance
+_cgroup_controller: Optional[CgroupController] = None
+
+
+def get_cgroup_controller() -> Optional[CgroupController]:
+    """Get or create the CgroupController singleton, None if cgroups are disabled"""
+    global _cgroup_controller
+    settings = get_settings()
+    if not settings.cgroup_root:
+        return None
+    if _cgroup_controller is None:
+        _cgroup_controller = CgroupController(
+            settings.cgroup_root,
+            CgroupLimits(
+                memory_bytes=settings.max_memory_mb * 1024 * 1024,
+                cpus=settings.cgroup_cpus,
+                max_processes=settings.cgroup_max_processes,
+            ),
+        )
+    return _cgroup_controller
@@ -0,0 +1,99 @@
+"""
+Compile profiles for the compiled languages
+
+A profile trades build time against binary speed:
+- fast: no optimization, faster linker when installed. Interactive use,
+  where the build dominates the job's latency
+- optimized: -O2 / rustc -O. CPU-heavy submissions that would otherwise
+  spend their execution time budget in slow code
+
+Clients pick a profile per job, settings.compile_profile is the default.
+Each profile has its own compile and execution timeouts, falling back to
+compilation_timeout / execution_timeout when unset.
+"""
+
+import shutil
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from lib.config import get_settings
+
+# Fastest first, passed to the compiler driver as -fuse-ld=<name>
+_LINKERS = {"mold": "mold", "lld": "ld.lld", "gold": "ld.gold"}
+
+
+@dataclass(frozen=True)
+class CompileProfile:
+    name: str
+    compile_timeout: int
+    execution_timeout: int
+
+    @property
+    def optimized(self) -> bool:
+        return self.name == "optimized"
+
+
+@lru_cache(maxsize=None)
+def get_fast_linker() -> Optional[str]:
+    """Fastest linker installed on this host, None to use the default"""
+    for name, executable in _LINKERS.items():
+        if shutil.which(executable):
+            return name
+    return None
+
+
+def gcc_profile_flags(profile: CompileProfile) -> List[str]:
+    if profile.optimized:
+        return ["-O2", "-pipe"]
+
+    flags = ["-O0", "-pipe"]
+    linker = get_fast_linker()
+    if linker:
+        flags.append(f"-fuse-ld={linker}")
+    return flags
+
+
+def rustc_profile_flags(profile: CompileProfile) -> List[str]:
+    if profile.optimized:
+        return ["-O"]
+
+    flags = ["-C", "opt-level=0", "-C", "codegen-units=16"]
+    linker = get_fast_linker()
+    if linker:
+        flags += ["-C", f"link-arg=-fuse-ld={linker}"]
+    return flags
+
+
+def get_compile_profiles() -> Dict[str, CompileProfile]:
+    settings = get_settings()
+    return {
+        "fast": CompileProfile(
+            "fast",
+            settings.fast_compile_timeout or settings.compilation_timeout,
+            settings.fast_execution_timeout or settings.execution_timeout,
+        ),
+        "optimized": CompileProfile(
+            "optimized",
+            settings.optimized_compile_timeout or settings.compilation_timeout,
+            settings.optimized_execution_timeout or settings.execution_timeout,
+        ),
+    }
+
+
+def get_compile_profile(name: Optional[str] = None) -> CompileProfile:
+    """
+    Get a compile profile by name, defaults to settings.compile_profile
+
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    name = (name or get_settings().compile_profile).lower().strip()
+    profiles = get_compile_profiles()
+
+    if name not in profiles:
+        supported = ", ".join(sorted(profiles))
+        raise ValueError(
+            f"Unknown compile profile: {name}. Supported profiles: {supported}"
+        )
+    return profiles[name]
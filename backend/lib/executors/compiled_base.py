@@ -6,11 +6,25 @@ compiled language executors.
 """
 
 import os
+import re
 import subprocess
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from abc import abstractmethod
 from .base import BaseExecutor
-from lib.config import get_settings
+from .artifact_cache import get_artifact_cache
+from .compile_profiles import get_compile_profile, get_compile_profiles
+from .pch import get_precompiled_headers
+from .sandbox import SandboxBackend
+from lib.utils.output_formatter import clean_file_paths
+
+# A compiler diagnostic (gcc/clang "error:", rustc "error[E0425]:"), as
+# opposed to a compiler that crashed, was killed or ran out of disk. Such
+# failures can pass on a rerun and are never cached; a false positive only
+# costs a recompile.
+_DIAGNOSTIC = re.compile(r"\berror(\[E\d+\])?:")
+_TRANSIENT = re.compile(
+    r"Killed|signal|No space left on device|Cannot allocate memory|out of memory"
+)
 
 
 class CompiledExecutor(BaseExecutor):
@@ -22,41 +36,116 @@ class CompiledExecutor(BaseExecutor):
     their compiler and compilation flags.
     """
 
+    # Whether precompiled header bundles can be injected (GCC C/C++ only)
+    supports_pch = False
+
+    def __init__(
+        self, sandbox: Optional[SandboxBackend] = None, profile: Optional[str] = None
+    ):
+        super().__init__(sandbox, profile)
+        self.profile = get_compile_profile(profile)
+        self.timeout = self.profile.execution_timeout
+
     @abstractmethod
     def _get_compiler_config(self) -> Tuple[str, List[str]]:
         """
-        Returns: Tuple of (compiler_path, compilation_flags)
+        Returns: Tuple of (compiler_path, compilation_flags) for self.profile
         """
         pass
 
     def _build_command(self, filepath: str, workdir: str) -> List[str]:
-        """Compile source code and return executable path"""
+        """Compile source code (or reuse a cached build) and return executable path"""
         compiler, flags = self._get_compiler_config()
 
         # output executable path
         binarypath = os.path.join(workdir, "program")
 
-        try:
-            compilation_timeout = get_settings().compilation_timeout
-        except (ImportError, Exception):
-            compilation_timeout = 10  # Fallback default
+        with open(filepath, "rb") as f:
+            source = f.read()
+
+        cache = get_artifact_cache()
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(
+                source, os.path.basename(filepath), compiler, flags
+            )
+            cached = cache.get(cache_key, binarypath)
+            if cached and cached.error is not None:
+                raise Exception(f"Compilation failed:\n{cached.error}")
+            if cached and cached.binary_path:
+                return [binarypath]
+
+        compilation_timeout = self.profile.compile_timeout
+
+        # The same program compiles to the same binary with or without a PCH,
+        # so the cache key leaves it out. A failure is only trusted (and
+        # cached) once the program failed without the PCH too.
+        pch_flags = self._pch_flags(source, compiler, flags)
 
         try:
-            compile_result = subprocess.run(
-                [compiler, filepath, "-o", binarypath] + flags,
-                capture_output=True,
-                text=True,
-                cwd=workdir,
-                timeout=compilation_timeout,
+            compile_result = self._compile(
+                compiler, filepath, binarypath, flags + pch_flags, workdir
             )
+            if compile_result.returncode != 0 and pch_flags:
+                compile_result = self._compile(
+                    compiler, filepath, binarypath, flags, workdir
+                )
 
             if compile_result.returncode != 0:
-                raise Exception(f"Compilation failed:\n{compile_result.stderr}")
+                error = clean_file_paths(compile_result.stderr, workdir)
+                # Only a diagnostic fails the same way every time
+                if (
+                    cache
+                    and cache_key
+                    and compile_result.returncode == 1
+                    and _DIAGNOSTIC.search(compile_result.stderr)
+                    and not _TRANSIENT.search(compile_result.stderr)
+                ):
+                    cache.put_failure(cache_key, error)
+                raise Exception(f"Compilation failed:\n{error}")
 
         except subprocess.TimeoutExpired:
             raise Exception(
                 f"Compilation timed out after {compilation_timeout} seconds"
             )
 
+        if cache and cache_key:
+            cache.put_binary(cache_key, binarypath)
+
         # Return path to executable
         return [binarypath]
+
+    def _compile(
+        self,
+        compiler: str,
+        filepath: str,
+        binarypath: str,
+        flags: List[str],
+        workdir: str,
+    ) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [compiler, filepath, "-o", binarypath] + flags,
+            capture_output=True,
+            text=True,
+            cwd=workdir,
+            # Compiler temp files go to the workspace, wiped with it
+            env={**os.environ, "TMPDIR": workdir},
+            timeout=self.profile.compile_timeout,
+        )
+
+    def prepare_precompiled_headers(self) -> None:
+        """Build PCH bundles for every compile profile, called once at worker startup"""
+        pch = get_precompiled_headers()
+        if pch and self.supports_pch:
+            for profile in get_compile_profiles():
+                executor = type(self)(self.sandbox, profile)
+                compiler, flags = executor._get_compiler_config()
+                pch.build_all(self.language, compiler, flags)
+
+    def _pch_flags(self, source: bytes, compiler: str, flags: List[str]) -> List[str]:
+        pch = get_precompiled_headers()
+        if not pch or not self.supports_pch:
+            return []
+        return pch.flags_for(
+            source.decode("utf-8", errors="replace"), self.language, compiler, flags
+        )
@@ -1,11 +1,16 @@
 from typing import List, Tuple
 from .compiled_base import CompiledExecutor
+from .compile_profiles import gcc_profile_flags
 
 
 class CppExecutor(CompiledExecutor):
     """C++ code executor with g++ compilation"""
 
+    language = "cpp"
+    supports_pch = True
+
     def _get_compiler_config(self) -> Tuple[str, List[str]]:
         compiler = "g++"
-        flags = ["-std=c++17", "-lstdc++"]  # C++17 standard, link C++ stdlib
+        # C++17 standard, link C++ stdlib
+        flags = ["-std=c++17", *gcc_profile_flags(self.profile), "-lstdc++"]
         return (compiler, flags)
@@ -0,0 +1,214 @@
+"""
+Execution engine process
+
+Runs jobs on behalf of a worker in a separate, long-lived process (see
+engine_pool.py), so PTY pumping, output cleaning and frame encoding of
+concurrent jobs spread across CPU cores instead of sharing the worker's GIL.
+
+The worker talks to the engine over its stdin/stdout with length-prefixed
+JSON frames:
+
+    worker -> engine: run, input, pause, resume, kill, cancel, shutdown
+    engine -> worker: started, output, sample, result, error
+
+Every frame except shutdown carries the job_id it belongs to. Each engine
+keeps its own warm pool and workspace pool.
+
+Started by the pool as: python -m lib.executors.engine
+"""
+
+import asyncio
+import json
+import os
+import struct
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from lib.logger import log
+from lib.models import ResourceSample
+from .pty_session import PtySession
+
+HEADER = struct.Struct("!I")
+
+# Engine output buffered in the pipe before the job's PTY is paused
+WRITE_BUFFER_LIMIT = 1024 * 1024
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    payload = json.dumps(message).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Read the next frame, None once the other side closed the pipe"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        payload = await reader.readexactly(HEADER.unpack(header)[0])
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(payload)
+
+
+class ExecutionEngine:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.sessions: Dict[str, PtySession] = {}
+        self.pending_input: Dict[str, List[str]] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._drain_waiters: Set[asyncio.Task] = set()
+
+    async def serve(self) -> None:
+        """Run jobs until told to shut down or the worker goes away"""
+        from .warm_pool import get_warm_pool
+        from .workspace_pool import get_workspace_pool
+
+        pool = get_warm_pool()
+        if pool:
+            await pool.fill()
+
+        while True:
+            message = await read_frame(self.reader)
+            if message is None:
+                # Worker is gone, nobody is left to receive results
+                for task in self.tasks.values():
+                    task.cancel()
+                break
+            if message["type"] == "shutdown":
+                break
+            self.handle(message)
+
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        for waiter in self._drain_waiters:
+            waiter.cancel()
+        await asyncio.gather(*self._drain_waiters, return_exceptions=True)
+
+        if pool:
+            await pool.close()
+        workspaces = get_workspace_pool()
+        await workspaces.drain()
+        workspaces.close()
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        job_id = message["job_id"]
+        kind = message["type"]
+
+        if kind == "run":
+            # Input received before the process starts is held until it does
+            self.pending_input[job_id] = []
+            task = asyncio.create_task(self.run_job(message))
+            self.tasks[job_id] = task
+            task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+            return
+
+        session = self.sessions.get(job_id)
+        if kind == "input":
+            if session:
+                session.write(message["data"])
+            elif job_id in self.pending_input:
+                self.pending_input[job_id].append(message["data"])
+        elif kind == "pause" and session:
+            session.pause_reading()
+        elif kind == "resume" and session:
+            session.resume_reading()
+        elif kind == "kill" and session:
+            # The job still finishes, with the killed program's result
+            session.kill()
+        elif kind == "cancel" and job_id in self.tasks:
+            self.tasks[job_id].cancel()
+
+    async def run_job(self, message: Dict[str, Any]) -> None:
+        from lib.executors import get_executor
+
+        job_id = message["job_id"]
+        session: Optional[PtySession] = None
+
+        def on_start(started: PtySession):
+            nonlocal session
+            session = started
+            self.sessions[job_id] = started
+            for item in self.pending_input.pop(job_id, []):
+                started.write(item)
+            self.send({"type": "started", "job_id": job_id})
+
+        def on_output(text: str):
+            if not self.send({"type": "output", "job_id": job_id, "data": text}):
+                if session:
+                    # Worker is not keeping up, stop reading until the pipe drains
+                    session.pause_reading()
+                    self.when_drained(session.resume_reading)
+
+        async def on_sample(sample: ResourceSample):
+            self.send({"type": "sample", "job_id": job_id, "sample": sample.model_dump()})
+
+        try:
+            executor = await asyncio.to_thread(
+                get_executor, message["language"], None, message.get("profile")
+            )
+            result = await executor.execute(
+                code=message["code"],
+                filename=message["filename"],
+                on_output=on_output,
+                on_start=on_start,
+                on_sample=on_sample,
+            )
+            self.send({"type": "result", "job_id": job_id, "result": result.model_dump()})
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.error(f"Engine {os.getpid()} failed job {job_id}: {e}")
+            self.send({"type": "error", "job_id": job_id, "message": str(e)})
+        finally:
+            self.sessions.pop(job_id, None)
+            self.pending_input.pop(job_id, None)
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """
+        Queue a frame for the worker
+
+        Returns:
+            False once the pipe is backed up and producers should pause
+        """
+        self.writer.write(encode_frame(message))
+        return self.writer.transport.get_write_buffer_size() < WRITE_BUFFER_LIMIT
+
+    def when_drained(self, callback: Callable[[], None]) -> None:
+        async def wait():
+            try:
+                await self.writer.drain()
+                callback()
+            except ConnectionError:
+                return
+            except Exception as e:
+                log.error(f"Engine {os.getpid()} failed to resume after drain: {e}")
+
+        # Referenced until done, the loop only keeps weak references to tasks
+        waiter = asyncio.create_task(wait())
+        self._drain_waiters.add(waiter)
+        waiter.add_done_callback(self._drain_waiters.discard)
+
+
+async def main() -> None:
+    loop = asyncio.get_running_loop()
+
+    # Frames use the original stdout, anything printed goes to stderr instead
+    frames_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(0, "rb", buffering=0)
+    )
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(frames_fd, "wb", buffering=0)
+    )
+    writer = asyncio.StreamWriter(transport, protocol, None, loop)
+
+    log.debug(f"Execution engine {os.getpid()} started")
+    await ExecutionEngine(reader, writer).serve()
+    await writer.drain()
+    writer.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
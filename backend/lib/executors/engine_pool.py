@@ -0,0 +1,271 @@
+"""
+Pool of execution engine processes
+
+With EXECUTION_ENGINE=process, a worker dispatches its jobs to a few
+long-lived engine processes (engine.py) instead of running them on its own
+event loop. Each engine pumps the PTYs of its jobs, cleans their output and
+streams it back as frames, so per-job CPU work scales across cores while the
+worker only relays frames to Redis.
+
+Jobs go to the engine with the fewest running jobs. An engine that exits
+fails its running jobs and is restarted for the next job.
+"""
+
+import asyncio
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from lib.config import get_settings
+from lib.logger import log
+from lib.models import ExecutionResult, ResourceSample
+from .engine import encode_frame, read_frame
+
+# Directory containing the lib package, so engines can import it
+_BACKEND_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+class EngineError(Exception):
+    """A job could not be run by its engine"""
+
+
+class EngineJob:
+    """
+    A job running in an engine
+
+    Handed to on_start in place of the PtySession: input and flow control
+    are forwarded to the engine owning the session.
+    """
+
+    def __init__(
+        self,
+        engine: "EngineProcess",
+        job_id: str,
+        on_output: Callable[[str], None],
+        on_start: Optional[Callable[["EngineJob"], None]],
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]],
+    ):
+        self.engine = engine
+        self.job_id = job_id
+        self.on_output = on_output
+        self.on_start = on_start
+        self.on_sample = on_sample
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def write(self, data: str) -> None:
+        self.engine.send({"type": "input", "job_id": self.job_id, "data": data})
+
+    def pause_reading(self) -> None:
+        self.engine.send({"type": "pause", "job_id": self.job_id})
+
+    def resume_reading(self) -> None:
+        self.engine.send({"type": "resume", "job_id": self.job_id})
+
+    def kill(self) -> None:
+        self.engine.send({"type": "kill", "job_id": self.job_id})
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        kind = message["type"]
+        if kind == "output":
+            self.on_output(message["data"])
+        elif kind == "started":
+            if self.on_start:
+                self.on_start(self)
+        elif kind == "sample":
+            if self.on_sample:
+                self.engine.track(
+                    asyncio.create_task(
+                        self.on_sample(ResourceSample(**message["sample"]))
+                    )
+                )
+        elif kind == "result":
+            self.finish(ExecutionResult(**message["result"]))
+        elif kind == "error":
+            self.fail(EngineError(message["message"]))
+
+    def finish(self, result: ExecutionResult) -> None:
+        if not self.result.done():
+            self.result.set_result(result)
+
+    def fail(self, error: Exception) -> None:
+        if not self.result.done():
+            self.result.set_exception(error)
+
+
+class EngineProcess:
+    """One engine process and the jobs dispatched to it"""
+
+    def __init__(self, engine_id: int):
+        self.engine_id = engine_id
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.jobs: Dict[str, EngineJob] = {}
+        self._reader_task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Stats
+        self.starts = 0
+        self.jobs_completed = 0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [_BACKEND_DIR, env.get("PYTHONPATH")])
+        )
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "lib.executors.engine",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env,
+            # Terminal signals go to the worker, which shuts engines down itself
+            start_new_session=True,
+        )
+        self.starts += 1
+        self._reader_task = asyncio.create_task(self._read_frames(self.process))
+        log.debug(f"Engine {self.engine_id} started (pid {self.process.pid})")
+
+    async def execute(
+        self,
+        job_data: Dict[str, Any],
+        on_output: Callable[[str], None],
+        on_start: Optional[Callable[[EngineJob], None]] = None,
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]] = None,
+    ) -> ExecutionResult:
+        job_id = job_data["job_id"]
+        job = EngineJob(self, job_id, on_output, on_start, on_sample)
+        self.jobs[job_id] = job
+        self.send(
+            {
+                "type": "run",
+                "job_id": job_id,
+                "language": job_data["language"],
+                "profile": job_data.get("profile"),
+                "code": job_data["code"],
+                "filename": job_data["filename"],
+            }
+        )
+        try:
+            result = await job.result
+            self.jobs_completed += 1
+            return result
+        except asyncio.CancelledError:
+            # Tears the job's sandbox down in the engine
+            self.send({"type": "cancel", "job_id": job_id})
+            raise
+        finally:
+            self.jobs.pop(job_id, None)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        if self.running and self.process and self.process.stdin:
+            self.process.stdin.write(encode_frame(message))
+
+    def track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Let running jobs finish, then stop the engine"""
+        if not self.process:
+            return
+        if self.running and self.process.stdin:
+            self.send({"type": "shutdown"})
+            self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Engine {self.engine_id} did not stop, killing it")
+            self.process.kill()
+            await self.process.wait()
+        if self._reader_task:
+            await self._reader_task
+
+    async def _read_frames(self, process: asyncio.subprocess.Process) -> None:
+        assert process.stdout
+        while True:
+            message = await read_frame(process.stdout)
+            if message is None:
+                break
+            job = self.jobs.get(message["job_id"])
+            if job:
+                job.handle(message)
+
+        returncode = await process.wait()
+        if self.jobs:
+            log.error(
+                f"Engine {self.engine_id} exited with code {returncode}, "
+                f"failing {len(self.jobs)} running jobs"
+            )
+        for job in list(self.jobs.values()):
+            job.fail(EngineError(f"Execution engine exited with code {returncode}"))
+
+
+class EnginePool:
+
+    def __init__(self, size: int):
+        self.engines = [EngineProcess(engine_id) for engine_id in range(size)]
+
+    async def start(self) -> None:
+        await asyncio.gather(*(engine.start() for engine in self.engines))
+
+    async def execute(
+        self,
+        job_data: Dict[str, Any],
+        on_output: Callable[[str], None],
+        on_start: Optional[Callable[[EngineJob], None]] = None,
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]] = None,
+    ) -> ExecutionResult:
+        """
+        Run a job on the least busy engine
+
+        Args:
+            job_data: Job payload from the queue (job_id, language, code, ...)
+            on_output: Callback function(text) called with cleaned output
+            on_start: Callback receiving the EngineJob once the process is
+                running, used to write user input to it
+            on_sample: Async callback receiving live resource samples
+
+        Raises:
+            EngineError: If the engine failed the job or exited while running it
+        """
+        engine = min(self.engines, key=lambda engine: len(engine.jobs))
+        if not engine.running:
+            if engine.starts:
+                log.warning(f"Restarting engine {engine.engine_id}")
+            await engine.start()
+        return await engine.execute(job_data, on_output, on_start, on_sample)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(engine.close() for engine in self.engines))
+
+    def stats(self) -> Dict[str, List[int]]:
+        return {
+            "jobs": [engine.jobs_completed for engine in self.engines],
+            "restarts": [max(engine.starts - 1, 0) for engine in self.engines],
+        }
+
+
+# Singleton instance
+_engine_pool: Optional[EnginePool] = None
+
+
+def get_engine_pool() -> Optional[EnginePool]:
+    """Get or create the EnginePool singleton, None when jobs run in the worker"""
+    global _engine_pool
+    settings = get_settings()
+    if settings.execution_engine == "inline":
+        return None
+    if settings.execution_engine != "process":
+        raise ValueError(
+            f"Unknown execution engine: {settings.execution_engine}. "
+            "Supported engines: inline, process"
+        )
+    if _engine_pool is None:
+        _engine_pool = EnginePool(settings.engine_processes or os.cpu_count() or 1)
+    return _engine_pool
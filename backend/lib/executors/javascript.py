@@ -1,15 +1,30 @@
-from typing import List
+from typing import List, Optional
 from .base import BaseExecutor
 
+NODE_FLAGS = [
+    "--max-old-space-size=64",  # 64MB heap limit
+    "--no-concurrent-recompilation",
+    "--single-threaded-gc",
+]
+
+# Runs the script named on the first input line as the main module
+WARM_BOOTSTRAP = (
+    "const buf = Buffer.alloc(4096);"
+    "const n = require('fs').readSync(0, buf, 0, buf.length, null);"
+    "process.argv[1] = buf.toString('utf8', 0, n).trim();"
+    "require('module').runMain();"
+)
+
 
 class JavaScriptExecutor(BaseExecutor):
     """JavaScript/Node.js code executor"""
 
+    language = "javascript"
+    # V8 reserves far more address space than it uses, RLIMIT_AS breaks it
+    rlimit_address_space = False
+
     def _build_command(self, filepath: str, workdir: str) -> List[str]:
-        return [
-            "node",
-            "--max-old-space-size=64",  # 64MB heap limit
-            "--no-concurrent-recompilation",
-            "--single-threaded-gc",
-            filepath,
-        ]
+        return ["node", *NODE_FLAGS, filepath]
+
+    def _build_warm_command(self) -> Optional[List[str]]:
+        return ["node", *NODE_FLAGS, "-e", WARM_BOOTSTRAP]
@@ -0,0 +1,102 @@
+"""
+Bounded capture of raw program output
+
+Output is streamed to the client as it is produced, so the executor does
+not need a full copy of it. The capture keeps at most a fixed number of
+bytes for ExecutionResult.stdout:
+- "stream": keep nothing, output is only streamed
+- "ring": keep the first and last half of output_capture_kb, dropping the middle
+
+Chunks are copied once, straight from the PTY read buffer (a memoryview)
+into preallocated bytearrays, so capturing a 10 MB output costs no
+reallocations and memory stays constant.
+"""
+
+from lib.config import get_settings
+
+CAPTURE_MODES = ("stream", "ring")
+
+
+class OutputCapture:
+    """Head + tail ring buffer over a stream of output chunks"""
+
+    def __init__(self, mode: str = "stream", limit_bytes: int = 0):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(
+                f"Invalid capture mode: {mode}. Must be one of: {', '.join(CAPTURE_MODES)}"
+            )
+
+        self.mode = mode
+        self.total_bytes = 0
+
+        head_size = limit_bytes // 2 if mode == "ring" else 0
+        tail_size = limit_bytes - head_size if mode == "ring" else 0
+
+        self._head = bytearray(head_size)
+        self._head_len = 0
+        self._tail = bytearray(tail_size)
+        self._tail_pos = 0  # Next write position in the tail ring
+        self._tail_len = 0
+
+    @classmethod
+    def from_settings(cls) -> "OutputCapture":
+        settings = get_settings()
+        return cls(settings.output_capture_mode, settings.output_capture_kb * 1024)
+
+    @property
+    def dropped_bytes(self) -> int:
+        return self.total_bytes - self._head_len - self._tail_len
+
+    def append(self, data: memoryview) -> None:
+        """Copy a chunk into the capture. `data` may be reused by the caller afterwards."""
+        self.total_bytes += len(data)
+        if self.mode == "stream":
+            return
+
+        # Fill the head first
+        head_room = len(self._head) - self._head_len
+        if head_room > 0:
+            taken = min(head_room, len(data))
+            self._head[self._head_len : self._head_len + taken] = data[:taken]
+            self._head_len += taken
+            data = data[taken:]
+
+        tail_size = len(self._tail)
+        if not data or tail_size == 0:
+            return
+
+        # Only the last tail_size bytes of a large chunk can survive
+        if len(data) >= tail_size:
+            self._tail[:] = data[len(data) - tail_size :]
+            self._tail_pos = 0
+            self._tail_len = tail_size
+            return
+
+        first = min(len(data), tail_size - self._tail_pos)
+        self._tail[self._tail_pos : self._tail_pos + first] = data[:first]
+        rest = len(data) - first
+        if rest:
+            self._tail[:rest] = data[first:]
+        self._tail_pos = (self._tail_pos + len(data)) % tail_size
+        self._tail_len = min(tail_size, self._tail_len + len(data))
+
+    def getvalue(self) -> bytes:
+        """Captured output, with a marker where bytes were dropped"""
+        if self.mode == "stream":
+            return b""
+
+        head = bytes(self._head[: self._head_len])
+
+        if self._tail_len < len(self._tail):
+            tail = bytes(self._tail[: self._tail_len])
+        else:
+            tail = bytes(self._tail[self._tail_pos :] + self._tail[: self._tail_pos])
+
+        marker = b""
+        if self.dropped_bytes:
+            marker = f"\n... [{self.dropped_bytes} bytes truncated] ...\n".encode()
+
+        return head + marker + tail
+
+    def text(self) -> str:
+        return self.getvalue().decode("utf-8", errors="replace")
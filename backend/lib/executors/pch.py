@@ -0,0 +1,200 @@
+"""
+Precompiled header support for the C and C++ executors
+
+Most of a small C++ program's compile time goes to parsing standard headers.
+The worker precompiles a configurable set of header bundles at startup and
+injects one (`-include bundle.h`) when a submission includes exactly the
+bundle's headers, so the compiler loads the parsed headers instead. A
+bundle with more headers than the program asked for would declare names it
+never saw (std::count from <algorithm> clashing with a global count under
+`using namespace std`), so a subset is not enough. bits/stdc++.h includes
+every standard header, a bundle of it serves any program including it.
+
+Bundles are configured per language as ';'-separated bundles of
+','-separated headers, e.g. "bits/stdc++.h;iostream,vector,string".
+
+A bundle is only valid for the exact compiler and flags it was built with,
+so each build lives in a directory named by a hash of those. If GCC cannot
+use a PCH it silently falls back to parsing the headers, so a stale or
+missing bundle only costs speed. Should a compile with the PCH fail all the
+same, CompiledExecutor retries without it.
+"""
+
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from lib.config import get_settings
+from lib.logger import log
+from .artifact_cache import get_compiler_version
+
+_INCLUDE = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]')
+_DIRECTIVE = re.compile(r"^\s*#\s*(\w+)")
+
+_HEADER_LANGUAGE = {"c": "c-header", "cpp": "c++-header"}
+
+
+@dataclass(frozen=True)
+class HeaderBundle:
+    headers: FrozenSet[str]
+
+    @property
+    def name(self) -> str:
+        return hashlib.sha256(",".join(sorted(self.headers)).encode()).hexdigest()[:16]
+
+    def covers(self, includes: FrozenSet[str]) -> bool:
+        # bits/stdc++.h already includes every standard header
+        if self.headers == {"bits/stdc++.h"} and "bits/stdc++.h" in includes:
+            return True
+        return includes == self.headers
+
+    def source(self) -> str:
+        return "".join(f"#include <{header}>\n" for header in sorted(self.headers))
+
+
+def parse_bundles(spec: str) -> List[HeaderBundle]:
+    bundles = []
+    for group in spec.split(";"):
+        headers = frozenset(h.strip() for h in group.split(",") if h.strip())
+        if headers:
+            bundles.append(HeaderBundle(headers))
+    return bundles
+
+
+def scan_includes(source: str) -> Optional[FrozenSet[str]]:
+    """
+    Headers included by a source file.
+
+    Returns None when a PCH must not be injected: a non-include directive
+    (#define, #if, ...) before the last include could change how the
+    headers are parsed.
+    """
+    includes = set()
+    other_directive = False
+
+    for line in source.splitlines():
+        match = _INCLUDE.match(line)
+        if match:
+            if other_directive:
+                return None
+            includes.add(match.group(1).strip())
+            continue
+
+        directive = _DIRECTIVE.match(line)
+        if directive:
+            other_directive = True
+
+    return frozenset(includes)
+
+
+class PrecompiledHeaders:
+
+    def __init__(self, root: str, bundles: Dict[str, List[HeaderBundle]]):
+        self.root = root
+        self.bundles = bundles
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def build_all(self, language: str, compiler: str, flags: List[str]) -> None:
+        """Build every bundle for a language/flag combination (idempotent)"""
+        for bundle in self.bundles.get(language, []):
+            self._build(bundle, language, compiler, flags)
+
+    def flags_for(
+        self, source: str, language: str, compiler: str, flags: List[str]
+    ) -> List[str]:
+        """Extra compiler flags injecting a matching PCH, empty if none applies"""
+        includes = scan_includes(source)
+        if not includes:
+            self.misses += 1
+            return []
+
+        for bundle in self.bundles.get(language, []):
+            if not bundle.covers(includes):
+                continue
+            header = self._header_path(bundle, compiler, flags)
+            if os.path.exists(header + ".gch"):
+                self.hits += 1
+                return ["-include", header, "-Winvalid-pch"]
+
+        self.misses += 1
+        return []
+
+    def _header_path(self, bundle: HeaderBundle, compiler: str, flags: List[str]) -> str:
+        digest = hashlib.sha256()
+        for part in (compiler, get_compiler_version(compiler), *_pch_flags(flags)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return os.path.join(self.root, digest.hexdigest()[:16], f"{bundle.name}.h")
+
+    def _build(
+        self, bundle: HeaderBundle, language: str, compiler: str, flags: List[str]
+    ) -> None:
+        header = self._header_path(bundle, compiler, flags)
+        if os.path.exists(header + ".gch"):
+            return
+
+        directory = os.path.dirname(header)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to temp names and rename, other workers may share the directory
+        if not os.path.exists(header):
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".h.tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(bundle.source())
+            os.replace(tmp, header)
+
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".gch.tmp")
+        os.close(fd)
+        try:
+            result = subprocess.run(
+                [compiler, "-x", _HEADER_LANGUAGE[language], header, "-o", tmp]
+                + _pch_flags(flags),
+                capture_output=True,
+                text=True,
+                timeout=120,
+            )
+            if result.returncode != 0:
+                log.warning(
+                    f"Failed to precompile {sorted(bundle.headers)}: {result.stderr[:500]}"
+                )
+                return
+            os.replace(tmp, header + ".gch")
+            log.info(f"Precompiled {language} headers {sorted(bundle.headers)}")
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log.warning(f"Failed to precompile {sorted(bundle.headers)}: {e}")
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+def _pch_flags(flags: List[str]) -> List[str]:
+    """Compile flags that affect parsing (linker flags are irrelevant to a PCH)"""
+    return [flag for flag in flags if not flag.startswith("-l")]
+
+
+# Singleton instance
+_pch: Optional[PrecompiledHeaders] = None
+
+
+def get_precompiled_headers() -> Optional[PrecompiledHeaders]:
+    """Get or create the PrecompiledHeaders singleton, None if PCH is disabled"""
+    global _pch
+    settings = get_settings()
+    if not settings.pch_enabled:
+        return None
+    if _pch is None:
+        _pch = PrecompiledHeaders(
+            settings.pch_dir,
+            {
+                "c": parse_bundles(settings.pch_c_bundles),
+                "cpp": parse_bundles(settings.pch_cpp_bundles),
+            },
+        )
+    return _pch
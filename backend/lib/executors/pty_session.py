@@ -0,0 +1,297 @@
+"""
+Event-loop driven PTY session
+
+Runs a single sandboxed process attached to a pseudo-terminal and pumps its
+I/O from the asyncio event loop:
+- The PTY master fd is registered with loop.add_reader, output is read only
+  when the kernel reports it ready (no polling)
+- Process exit is observed through a pidfd registered with the loop
+- User input is written straight to the master fd
+- The process is reaped with wait4, keeping its resource usage (rusage),
+  which covers the whole sandboxed process tree
+- The process leads its own session (setsid), kill() takes down the whole
+  process group, not only the sandbox parent
+
+Output is read into a single preallocated buffer and handed to on_output as
+a memoryview over it. The view is only valid for the duration of the
+callback, consumers that keep data must copy it.
+"""
+
+import asyncio
+import errno
+import fcntl
+import os
+import pty
+import resource
+import signal
+import struct
+import subprocess
+import termios
+from typing import Callable, List, Optional
+
+
+class PtySession:
+    """A sandboxed process attached to a PTY, driven by the event loop"""
+
+    READ_SIZE = 4096
+
+    def __init__(
+        self,
+        command: List[str],
+        workdir: str,
+        on_output: Optional[Callable[[memoryview], None]] = None,
+        preexec_fn: Optional[Callable[[], None]] = None,
+    ):
+        self.command = command
+        self.workdir = workdir
+        # Runs in the child before exec (e.g. to apply rlimits)
+        self.preexec_fn = preexec_fn
+        # May be replaced while running, output is discarded while unset
+        self.on_output = on_output
+
+        self.process: Optional[subprocess.Popen] = None
+        # Resource usage of the process and its reaped descendants, set on exit
+        self.rusage: Optional[resource.struct_rusage] = None
+        self._master_fd: Optional[int] = None
+        self._pidfd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._eof: Optional[asyncio.Future] = None
+        self._exited: Optional[asyncio.Future] = None
+        self._write_buffer = bytearray()
+        self._read_buffer = bytearray(self.READ_SIZE)
+        self._read_view = memoryview(self._read_buffer)
+
+    def start(self) -> None:
+        """Spawn the process and register its fds with the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._eof = self._loop.create_future()
+        self._exited = self._loop.create_future()
+
+        master_fd, slave_fd = pty.openpty()
+        try:
+            winsize = struct.pack("HHHH", 24, 80, 0, 0)
+            fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, winsize)
+
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=slave_fd,
+                stdout=slave_fd,
+                stderr=slave_fd,
+                cwd=self.workdir,
+                preexec_fn=self._preexec,
+            )
+        except Exception:
+            os.close(master_fd)
+            raise
+        finally:
+            os.close(slave_fd)
+
+        flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
+        fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self._master_fd = master_fd
+        self._loop.add_reader(master_fd, self._on_readable)
+        self._watch_exit()
+
+    @property
+    def is_running(self) -> bool:
+        return self._exited is not None and not self._exited.done() and self._is_reading()
+
+    def write(self, data: str) -> None:
+        """Write user input to the process, buffering if the PTY is full"""
+        if self._master_fd is None or self._eof is None or self._eof.done():
+            return
+
+        pending = bool(self._write_buffer)
+        self._write_buffer += data.encode("utf-8")
+        if not pending:
+            self._on_writable()
+
+    async def wait(self, timeout: float) -> int:
+        """
+        Wait for output to drain and the process to exit
+
+        Args:
+            timeout: Wall-clock limit in seconds before the process is killed
+
+        Returns:
+            Process exit code (-1 if unknown)
+        """
+        assert self._eof is not None and self._exited is not None
+
+        try:
+            await asyncio.wait_for(asyncio.shield(self._eof), timeout)
+        except asyncio.TimeoutError:
+            self.kill()
+
+        # Wait for process cleanup, but don't let Firejail teardown delay the result
+        try:
+            await asyncio.wait_for(asyncio.shield(self._exited), 0.5)
+        except asyncio.TimeoutError:
+            self.kill()
+            await self._exited
+
+        return self._exited.result()
+
+    def pause_reading(self) -> None:
+        """Stop reading output (backpressure), a full PTY buffer then blocks the program"""
+        if self._is_reading():
+            self._loop.remove_reader(self._master_fd)  # type: ignore[union-attr, arg-type]
+
+    def resume_reading(self) -> None:
+        if self._is_reading():
+            self._loop.add_reader(self._master_fd, self._on_readable)  # type: ignore[union-attr, arg-type]
+
+    def kill(self) -> None:
+        if not self.process or self.process.returncode is not None:
+            return
+        # Not reaped yet, so the group id (the leader's pid) cannot be reused
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        if self._pidfd is not None:
+            # Unlike Popen.kill, never reaps the process (its rusage would be lost)
+            try:
+                signal.pidfd_send_signal(self._pidfd, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return
+        self.process.kill()
+
+    def close(self) -> None:
+        """
+        Unregister fds from the loop and release them
+
+        A process still running (e.g. the job was cancelled) is killed and
+        reaped once it exits, from the loop: a process stuck in the kernel
+        must not stall every other session on it.
+        """
+        if self._master_fd is not None:
+            if self._loop:
+                self._loop.remove_reader(self._master_fd)
+                self._loop.remove_writer(self._master_fd)
+            os.close(self._master_fd)
+            self._master_fd = None
+
+        if self._eof and not self._eof.done():
+            self._eof.set_result(None)
+
+        running = self.process is not None and self.process.returncode is None
+        if running:
+            self.kill()
+        loop_alive = self._loop is not None and not self._loop.is_closed()
+
+        if self._pidfd is not None:
+            if self._loop:
+                self._loop.remove_reader(self._pidfd)
+            if running and loop_alive:
+                self._loop.add_reader(self._pidfd, self._reap_closed)  # type: ignore[union-attr]
+                return
+            os.close(self._pidfd)
+            self._pidfd = None
+
+        if running and not loop_alive:
+            # Nothing left to stall
+            self.process.wait()  # type: ignore[union-attr]
+        # Without a pidfd the waiter thread started by _watch_exit reaps it
+
+    def _preexec(self) -> None:
+        os.setsid()
+        if self.preexec_fn:
+            self.preexec_fn()
+
+    def _is_reading(self) -> bool:
+        return (
+            self._master_fd is not None
+            and self._eof is not None
+            and not self._eof.done()
+        )
+
+    # ------------------------------------------------------------------
+    # Event loop callbacks
+    # ------------------------------------------------------------------
+
+    def _on_readable(self) -> None:
+        try:
+            size = os.readv(self._master_fd, [self._read_buffer])  # type: ignore[arg-type]
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: every slave fd is closed, the process tree is gone
+            size = 0
+
+        if not size:
+            self._finish_output()
+            return
+
+        if self.on_output:
+            self.on_output(self._read_view[:size])
+
+    def _on_writable(self) -> None:
+        try:
+            written = os.write(self._master_fd, self._write_buffer)  # type: ignore[arg-type]
+        except BlockingIOError:
+            written = 0
+        except OSError as e:
+            if e.errno != errno.EIO:
+                raise
+            self._write_buffer.clear()
+            written = 0
+
+        del self._write_buffer[:written]
+
+        assert self._loop is not None
+        if self._write_buffer:
+            self._loop.add_writer(self._master_fd, self._on_writable)  # type: ignore[arg-type]
+        else:
+            self._loop.remove_writer(self._master_fd)  # type: ignore[arg-type]
+
+    def _finish_output(self) -> None:
+        assert self._loop is not None
+        self._loop.remove_reader(self._master_fd)  # type: ignore[arg-type]
+        self._loop.remove_writer(self._master_fd)  # type: ignore[arg-type]
+        self._write_buffer.clear()
+        if self._eof and not self._eof.done():
+            self._eof.set_result(None)
+
+    def _watch_exit(self) -> None:
+        """Resolve the exit future when the process terminates"""
+        assert self._loop is not None and self.process is not None
+
+        try:
+            self._pidfd = os.pidfd_open(self.process.pid)
+        except (AttributeError, OSError):
+            # No pidfd support (old kernel / non-Linux), fall back to a waiter thread
+            waiter = self._loop.run_in_executor(None, self._reap)
+            waiter.add_done_callback(lambda _: self._set_exited())
+            return
+
+        self._loop.add_reader(self._pidfd, self._on_exit)
+
+    def _on_exit(self) -> None:
+        assert self._loop is not None
+        self._loop.remove_reader(self._pidfd)  # type: ignore[arg-type]
+        self._reap()
+        self._set_exited()
+
+    def _reap_closed(self) -> None:
+        """Reap a process that exited after close(), then release its pidfd"""
+        self._on_exit()
+        os.close(self._pidfd)  # type: ignore[arg-type]
+        self._pidfd = None
+
+    def _reap(self) -> None:
+        assert self.process is not None
+        try:
+            _, status, rusage = os.wait4(self.process.pid, 0)
+        except ChildProcessError:
+            # Already reaped through the Popen object
+            return
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        self.rusage = rusage
+
+    def _set_exited(self) -> None:
+        assert self.process is not None
+        return_code = self.process.wait()
+        if self._exited and not self._exited.done():
+            self._exited.set_result(return_code if return_code is not None else -1)
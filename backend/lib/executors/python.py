@@ -1,9 +1,34 @@
-from typing import List
+from typing import List, Optional
 from .base import BaseExecutor
 
+# Runs the script named on the first input line as __main__, hiding itself
+# from tracebacks
+WARM_BOOTSTRAP = """\
+import os as _os, sys as _sys
+_path = _os.read(0, 4096).decode().strip()
+_sys.argv = [_path]
+_sys.path[0] = _os.path.dirname(_path)
+def _excepthook(t, v, tb, _hook=_sys.__excepthook__):
+    if tb is not None:
+        tb = tb.tb_next
+        v.__traceback__ = tb
+    _hook(t, v, tb)
+_sys.excepthook = _excepthook
+with open(_path, encoding="utf-8") as _f:
+    _code = compile(_f.read(), _path, "exec")
+__file__ = _path
+del _os, _sys, _path, _f, _excepthook
+exec(_code)
+"""
+
 
 class PythonExecutor(BaseExecutor):
     """Python code executor"""
 
+    language = "python"
+
     def _build_command(self, filepath: str, workdir: str) -> List[str]:
         return ["python3", filepath]
+
+    def _build_warm_command(self) -> Optional[List[str]]:
+        return ["python3", "-c", WARM_BOOTSTRAP]
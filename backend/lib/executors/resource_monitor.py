@@ -0,0 +1,111 @@
+"""
+Resource accounting for sandboxed programs
+
+Final numbers come from wait4 (PtySession.rusage): the sandbox launcher
+waits for everything it starts, so its rusage covers the whole process tree
+(CPU times summed, peak RSS of the largest process). With cgroups enabled,
+the job's cgroup adds the peak memory of the tree as a whole, CPU
+throttling and OOM kills.
+
+Optionally, the process tree is sampled from /proc while the program runs.
+Every process of a job belongs to the session started for it (PtySession
+calls setsid), so the tree is found by session id rather than by parent,
+which also catches orphans re-parented to init.
+"""
+
+import asyncio
+import os
+import resource
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from lib.models import ResourceSample, ResourceUsage
+from .cgroups import CgroupStats
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_KB = resource.getpagesize() // 1024
+
+
+def usage_from_rusage(
+    rusage: resource.struct_rusage,
+    output_bytes: int,
+    samples: Optional[List[ResourceSample]] = None,
+    cgroup: Optional[CgroupStats] = None,
+) -> ResourceUsage:
+    usage = ResourceUsage(
+        user_time=rusage.ru_utime,
+        sys_time=rusage.ru_stime,
+        cpu_time=rusage.ru_utime + rusage.ru_stime,
+        max_rss_kb=rusage.ru_maxrss,  # Already KB on Linux
+        voluntary_ctx_switches=rusage.ru_nvcsw,
+        involuntary_ctx_switches=rusage.ru_nivcsw,
+        io_write_bytes=rusage.ru_oublock * 512,
+        output_bytes=output_bytes,
+        samples=samples or [],
+    )
+
+    if cgroup:
+        if cgroup.memory_peak_bytes is not None:
+            usage.memory_peak_kb = cgroup.memory_peak_bytes // 1024
+        usage.cpu_throttled_time = cgroup.cpu_throttled_usec / 1_000_000
+        usage.oom_killed = cgroup.oom_kills > 0
+    return usage
+
+
+class ProcessTreeSampler:
+    """Periodically samples CPU time and RSS of a job's processes"""
+
+    def __init__(
+        self,
+        session_id: int,
+        interval: float,
+        max_samples: int,
+        on_sample: Optional[Callable[[ResourceSample], Awaitable[None]]] = None,
+    ):
+        self.session_id = session_id
+        self.interval = interval
+        self.max_samples = max_samples
+        self.on_sample = on_sample
+        self.samples: List[ResourceSample] = []
+        self._start = time.monotonic()
+
+    async def run(self) -> None:
+        """Sample until cancelled or max_samples is reached"""
+        while len(self.samples) < self.max_samples:
+            await asyncio.sleep(self.interval)
+            # Scans /proc, keep it off the event loop
+            sample = await asyncio.to_thread(self.sample)
+            if not sample.processes:
+                return
+            self.samples.append(sample)
+            if self.on_sample:
+                await self.on_sample(sample)
+
+    def sample(self) -> ResourceSample:
+        ticks = 0
+        rss_pages = 0
+        processes = 0
+
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat", "rb") as f:
+                    stat = f.read()
+            except OSError:
+                continue  # Exited while scanning
+
+            # Fields after the command name, which may itself contain spaces
+            fields = stat[stat.rfind(b")") + 2 :].split()
+            if int(fields[3]) != self.session_id:
+                continue
+            processes += 1
+            ticks += int(fields[11]) + int(fields[12])
+            rss_pages += int(fields[21])
+
+        return ResourceSample(
+            elapsed=round(time.monotonic() - self._start, 3),
+            cpu_time=ticks / _CLOCK_TICKS,
+            rss_kb=rss_pages * _PAGE_KB,
+            processes=processes,
+        )
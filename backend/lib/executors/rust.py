@@ -1,11 +1,14 @@
 from typing import List, Tuple
 from .compiled_base import CompiledExecutor
+from .compile_profiles import rustc_profile_flags
 
 
 class RustExecutor(CompiledExecutor):
     """Rust code executor with rustc compilation"""
 
+    language = "rust"
+
     def _get_compiler_config(self) -> Tuple[str, List[str]]:
         compiler = "rustc"
-        flags: List[str] = []  # No additional flags needed for basic compilation
+        flags = rustc_profile_flags(self.profile)
         return (compiler, flags)
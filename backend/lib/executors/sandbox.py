@@ -0,0 +1,274 @@
+"""
+Sandbox backends used to launch user programs
+
+Every job runs inside a sandbox, and launching it is part of every job's
+latency. Backends trade isolation for launch cost:
+- firejail: profile-based isolation (seccomp, private dirs, no network)
+- bubblewrap: namespaces with a read-only /usr and only the workspace writable
+- unshare: user/pid/net/ipc namespaces, no filesystem isolation
+- none: no isolation, for local development and CI benchmarking only
+
+Resource limits (CPU time, file size, processes, address space) are applied
+by firejail itself, other backends set them as rlimits in the child before
+the exec, so they cost no extra process.
+
+RLIMIT_NPROC counts every process of the user, and all sandboxes run as the
+worker's user, so it cannot limit one job: concurrent jobs would share, and
+exhaust, a single budget. A job's process count is limited by its cgroup
+(pids.max); without cgroups the rlimit (sandbox_max_processes) is kept
+small, a job's own limit on a one-slot worker, and a worker running jobs
+concurrently should use cgroups.
+"""
+
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Type
+
+from lib.config import get_settings
+
+
+@dataclass
+class SandboxLimits:
+    cpu_seconds: int
+    file_size_bytes: int
+    max_processes: Optional[int]  # RLIMIT_NPROC, per user. None leaves it to the cgroup
+    memory_bytes: Optional[int] = None  # None leaves the address space unlimited
+    wall_timeout: Optional[int] = None  # Only enforced by backends that support it
+
+
+@dataclass
+class SandboxLaunch:
+    """Everything needed to start a program in the sandbox"""
+
+    command: List[str]
+    preexec_fn: Optional[Callable[[], None]] = None
+
+
+class SandboxBackend(ABC):
+
+    name: str = ""
+
+    def __init__(self):
+        # Median seconds to launch a no-op program, set by measure_launch_cost
+        self.launch_cost: Optional[float] = None
+
+    @abstractmethod
+    def wrap(
+        self, command: List[str], workdir: str, limits: SandboxLimits
+    ) -> SandboxLaunch:
+        """Wrap a command so it runs sandboxed with workdir as its workspace"""
+        pass
+
+    def available(self) -> bool:
+        """Whether the backend can be used on this host"""
+        return True
+
+    def measure_launch_cost(self, samples: int = 5) -> float:
+        """
+        Median wall time of launching a no-op program in the sandbox
+
+        Returns:
+            Seconds per launch, also stored in self.launch_cost
+        """
+        limits = SandboxLimits(cpu_seconds=5, file_size_bytes=1024 * 1024, max_processes=60)
+        timings = []
+
+        with tempfile.TemporaryDirectory() as workdir:
+            launch = self.wrap(["true"], workdir, limits)
+            for _ in range(samples):
+                start = time.perf_counter()
+                subprocess.run(
+                    launch.command,
+                    cwd=workdir,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    preexec_fn=launch.preexec_fn,
+                    timeout=30,
+                )
+                timings.append(time.perf_counter() - start)
+
+        self.launch_cost = statistics.median(timings)
+        return self.launch_cost
+
+
+def rlimit_preexec(limits: SandboxLimits) -> Callable[[], None]:
+    """Child-side hook applying the limits as rlimits"""
+
+    def apply():
+        resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds))
+        resource.setrlimit(
+            resource.RLIMIT_FSIZE, (limits.file_size_bytes, limits.file_size_bytes)
+        )
+        if limits.max_processes is not None:
+            resource.setrlimit(
+                resource.RLIMIT_NPROC, (limits.max_processes, limits.max_processes)
+            )
+        if limits.memory_bytes is not None:
+            resource.setrlimit(
+                resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes)
+            )
+
+    return apply
+
+
+class FirejailBackend(SandboxBackend):
+
+    name = "firejail"
+
+    def __init__(self, executable: str = "/usr/bin/firejail", profile: str = ""):
+        super().__init__()
+        self.executable = executable
+        self.profile = profile or get_settings().firejail_profile
+
+    def wrap(
+        self, command: List[str], workdir: str, limits: SandboxLimits
+    ) -> SandboxLaunch:
+        base_cmd = [
+            self.executable,
+            "--quiet", # Suppress warning that were in docker container
+            f"--profile={self.profile}",
+            "--nodbus",
+            f"--private={workdir}",  # Isolated workspace (files only in this tmpdir)
+            f"--rlimit-cpu={limits.cpu_seconds}",
+            f"--rlimit-fsize={limits.file_size_bytes}",
+        ]
+
+        if limits.max_processes is not None:
+            base_cmd.append(f"--rlimit-nproc={limits.max_processes}")
+
+        if limits.wall_timeout is not None:
+            minutes, seconds = divmod(limits.wall_timeout, 60)
+            hours, minutes = divmod(minutes, 60)
+            base_cmd.append(f"--timeout={hours:02d}:{minutes:02d}:{seconds:02d}")
+
+        if limits.memory_bytes is not None:
+            base_cmd.append(f"--rlimit-as={limits.memory_bytes}")
+
+        return SandboxLaunch(base_cmd + command)
+
+    def available(self) -> bool:
+        return os.access(self.executable, os.X_OK)
+
+
+class BubblewrapBackend(SandboxBackend):
+
+    name = "bubblewrap"
+
+    # System directories mounted read-only, missing ones are skipped
+    READ_ONLY = [
+        "/usr",
+        "/bin",
+        "/sbin",
+        "/lib",
+        "/lib64",
+        "/etc/alternatives",
+        "/etc/ld.so.cache",
+        "/etc/localtime",
+    ]
+
+    def __init__(self, executable: str = "bwrap"):
+        super().__init__()
+        self.executable = executable
+
+    def wrap(
+        self, command: List[str], workdir: str, limits: SandboxLimits
+    ) -> SandboxLaunch:
+        base_cmd = [
+            self.executable,
+            "--die-with-parent",
+            "--unshare-all",  # Includes the network namespace, no network access
+            "--cap-drop", "ALL",
+        ]
+        for path in self.READ_ONLY:
+            base_cmd += ["--ro-bind-try", path, path]
+        base_cmd += [
+            "--proc", "/proc",
+            "--dev", "/dev",
+            "--tmpfs", "/tmp",
+            "--bind", workdir, workdir,
+            "--chdir", workdir,
+            "--setenv", "HOME", workdir,
+        ]
+
+        return SandboxLaunch(base_cmd + command, rlimit_preexec(limits))
+
+    def available(self) -> bool:
+        return shutil.which(self.executable) is not None
+
+
+class UnshareBackend(SandboxBackend):
+    """Namespaces only: no network, private pids, but the host filesystem"""
+
+    name = "unshare"
+
+    def wrap(
+        self, command: List[str], workdir: str, limits: SandboxLimits
+    ) -> SandboxLaunch:
+        base_cmd = [
+            "unshare",
+            "--user",
+            "--map-root-user",
+            "--net",
+            "--ipc",
+            "--uts",
+            "--pid",
+            "--fork",
+            "--kill-child",
+            "--mount-proc",
+        ]
+        return SandboxLaunch(base_cmd + command, rlimit_preexec(limits))
+
+    def available(self) -> bool:
+        return shutil.which("unshare") is not None
+
+
+class NoSandboxBackend(SandboxBackend):
+    """Runs programs directly (rlimits only), never use in production"""
+
+    name = "none"
+
+    def wrap(
+        self, command: List[str], workdir: str, limits: SandboxLimits
+    ) -> SandboxLaunch:
+        return SandboxLaunch(list(command), rlimit_preexec(limits))
+
+
+SANDBOX_BACKENDS: Dict[str, Type[SandboxBackend]] = {
+    "firejail": FirejailBackend,
+    "bubblewrap": BubblewrapBackend,
+    "bwrap": BubblewrapBackend,  # Alias for bubblewrap
+    "unshare": UnshareBackend,
+    "none": NoSandboxBackend,
+}
+
+# Shared backends, launch costs are measured once per process
+_backends: Dict[str, SandboxBackend] = {}
+
+
+def get_sandbox_backend(name: Optional[str] = None) -> SandboxBackend:
+    """
+    Get the sandbox backend by name, defaults to settings.sandbox_backend
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    name = (name or get_settings().sandbox_backend).lower().strip()
+    backend_class = SANDBOX_BACKENDS.get(name)
+
+    if not backend_class:
+        supported = ", ".join(sorted(SANDBOX_BACKENDS.keys()))
+        raise ValueError(
+            f"Unknown sandbox backend: {name}. Supported backends: {supported}"
+        )
+
+    if name not in _backends:
+        _backends[name] = backend_class()
+    return _backends[name]
@@ -0,0 +1,164 @@
+"""
+Pool of pre-spawned sandboxed interpreters
+
+Starting a sandbox and an interpreter (python3, node) costs hundreds of ms
+before the first line of user code runs. The pool keeps a few interpreters
+per language already running inside their sandbox, parked on a small
+bootstrap that waits for the path of the script to run.
+
+A parked process:
+- Owns a workspace from the pool (the sandbox's private directory)
+- Reads one line, the script path, from its PTY, then runs the script
+- Is used for exactly one job, then discarded and replaced in the background
+
+The script path is sent as the first line of PTY input. Its echo is the
+first output of the process and is dropped by the executor.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from lib.config import get_settings
+from lib.logger import log
+from .cgroups import JobCgroup
+from .pty_session import PtySession
+from .workspace_pool import Workspace, get_workspace_pool
+
+
+class WarmProcess:
+    """A sandboxed interpreter waiting for its script"""
+
+    def __init__(
+        self,
+        language: str,
+        workspace: Workspace,
+        session: PtySession,
+        cgroup: Optional[JobCgroup] = None,
+    ):
+        self.language = language
+        self.workspace = workspace
+        self.session = session
+        self.cgroup = cgroup
+
+    @property
+    def workdir(self) -> str:
+        return self.workspace.path
+
+    def activate(self, filepath: str) -> int:
+        """
+        Hand the script to the parked interpreter
+
+        Returns:
+            Number of echoed bytes the caller must drop from the output
+        """
+        self.session.write(filepath + "\n")
+        return len(filepath.encode("utf-8")) + len(b"\r\n")
+
+    async def discard(self) -> None:
+        await self.session.wait(0)
+        self.session.close()
+        get_workspace_pool().release(self.workspace)
+        if self.cgroup:
+            self.cgroup.release()
+
+
+class WarmPool:
+
+    def __init__(self, sizes: Dict[str, int]):
+        self.sizes = {language: size for language, size in sizes.items() if size > 0}
+        self._idle: Dict[str, Deque[WarmProcess]] = {
+            language: deque() for language in self.sizes
+        }
+        self._spawning: Dict[str, int] = {language: 0 for language in self.sizes}
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, language: str) -> Optional[WarmProcess]:
+        """Take a parked interpreter, None if the pool is empty or disabled"""
+        idle = self._idle.get(language)
+        if idle is None:
+            return None
+
+        warm = None
+        while idle:
+            candidate = idle.popleft()
+            if candidate.session.is_running:
+                warm = candidate
+                break
+            self._track(asyncio.create_task(candidate.discard()))
+
+        if warm:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        self._refill(language)
+        return warm
+
+    async def fill(self) -> None:
+        """Spawn interpreters up to the configured pool sizes"""
+        for language in self.sizes:
+            self._refill(language)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+        parked = [warm for idle in self._idle.values() for warm in idle]
+        for idle in self._idle.values():
+            idle.clear()
+        await asyncio.gather(*(warm.discard() for warm in parked))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "idle": sum(len(idle) for idle in self._idle.values()),
+        }
+
+    def _refill(self, language: str) -> None:
+        missing = (
+            self.sizes[language] - len(self._idle[language]) - self._spawning[language]
+        )
+        for _ in range(missing):
+            self._spawning[language] += 1
+            self._track(asyncio.create_task(self._spawn(language)))
+
+    async def _spawn(self, language: str) -> None:
+        from lib.executors import get_executor
+
+        try:
+            warm = get_executor(language).spawn_warm_process()
+            if warm:
+                self._idle[language].append(warm)
+        except Exception as e:
+            log.warning(f"Failed to spawn warm {language} interpreter: {e}")
+        finally:
+            self._spawning[language] -= 1
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+# Singleton instance
+_warm_pool: Optional[WarmPool] = None
+
+
+def get_warm_pool() -> Optional[WarmPool]:
+    """Get or create the WarmPool singleton, None if no language is pooled"""
+    global _warm_pool
+    if _warm_pool is None:
+        settings = get_settings()
+        _warm_pool = WarmPool(
+            {
+                "python": settings.warm_pool_python,
+                "javascript": settings.warm_pool_javascript,
+            }
+        )
+    return _warm_pool if _warm_pool.sizes else None
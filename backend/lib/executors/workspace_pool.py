@@ -0,0 +1,178 @@
+"""
+Pool of reusable job workspaces
+
+Creating and recursively deleting a temporary directory for every job puts
+filesystem latency at both ends of the job. Instead each worker keeps a set
+of pre-created workspace directories, ideally on a size-capped tmpfs
+(WORKSPACE_ROOT), and hands them out for reuse:
+- acquire() pops an empty workspace, creating one only if all are in use
+- release() wipes the contents in a background thread, off the critical
+  path, and returns the directory to the pool once it is empty
+
+A workspace whose contents can't be wiped (e.g. the program removed its own
+permissions) is dropped and replaced with a fresh directory.
+
+Each workspace has a disk quota. tmpfs has no per-directory quotas, so
+the executor polls usage() while a program runs and kills it once it
+exceeds the quota. The tmpfs size is the hard cap across all workspaces.
+"""
+
+import asyncio
+import os
+import shutil
+import stat
+import tempfile
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from lib.config import get_settings
+from lib.logger import log
+
+
+class Workspace:
+    """A directory a single job runs in"""
+
+    def __init__(self, path: str, quota_bytes: int):
+        self.path = path
+        self.quota_bytes = quota_bytes
+
+    def usage(self) -> int:
+        """Bytes used by files in the workspace"""
+        total = 0
+        stack = [self.path]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_blocks * 512
+                except OSError:
+                    continue
+        return total
+
+    def over_quota(self) -> bool:
+        return self.quota_bytes > 0 and self.usage() > self.quota_bytes
+
+
+class WorkspacePool:
+
+    def __init__(self, root: str, size: int, quota_bytes: int):
+        os.makedirs(root, mode=0o711, exist_ok=True)
+        # Private directory per pool, several workers may share the root
+        self.root = tempfile.mkdtemp(dir=root, prefix="pool-")
+        self.size = size
+        self.quota_bytes = quota_bytes
+
+        self._free: Deque[Workspace] = deque()
+        self._wipes: Set[asyncio.Future] = set()
+        self._created = 0
+
+        # Stats
+        self.reused = 0
+        self.dropped = 0
+
+        for _ in range(size):
+            self._free.append(self._create())
+
+    def acquire(self) -> Workspace:
+        """Get an empty workspace, never blocks"""
+        if self._free:
+            self.reused += 1
+            return self._free.popleft()
+        return self._create()
+
+    def release(self, workspace: Workspace) -> None:
+        """Wipe the workspace in the background and return it to the pool"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._recycle(workspace, self._wipe(workspace.path))
+            return
+
+        wipe = loop.run_in_executor(None, self._wipe, workspace.path)
+        self._wipes.add(wipe)
+        wipe.add_done_callback(lambda done: self._on_wiped(workspace, done))
+
+    async def drain(self) -> None:
+        """Wait for pending wipes"""
+        if self._wipes:
+            await asyncio.gather(*self._wipes, return_exceptions=True)
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._free.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "created": self._created,
+            "reused": self.reused,
+            "dropped": self.dropped,
+            "free": len(self._free),
+        }
+
+    def _create(self) -> Workspace:
+        self._created += 1
+        path = tempfile.mkdtemp(dir=self.root, prefix="ws-")
+        return Workspace(path, self.quota_bytes)
+
+    def _on_wiped(self, workspace: Workspace, done: asyncio.Future) -> None:
+        self._wipes.discard(done)
+        wiped = not done.cancelled() and done.exception() is None and done.result()
+        self._recycle(workspace, wiped)
+
+    def _recycle(self, workspace: Workspace, wiped: bool) -> None:
+        if not wiped:
+            self.dropped += 1
+            shutil.rmtree(workspace.path, ignore_errors=True)
+            return
+        if len(self._free) < self.size:
+            self._free.append(workspace)
+        else:
+            # Extra workspace created under load, not kept
+            os.rmdir(workspace.path)
+
+    @staticmethod
+    def _wipe(path: str) -> bool:
+        """Delete the contents of a workspace, True if it ended up empty"""
+
+        def make_writable(function, failed_path, _):
+            # The program may have removed write/exec permission from a directory
+            parent = os.path.dirname(failed_path)
+            os.chmod(parent, stat.S_IRWXU)
+            if os.path.isdir(failed_path) and not os.path.islink(failed_path):
+                os.chmod(failed_path, stat.S_IRWXU)
+            function(failed_path)
+
+        try:
+            os.chmod(path, stat.S_IRWXU)
+            for entry in os.scandir(path):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, onerror=make_writable)
+                else:
+                    os.unlink(entry.path)
+            return not os.listdir(path)
+        except OSError as e:
+            log.warning(f"Failed to wipe workspace {path}: {e}")
+            return False
+
+
+# Singleton instance
+_workspace_pool: Optional[WorkspacePool] = None
+
+
+def get_workspace_pool() -> WorkspacePool:
+    """Get or create the WorkspacePool singleton"""
+    global _workspace_pool
+    if _workspace_pool is None:
+        settings = get_settings()
+        _workspace_pool = WorkspacePool(
+            settings.workspace_root,
+            settings.workspace_pool_size,
+            settings.workspace_quota_mb * 1024 * 1024,
+        )
+    return _workspace_pool
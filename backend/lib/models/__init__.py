@@ -1,9 +1,18 @@
 # Models package
-from .schema import CodeSubmission, JobResult, JobResponse, ExecutionResult
+from .schema import (
+    CodeSubmission,
+    JobResult,
+    JobResponse,
+    ExecutionResult,
+    ResourceSample,
+    ResourceUsage,
+)
 
 __all__ = [
     "CodeSubmission",
     "JobResult",
     "JobResponse",
     "ExecutionResult",
+    "ResourceSample",
+    "ResourceUsage",
 ]
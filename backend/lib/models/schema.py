@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import Optional
+from typing import List, Optional
 
 
 class CodeSubmission(BaseModel):
@@ -9,6 +9,13 @@ class CodeSubmission(BaseModel):
     )
     language: str = Field(..., description="Programming language")
     filename: str = Field(..., description="File name with extension")
+    profile: Optional[str] = Field(
+        None, description="Compile profile for compiled languages (fast, optimized)"
+    )
+    priority: Optional[str] = Field(
+        None,
+        description="Queue priority (interactive, batch), optimized builds default to batch",
+    )
 
     @field_validator("language")
     @classmethod
@@ -36,6 +43,35 @@ class CodeSubmission(BaseModel):
             raise ValueError("Filename too long (max 255 characters)")
         return v
 
+    @field_validator("profile")
+    @classmethod
+    def validate_profile(cls, v):
+        from lib.executors.compile_profiles import get_compile_profiles
+
+        if v is None:
+            return v
+        profiles = get_compile_profiles()
+        if v.lower() not in profiles:
+            raise ValueError(f"Profile must be one of: {', '.join(sorted(profiles))}")
+        return v.lower()
+
+    @field_validator("priority")
+    @classmethod
+    def validate_priority(cls, v):
+        from lib.services.job_queue import PRIORITIES
+
+        if v is None:
+            return v
+        if v.lower() not in PRIORITIES:
+            raise ValueError(f"Priority must be one of: {', '.join(PRIORITIES)}")
+        return v.lower()
+
+    @property
+    def queue_priority(self) -> str:
+        if self.priority:
+            return self.priority
+        return "batch" if self.profile == "optimized" else "interactive"
+
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -98,6 +134,33 @@ class JobResult(BaseModel):
     )
 
 
+class ResourceSample(BaseModel):
+    """Live sample of the sandboxed process tree, read from /proc"""
+
+    elapsed: float  # Seconds since the program started
+    cpu_time: float  # User + system CPU seconds of the live processes
+    rss_kb: int
+    processes: int
+
+
+class ResourceUsage(BaseModel):
+    """Resource usage of the sandboxed process tree, from wait4"""
+
+    user_time: float
+    sys_time: float
+    cpu_time: float  # user_time + sys_time
+    max_rss_kb: int
+    voluntary_ctx_switches: int
+    involuntary_ctx_switches: int
+    io_write_bytes: int  # Block device writes (ru_oublock * 512)
+    output_bytes: int  # Bytes the program wrote to its terminal
+    # From the job's cgroup, when cgroups are enabled
+    memory_peak_kb: Optional[int] = None
+    cpu_throttled_time: Optional[float] = None
+    oom_killed: bool = False
+    samples: List[ResourceSample] = []
+
+
 class ExecutionResult(BaseModel):
     """Model for code execution results"""
 
@@ -106,6 +169,7 @@ class ExecutionResult(BaseModel):
     stderr: str = ""
     exit_code: int
     execution_time: float
+    resources: Optional[ResourceUsage] = None
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -1,7 +1,9 @@
 # Redis Connection package
 from .redis_manager import AsyncRedisManager, get_async_redis
+from .multiplexer import PubSubMultiplexer
 
 __all__ = [
     "AsyncRedisManager",
     "get_async_redis",
+    "PubSubMultiplexer",
 ]
@@ -0,0 +1,105 @@
+"""
+One Redis Pub/Sub connection shared by many in-process subscribers
+
+redis.pubsub() takes a connection of its own for as long as it is
+subscribed. Instead of one per job, the multiplexer keeps a single
+long-lived Pub/Sub connection and SUBSCRIBEs/UNSUBSCRIBEs channels on it as
+handlers come and go. Messages are dispatched to the handlers registered
+for their channel, in the order they arrive.
+
+Handlers are plain callables run on the event loop; anything slow should
+hand the message to a queue. The connection is subscribed to a private
+control channel for its whole life, so the listener always has a
+connection to read from, and redis-py re-subscribes every channel after a
+reconnect.
+"""
+
+import asyncio
+import uuid
+from typing import Callable, Dict, List, Optional
+import redis.asyncio as aioredis
+from lib.logger import log
+
+MessageHandler = Callable[[str], None]
+
+
+class PubSubMultiplexer:
+
+    def __init__(self, redis_client: aioredis.Redis, name: str = "pubsub"):
+        self.redis = redis_client
+        self.name = name
+        self._pubsub: Optional[aioredis.client.PubSub] = None
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._control_channel = f"codr:{name}:{uuid.uuid4().hex[:8]}"
+
+        # Stats
+        self.messages = 0
+
+    async def start(self) -> None:
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self._control_channel)
+        self._listener = asyncio.create_task(self._listen())
+        log.debug(f"Pub/Sub multiplexer {self.name} started")
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        """Call handler with every message published on channel"""
+        assert self._pubsub, "multiplexer not started"
+        handlers = self._handlers.setdefault(channel, [])
+        handlers.append(handler)
+        if len(handlers) == 1:
+            await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self._handlers.get(channel)
+        if not handlers or handler not in handlers:
+            return
+        handlers.remove(handler)
+        if not handlers:
+            del self._handlers[channel]
+            if self._pubsub:
+                await self._pubsub.unsubscribe(channel)
+
+    @property
+    def channel_count(self) -> int:
+        return len(self._handlers)
+
+    async def close(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.close()
+            self._pubsub = None
+        self._handlers.clear()
+        log.debug(f"Pub/Sub multiplexer {self.name} closed")
+
+    async def _listen(self) -> None:
+        assert self._pubsub
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Reconnects, and re-subscribes, on the next read
+                log.warning(f"Pub/Sub multiplexer {self.name} read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if message and message["type"] == "message":
+                self._dispatch(message["channel"], message["data"])
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        self.messages += 1
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                handler(data)
+            except Exception as e:
+                log.error(f"Pub/Sub handler for {channel} failed: {e}")
@@ -3,10 +3,15 @@ Services package for business logic
 """
 
 from .job_service import JobService
+from .job_queue import JobQueue, QueueFullError
 from .pubsub_service import PubSubService, get_pubsub_service
+from .output_publisher import OutputPublisher
 
 __all__ = [
     "JobService",
+    "JobQueue",
+    "QueueFullError",
     "PubSubService",
     "get_pubsub_service",
+    "OutputPublisher",
 ]
@@ -0,0 +1,728 @@
+"""
+Reliable, prioritized, tenant-fair job queue between the WebSocket service
+and workers
+
+Jobs wait by priority class and language ({queue}:{priority}:{language}),
+so a flood of heavy compiled jobs cannot hold back cheap interpreted ones.
+Priority classes:
+- interactive: the default
+- batch: jobs nobody is watching closely (optimized builds by default)
+
+Workers take jobs with a weighted pick across the classes and languages
+with waiting jobs (Lua, one round trip): each weighs its class weight
+(QUEUE_WEIGHT_*), times WORKER_AFFINITY_WEIGHT for the languages in the
+worker's WORKER_AFFINITY, whose toolchains and caches it keeps warm. Idle
+workers block on a wakeup list ({queue}:wakeup) that gets one token per
+enqueued job, and one per tenant dropping below its running cap.
+
+Fairness between tenants (end users, see the WebSocket service for how they
+are identified): within a class and language, every tenant has its own
+list ({queue}:{priority}:{language}:tenant:{tenant}) and the tenants with
+waiting jobs take turns, round robin ({queue}:{priority}:{language}:tenants).
+A client flooding the queue only lengthens its own line, others still get
+every other turn. A tenant already running tenant_max_running jobs is
+passed over until one finishes ({queue}:running, counted atomically by the
+pick, ack and recovery scripts, which wake a worker when a tenant drops
+below the cap). Tenant ids are hashed before they reach Redis. Jobs of
+unidentified clients share the ANONYMOUS_TENANT, which is never capped: a
+single cap for everyone unidentified would cap the whole deployment.
+
+At-least-once delivery with the reliable queue pattern:
+- The pick atomically moves the job into the worker's own processing list
+  ({queue}:processing:{worker_id}), it is removed (ack) once the job has
+  completed or failed
+- Every worker keeps a heartbeat key alive ({queue}:heartbeat:{worker_id})
+  and is registered in {queue}:workers
+- The reaper, run by every worker, returns the jobs of workers whose
+  heartbeat expired to the front of their tenant's line. A job delivered
+  job_max_attempts times without an ack is failed instead, so a program
+  that takes its worker down is not retried forever. Redelivery counts
+  live in {queue}:attempts until the job is acked.
+
+A lost job is recovered within worker_heartbeat_ttl + queue_reap_interval
+seconds, and immediately when a worker restarts with the same worker_id.
+
+Jobs nobody waits for any more are skipped: WebSocket nodes add the jobs
+their clients stopped or abandoned to {queue}:abandoned (a sorted set by
+time, trimmed to redis_ttl), and the pick drops abandoned jobs it takes,
+in the same round trip, before handing the next one to the worker.
+
+Admission and feedback:
+- enqueue() refuses jobs once max_depth are pending (QueueFullError),
+  atomically with the push. Pending jobs are counted per class and
+  language in {queue}:pending.
+- Workers record how long their jobs ran, the last SERVICE_SAMPLES per
+  language ({queue}:service_time:{language}), and register their slots in
+  {queue}:capacity with every heartbeat
+- position() and expected_wait() estimate a job's place in line and its
+  wait: the jobs ahead of it (in its own class and language, taking the
+  tenants' turns into account, and in every class and language of its
+  priority or a higher one) times their language's mean run time, spread
+  over the live workers' slots
+
+Every queued job starts with "queue", "job_id" and "tenant" fields, so
+scripts can route and count it without decoding the JSON. Jobs pushed onto
+the bare {queue} list by older services are still taken, at interactive
+weight and outside of tenant fairness.
+
+Redis Cluster: {queue} is the queue name as a hash tag, e.g. {queue}:running
+is {codr:job_queue}:running, and the legacy list, the bare name hashed
+whole, lands in the same slot. Every key of the queue lives in that one
+slot, so the scripts may reach the tenant lists named in a ring (or in a
+job) without declaring them, as they cannot know them beforehand: a
+cluster only requires the keys of a script to share the slot it runs in.
+"""
+
+import hashlib
+import json
+import math
+import random
+import time
+import redis.asyncio as aioredis
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from lib.config import get_settings
+from lib.executors import get_supported_languages
+from lib.logger import log
+
+PRIORITIES = ("interactive", "batch")
+
+# Wakeup tokens kept at most, a few stale tokens only cost an empty pick
+WAKEUP_MAX = 1024
+
+# Tenant of the jobs whose client is unknown, exempt from the running cap
+ANONYMOUS_TENANT = "anonymous"
+
+# Abandoned jobs dropped by one pick before it gives up for this round trip
+DEQUEUE_MAX_SKIPS = 32
+
+# Recent run times kept per language, and the estimate for a language
+# without any yet
+SERVICE_SAMPLES = 50
+DEFAULT_SERVICE_TIME = 1.0
+
+# Pushes a job onto its tenant's list unless max depth jobs are pending. A
+# tenant with no other waiting job joins the end of the round robin.
+# KEYS: tenant list, tenant ring, pending hash, legacy list, wakeup list
+# ARGV: class, tenant, job, max depth (0 for no limit), max wakeup tokens
+# Returns: pending jobs including this one, or -(pending jobs) if refused
+ENQUEUE_SCRIPT = """
+local depth = redis.call('LLEN', KEYS[4])
+for _, count in ipairs(redis.call('HVALS', KEYS[3])) do
+    depth = depth + tonumber(count)
+end
+local max_depth = tonumber(ARGV[4])
+if max_depth > 0 and depth >= max_depth then
+    return -depth
+end
+
+if redis.call('LPUSH', KEYS[1], ARGV[3]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[2])
+end
+redis.call('HINCRBY', KEYS[3], ARGV[1], 1)
+redis.call('LPUSH', KEYS[5], '1')
+redis.call('LTRIM', KEYS[5], 0, tonumber(ARGV[5]) - 1)
+return depth + 1
+"""
+
+# Weighted pick of a class and language with waiting jobs, then the next
+# tenant in its round robin that runs fewer than cap jobs. The tenant's
+# oldest job is moved into the processing list and counted as running.
+# Abandoned jobs picked on the way are dropped, up to ARGV max skips.
+# Tenant lists are named after their ring: {class}:tenants, {class}:tenant:{id}
+# KEYS: rings..., legacy list, processing list, abandoned set, attempts hash,
+#       pending hash, running hash
+# ARGV: weight of each ring and the legacy list..., random number in [0, 1),
+#       max skips, running jobs cap per tenant (0 for no limit), uncapped
+#       anonymous tenant
+# Returns: {picked job or '', ids of the dropped jobs...}
+DEQUEUE_SCRIPT = """
+local lists = #KEYS - 5
+local processing = KEYS[lists + 1]
+local abandoned = KEYS[lists + 2]
+local attempts = KEYS[lists + 3]
+local pending = KEYS[lists + 4]
+local running = KEYS[lists + 5]
+local max_skips = tonumber(ARGV[lists + 2])
+local cap = tonumber(ARGV[lists + 3])
+local anonymous = ARGV[lists + 4]
+local result = {''}
+local full = {}
+
+while true do
+    local weights = {}
+    local total = 0
+    for i = 1, lists do
+        weights[i] = 0
+        if not full[i] and redis.call('LLEN', KEYS[i]) > 0 then
+            weights[i] = tonumber(ARGV[i])
+            total = total + weights[i]
+        end
+    end
+    if total == 0 then break end
+
+    local pick = tonumber(ARGV[lists + 1]) * total
+    local chosen = 0
+    for i = 1, lists do
+        if weights[i] > 0 then
+            chosen = i
+            pick = pick - weights[i]
+            if pick < 0 then break end
+        end
+    end
+
+    local raw = false
+    local tenant = false
+    if chosen == lists then
+        raw = redis.call('LMOVE', KEYS[chosen], processing, 'RIGHT', 'LEFT')
+    else
+        -- Turn the ring until a tenant under its cap comes up
+        local ring = KEYS[chosen]
+        for _ = 1, redis.call('LLEN', ring) do
+            local candidate = redis.call('LMOVE', ring, ring, 'RIGHT', 'LEFT')
+            if cap == 0 or candidate == anonymous
+                    or tonumber(redis.call('HGET', running, candidate) or 0) < cap then
+                tenant = candidate
+                break
+            end
+        end
+
+        if tenant then
+            local class = string.sub(ring, 1, -9)
+            local queue = class .. ':tenant:' .. tenant
+            raw = redis.call('LMOVE', queue, processing, 'RIGHT', 'LEFT')
+            if redis.call('LLEN', queue) == 0 then
+                redis.call('LREM', ring, 1, tenant)
+            end
+            if raw then
+                redis.call('HINCRBY', pending, class, -1)
+            end
+        else
+            full[chosen] = true
+        end
+    end
+
+    if raw then
+        local job_id = string.match(raw, '^{"queue": "[^"]+", "job_id": "([^"]+)"')
+        if job_id and redis.call('ZSCORE', abandoned, job_id) then
+            redis.call('LREM', processing, 1, raw)
+            redis.call('HDEL', attempts, raw)
+            table.insert(result, job_id)
+            if #result > max_skips then break end
+        else
+            if tenant then
+                redis.call('HINCRBY', running, tenant, 1)
+            end
+            result[1] = raw
+            break
+        end
+    end
+end
+return result
+"""
+
+# Removes a finished job from the processing list, and from its tenant's
+# running jobs unless it was recovered meanwhile. A tenant dropping below the
+# cap wakes a worker for the jobs it held back.
+# KEYS: processing list, attempts hash, running hash, wakeup list
+# ARGV: job, running jobs cap per tenant, anonymous tenant, max wakeup tokens
+ACK_SCRIPT = """
+local removed = redis.call('LREM', KEYS[1], 1, ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if removed > 0 then
+    local tenant = string.match(
+        ARGV[1], '^{"queue": "[^"]+", "job_id": "[^"]+", "tenant": "([^"]+)"'
+    )
+    if tenant then
+        local left = redis.call('HINCRBY', KEYS[3], tenant, -1)
+        if left <= 0 then
+            redis.call('HDEL', KEYS[3], tenant)
+        end
+        local cap = tonumber(ARGV[2])
+        if cap > 0 and tenant ~= ARGV[3] and left == cap - 1 then
+            redis.call('LPUSH', KEYS[4], '1')
+            redis.call('LTRIM', KEYS[4], 0, tonumber(ARGV[4]) - 1)
+        end
+    end
+end
+return removed
+"""
+
+# Moves every job of a processing list back to the front of its tenant's
+# list, the tenant taking the next turn, or into the failed result once it
+# ran out of attempts. Redelivered jobs are counted in a hash keyed by the
+# raw job, cleared on ack. Like ack, wakes a worker for a tenant dropping
+# below the cap.
+# KEYS: processing list, legacy list, workers set, attempts hash, wakeup
+#       list, capacity hash, pending hash, running hash
+# ARGV: worker id, max attempts, running jobs cap per tenant, anonymous
+#       tenant, max wakeup tokens
+RECOVER_SCRIPT = """
+local cap = tonumber(ARGV[3])
+local failed = {}
+while true do
+    local raw = redis.call('RPOP', KEYS[1])
+    if not raw then break end
+    local queue, tenant = string.match(
+        raw, '^{"queue": "([^"]+)", "job_id": "[^"]+", "tenant": "([^"]+)"'
+    )
+    if tenant then
+        local left = redis.call('HINCRBY', KEYS[8], tenant, -1)
+        if left <= 0 then
+            redis.call('HDEL', KEYS[8], tenant)
+        end
+        if cap > 0 and tenant ~= ARGV[4] and left == cap - 1 then
+            redis.call('LPUSH', KEYS[5], '1')
+        end
+    end
+
+    local attempts = redis.call('HINCRBY', KEYS[4], raw, 1) + 1
+    if attempts > tonumber(ARGV[2]) then
+        redis.call('HDEL', KEYS[4], raw)
+        table.insert(failed, raw)
+    else
+        local class = queue and string.match(queue, '^(.*):tenant:[^:]+$')
+        if class then
+            if redis.call('RPUSH', queue, raw) == 1 then
+                redis.call('RPUSH', class .. ':tenants', tenant)
+            end
+            redis.call('HINCRBY', KEYS[7], class, 1)
+        else
+            redis.call('RPUSH', KEYS[2], raw)
+        end
+        redis.call('LPUSH', KEYS[5], '1')
+    end
+end
+redis.call('LTRIM', KEYS[5], 0, tonumber(ARGV[5]) - 1)
+redis.call('SREM', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[6], ARGV[1])
+return failed
+"""
+
+# Jobs ahead of a waiting job in its class and language: its tenant's older
+# jobs, and as many plus one of every other tenant's, who take turns
+# KEYS: tenant list, tenant ring
+# ARGV: job, tenant
+# Returns: jobs ahead, or -1 once the job left the queue
+POSITION_SCRIPT = """
+local index = redis.call('LPOS', KEYS[1], ARGV[1])
+if not index then return -1 end
+
+local own = redis.call('LLEN', KEYS[1]) - index - 1
+local ahead = own
+local class = string.sub(KEYS[2], 1, -9)
+for _, tenant in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    if tenant ~= ARGV[2] then
+        local waiting = redis.call('LLEN', class .. ':tenant:' .. tenant)
+        ahead = ahead + math.min(waiting, own + 1)
+    end
+end
+return ahead
+"""
+
+
+def _tenant_id(tenant: Optional[str]) -> str:
+    """Short hash of a client identity, safe in key names and scripts"""
+    if not tenant:
+        return ANONYMOUS_TENANT
+    return hashlib.sha256(tenant.encode()).hexdigest()[:16]
+
+
+class QueueFullError(Exception):
+    """A job was refused because too many are already pending"""
+
+    def __init__(self, depth: int):
+        super().__init__(f"{depth} jobs already queued")
+        self.depth = depth
+
+
+class JobQueue:
+
+    def __init__(self, redis_client: aioredis.Redis):
+        self.redis = redis_client
+        self.settings = get_settings()
+        self.name = self.settings.job_queue_name
+        # Hash tag keeping every key of the queue in one cluster slot
+        self.tag = self.name if "{" in self.name else f"{{{self.name}}}"
+        self._enqueue = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._dequeue = self.redis.register_script(DEQUEUE_SCRIPT)
+        self._ack = self.redis.register_script(ACK_SCRIPT)
+        self._recover = self.redis.register_script(RECOVER_SCRIPT)
+        self._position = self.redis.register_script(POSITION_SCRIPT)
+
+        # Stats
+        self.skipped = 0
+
+    def _class_key(self, priority: str, language: str) -> str:
+        return f"{self.tag}:{priority}:{language}"
+
+    def _ring_key(self, class_key: str) -> str:
+        return f"{class_key}:tenants"
+
+    def _tenant_key(self, class_key: str, tenant: str) -> str:
+        return f"{class_key}:tenant:{tenant}"
+
+    def _processing_key(self, worker_id: str) -> str:
+        return f"{self.tag}:processing:{worker_id}"
+
+    def _heartbeat_key(self, worker_id: str) -> str:
+        return f"{self.tag}:heartbeat:{worker_id}"
+
+    def _workers_key(self) -> str:
+        return f"{self.tag}:workers"
+
+    def _attempts_key(self) -> str:
+        return f"{self.tag}:attempts"
+
+    def _wakeup_key(self) -> str:
+        return f"{self.tag}:wakeup"
+
+    def _abandoned_key(self) -> str:
+        return f"{self.tag}:abandoned"
+
+    def _capacity_key(self) -> str:
+        return f"{self.tag}:capacity"
+
+    def _service_key(self, language: str) -> str:
+        return f"{self.tag}:service_time:{language}"
+
+    def _pending_key(self) -> str:
+        return f"{self.tag}:pending"
+
+    def _running_key(self) -> str:
+        return f"{self.tag}:running"
+
+    def _classes(self) -> List[Tuple[str, str]]:
+        """(priority, language) of every class"""
+        languages = sorted(get_supported_languages())
+        return [(priority, language) for priority in PRIORITIES for language in languages]
+
+    def _ring_keys(self) -> List[str]:
+        """Tenant rings of every class, then the legacy list"""
+        return [
+            self._ring_key(self._class_key(priority, language))
+            for priority, language in self._classes()
+        ] + [self.name]
+
+    def _classes_ahead(self, priority: str) -> List[Tuple[str, str]]:
+        """Keys and languages of the classes served before or with a priority class"""
+        rank = PRIORITIES.index(priority)
+        return [
+            (self._class_key(class_priority, language), language)
+            for class_priority, language in self._classes()
+            if PRIORITIES.index(class_priority) <= rank
+        ]
+
+    def _encode(self, job: Dict[str, Any]) -> Tuple[str, str, str]:
+        """(class, tenant, raw job) of a job"""
+        priority = job.get("priority") or "interactive"
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        class_key = self._class_key(priority, job["language"])
+        tenant = _tenant_id(job.get("tenant"))
+        raw_job = json.dumps(
+            {
+                "queue": self._tenant_key(class_key, tenant),
+                "job_id": job["job_id"],
+                "tenant": tenant,
+                **{key: value for key, value in job.items() if key != "tenant"},
+            }
+        )
+        return class_key, tenant, raw_job
+
+    def _weights(self, affinity: Sequence[str]) -> List[int]:
+        class_weights = {
+            "interactive": self.settings.queue_weight_interactive,
+            "batch": self.settings.queue_weight_batch,
+        }
+        return [
+            class_weights[priority]
+            * (self.settings.worker_affinity_weight if language in affinity else 1)
+            for priority, language in self._classes()
+        ] + [class_weights["interactive"]]
+
+    async def enqueue(self, job: Dict[str, Any], max_depth: int = 0) -> int:
+        """
+        Queue a job by its "priority" (default interactive), "language" and
+        "tenant" (the end user it was queued for, None if unknown)
+
+        Args:
+            job: Job to queue
+            max_depth: Refuse the job once this many are pending (0 for no limit)
+
+        Returns:
+            Number of pending jobs, including this one
+
+        Raises:
+            QueueFullError: max_depth jobs are already pending
+        """
+        class_key, tenant, raw_job = self._encode(job)
+        depth = await self._enqueue(
+            keys=[
+                self._tenant_key(class_key, tenant),
+                self._ring_key(class_key),
+                self._pending_key(),
+                self.name,
+                self._wakeup_key(),
+            ],
+            args=[class_key, tenant, raw_job, max_depth, WAKEUP_MAX],
+        )
+        if depth < 0:
+            raise QueueFullError(-depth)
+        return depth
+
+    async def depth(self) -> int:
+        pipe = self.redis.pipeline()
+        pipe.hvals(self._pending_key())
+        pipe.llen(self.name)
+        counts, legacy = await pipe.execute()
+        return sum(int(count) for count in counts) + legacy
+
+    async def abandon(self, job_id: str) -> None:
+        """Mark a job nobody waits for, it is dropped instead of run"""
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.zadd(self._abandoned_key(), {job_id: now})
+        # Jobs expire with their metadata, older marks cannot match anything
+        pipe.zremrangebyscore(
+            self._abandoned_key(), "-inf", now - self.settings.redis_ttl
+        )
+        await pipe.execute()
+
+    async def dequeue(
+        self, worker_id: str, timeout: float, affinity: Sequence[str] = ()
+    ) -> Optional[str]:
+        """
+        Move the next job, by weighted pick of its class and its tenant's
+        turn, into the worker's processing list
+
+        Args:
+            worker_id: Worker taking the job
+            timeout: Seconds to wait for a job
+            affinity: Languages the worker prefers
+
+        Returns:
+            The raw job, to be passed to ack(), or None on timeout
+        """
+        keys = self._ring_keys() + [
+            self._processing_key(worker_id),
+            self._abandoned_key(),
+            self._attempts_key(),
+            self._pending_key(),
+            self._running_key(),
+        ]
+        weights = self._weights(affinity)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            raw_job, *skipped = await self._dequeue(
+                keys=keys,
+                args=[
+                    *weights,
+                    random.random(),
+                    DEQUEUE_MAX_SKIPS,
+                    self.settings.tenant_max_running,
+                    ANONYMOUS_TENANT,
+                ],
+            )
+            if skipped:
+                self.skipped += len(skipped)
+                log.info(f"Dropped abandoned jobs: {', '.join(skipped)}")
+            if raw_job:
+                return raw_job
+            if skipped:
+                continue  # Gave up after DEQUEUE_MAX_SKIPS, more may be waiting
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Woken by the next enqueue or freed tenant, tokens left by jobs
+            # others took are stale.
+            # Whole seconds, a timeout rounding down to 0 would block forever.
+            await self.redis.blpop(  # type: ignore[misc]
+                self._wakeup_key(), timeout=math.ceil(remaining)
+            )
+
+    async def position(
+        self, job: Dict[str, Any]
+    ) -> Optional[Tuple[int, Optional[float]]]:
+        """
+        Place of a queued job in line, in one round trip
+
+        Returns:
+            (position, starting at 1, estimated seconds until it starts or None
+            without live workers), or None once the job left the queue
+        """
+        class_key, tenant, raw_job = self._encode(job)
+        classes = self._classes_ahead(job.get("priority") or "interactive")
+
+        pipe = self.redis.pipeline(transaction=False)
+        await self._position(
+            keys=[self._tenant_key(class_key, tenant), self._ring_key(class_key)],
+            args=[raw_job, tenant],
+            client=pipe,
+        )
+        self._add_counts(pipe, classes)
+        self._add_wait_inputs(pipe, classes)
+        ahead_in_class, pending, legacy, *inputs = await pipe.execute()
+        if ahead_in_class < 0:
+            return None
+
+        counts = self._counts(pending, legacy)
+        # Only the jobs served before this one count in its own class
+        counts[[key for key, _ in classes].index(class_key)] = ahead_in_class
+        return sum(counts) + 1, self._wait(counts, inputs)
+
+    async def expected_wait(self, priority: str = "interactive") -> Optional[float]:
+        """Estimated seconds a job queued now would wait, None without live workers"""
+        classes = self._classes_ahead(priority)
+        pipe = self.redis.pipeline(transaction=False)
+        self._add_counts(pipe, classes)
+        self._add_wait_inputs(pipe, classes)
+        pending, legacy, *inputs = await pipe.execute()
+        return self._wait(self._counts(pending, legacy), inputs)
+
+    def _add_counts(
+        self, pipe: aioredis.client.Pipeline, classes: List[Tuple[str, str]]
+    ) -> None:
+        pipe.hmget(self._pending_key(), [key for key, _ in classes])
+        pipe.llen(self.name)
+
+    def _counts(self, pending: List[Any], legacy: int) -> List[int]:
+        """Pending jobs of each class, then of the legacy list"""
+        return [int(count or 0) for count in pending] + [legacy]
+
+    def _add_wait_inputs(
+        self, pipe: aioredis.client.Pipeline, classes: List[Tuple[str, str]]
+    ) -> None:
+        # The legacy list last, its jobs' language is unknown
+        for _, language in classes + [(self.name, "")]:
+            pipe.lrange(self._service_key(language), 0, -1)
+        pipe.hvals(self._capacity_key())
+
+    def _wait(self, counts: List[int], inputs: List[Any]) -> Optional[float]:
+        """Seconds to run the counted jobs of each class on every live slot"""
+        *samples, capacity = inputs
+        slots = sum(int(value) for value in capacity)
+        if not slots:
+            return None
+        work = 0.0
+        for count, times in zip(counts, samples):
+            mean = (
+                sum(float(sample) for sample in times) / len(times)
+                if times
+                else DEFAULT_SERVICE_TIME
+            )
+            work += count * mean
+        return work / slots
+
+    async def ack(
+        self,
+        worker_id: str,
+        raw_job: str,
+        language: Optional[str] = None,
+        service_time: Optional[float] = None,
+    ) -> None:
+        """
+        Remove a finished job from the worker's processing list, freeing its
+        tenant's running slot
+
+        Args:
+            worker_id: Worker that ran the job
+            raw_job: The job as returned by dequeue()
+            language: Language of the job, to record its service_time
+            service_time: Seconds the job took, for wait estimates
+        """
+        pipe = self.redis.pipeline()
+        await self._ack(
+            keys=[
+                self._processing_key(worker_id),
+                self._attempts_key(),
+                self._running_key(),
+                self._wakeup_key(),
+            ],
+            args=[
+                raw_job,
+                self.settings.tenant_max_running,
+                ANONYMOUS_TENANT,
+                WAKEUP_MAX,
+            ],
+            client=pipe,
+        )
+        if language and service_time is not None:
+            pipe.lpush(self._service_key(language), round(service_time, 3))
+            pipe.ltrim(self._service_key(language), 0, SERVICE_SAMPLES - 1)
+        await pipe.execute()
+
+    async def heartbeat(self, worker_id: str, capacity: int = 1) -> None:
+        """Keep the worker alive, with the number of jobs it runs at once"""
+        pipe = self.redis.pipeline()
+        pipe.set(
+            self._heartbeat_key(worker_id),
+            "1",
+            ex=self.settings.worker_heartbeat_ttl,
+        )
+        pipe.sadd(self._workers_key(), worker_id)
+        pipe.hset(self._capacity_key(), worker_id, capacity)
+        await pipe.execute()
+
+    async def unregister(self, worker_id: str) -> List[str]:
+        """
+        Remove a stopping worker, returning any job it did not ack to the queue
+
+        Returns:
+            Raw jobs that ran out of attempts
+        """
+        failed = await self.recover(worker_id)
+        await self.redis.delete(self._heartbeat_key(worker_id))
+        return failed
+
+    async def recover(self, worker_id: str) -> List[str]:
+        """
+        Return the jobs in a worker's processing list to the front of their
+        tenants' lines
+
+        Returns:
+            Raw jobs that ran out of attempts, to be failed by the caller
+        """
+        return await self._recover(
+            keys=[
+                self._processing_key(worker_id),
+                self.name,
+                self._workers_key(),
+                self._attempts_key(),
+                self._wakeup_key(),
+                self._capacity_key(),
+                self._pending_key(),
+                self._running_key(),
+            ],
+            args=[
+                worker_id,
+                self.settings.job_max_attempts,
+                self.settings.tenant_max_running,
+                ANONYMOUS_TENANT,
+                WAKEUP_MAX,
+            ],
+        )
+
+    async def reap(self) -> Tuple[List[str], List[str]]:
+        """
+        Recover the jobs of every worker whose heartbeat expired
+
+        Returns:
+            (ids of the dead workers, raw jobs that ran out of attempts)
+        """
+        dead: List[str] = []
+        failed: List[str] = []
+
+        workers = await self.redis.smembers(self._workers_key())  # type: ignore[misc]
+        for worker_id in workers:
+            if await self.redis.exists(self._heartbeat_key(worker_id)):
+                continue
+            recovered = await self.recover(worker_id)
+            dead.append(worker_id)
+            failed.extend(recovered)
+            log.warning(
+                f"Worker {worker_id} heartbeat expired, recovered its jobs "
+                f"({len(recovered)} out of attempts)"
+            )
+        return dead, failed
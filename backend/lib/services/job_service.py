@@ -29,9 +29,11 @@ class JobService:
     def _job_key(self, job_id: str) -> str:
         return f"job:{job_id}"
 
-    async def create_job(self, code: str, language: str, filename: str) -> str:
+    async def create_job(
+        self, code: str, language: str, filename: str, job_id: Optional[str] = None
+    ) -> str:
 
-        job_id = str(uuid.uuid4())
+        job_id = job_id or str(uuid.uuid4())
         created_at = str(time.time())
 
         job_data = {
@@ -0,0 +1,145 @@
+"""
+Batched output publishing for the worker
+
+PTY output arrives in small chunks. Publishing each one separately costs a
+JSON encode and a Redis round trip per chunk, so chunks are merged per job
+and flushed through a single pipeline when either:
+- A job has buffered output_batch_bytes, or
+- output_flush_interval_ms has passed since the first unflushed chunk
+
+The buffer is bounded by output_buffer_max_kb. Once it is full, publish()
+returns False and the caller is expected to stop reading (see
+PtySession.pause_reading) until when_drained() fires.
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from lib.config import get_settings
+from lib.logger import log
+from lib.redis import get_async_redis
+from .pubsub_service import PubSubService, get_pubsub_service
+
+
+class OutputPublisher:
+
+    def __init__(
+        self,
+        pubsub: Optional[PubSubService] = None,
+        batch_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_buffer_bytes: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.pubsub = pubsub or get_pubsub_service()
+        self.batch_bytes = batch_bytes or settings.output_batch_bytes
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else settings.output_flush_interval_ms / 1000
+        )
+        self.max_buffer_bytes = max_buffer_bytes or settings.output_buffer_max_kb * 1024
+
+        # job_id -> chunks in arrival order (dicts preserve job order too)
+        self._buffers: Dict[str, List[str]] = {}
+        self._job_bytes: Dict[str, int] = {}
+        self._buffered_bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._drain_callbacks: List[Callable[[], None]] = []
+
+        # Stats
+        self.chunks_received = 0
+        self.messages_published = 0
+        self.round_trips = 0
+
+    @property
+    def is_full(self) -> bool:
+        return self._buffered_bytes >= self.max_buffer_bytes
+
+    def publish(self, job_id: str, data: str) -> bool:
+        """
+        Buffer a chunk of output for a job. Must be called on the event loop.
+
+        Returns:
+            False if the buffer is full and the producer should pause
+        """
+        self._buffers.setdefault(job_id, []).append(data)
+        self._job_bytes[job_id] = self._job_bytes.get(job_id, 0) + len(data)
+        self._buffered_bytes += len(data)
+        self.chunks_received += 1
+
+        if self._job_bytes[job_id] >= self.batch_bytes:
+            self._schedule_flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._schedule_flush)
+
+        return not self.is_full
+
+    def when_drained(self, callback: Callable[[], None]) -> None:
+        """Call callback once the buffer has room again"""
+        if not self.is_full:
+            callback()
+        else:
+            self._drain_callbacks.append(callback)
+
+    async def flush(self) -> None:
+        """
+        Publish everything buffered so far.
+
+        Flushes are serialized, so awaiting this also guarantees that earlier
+        output has been published (call before publishing job completion).
+        """
+        async with self._flush_lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._buffers:
+                return
+
+            buffers, self._buffers = self._buffers, {}
+            self._job_bytes = {}
+            self._buffered_bytes = 0
+
+            try:
+                redis = await get_async_redis()
+                pipe = redis.pipeline(transaction=False)
+                for job_id, chunks in buffers.items():
+                    await self.pubsub.add_output(
+                        pipe, job_id, "stdout", "".join(chunks)
+                    )
+                await pipe.execute()
+
+                self.messages_published += len(buffers)
+                self.round_trips += 1
+            except Exception as e:
+                log.error(f"Failed to publish output batch: {e}")
+            finally:
+                self._notify_drained()
+
+    def _schedule_flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task and not self._flush_task.done():
+            # A flush is in flight; it re-checks the buffer when it finishes
+            return
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        await self.flush()
+        # Flush again straight away if a full batch built up in the meantime
+        while any(size >= self.batch_bytes for size in self._job_bytes.values()):
+            await self.flush()
+
+        if self._buffers and self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._schedule_flush)
+
+    def _notify_drained(self) -> None:
+        callbacks, self._drain_callbacks = self._drain_callbacks, []
+        for callback in callbacks:
+            callback()
@@ -1,18 +1,87 @@
 """
 Real-time communication between executors and WebSocket clients
+
+Output is routed to the WebSocket node serving the job. Every node has an
+id (NODE_ID, or generated at startup) that it stamps into the jobs it
+queues as "node_id", and subscribes a single channel, node:{node_id}:output,
+on one shared Pub/Sub connection. Workers publish all of a routed job's
+messages there with its "job_id", and the node hands each message to the
+subscription of that job. A node only receives its own clients' traffic,
+whatever the number of nodes.
+
+Jobs without a node id (queued by older services) are published on their
+own job:{id}:output and job:{id}:complete channels.
+
+Every message is also appended to the job's output log, a Redis Stream
+(job:{id}:log) capped at output_log_max_entries and expiring with the job,
+and carries its stream "id". A subscription first replays the log, from
+the start or after the last_id a reconnecting client saw, then follows the
+live messages, skipping the ones already replayed. Output published before
+the subscription was live is not lost, and a client whose socket dropped
+resumes where it stopped instead of running the job again. The node that
+subscribes last, as recorded in the job hash (job:{id}), receives the
+job's live messages.
 """
 
+import asyncio
 import json
-from typing import Callable, Optional, Dict, Any, Awaitable
+import uuid
+from typing import Callable, Optional, Dict, Any, Awaitable, Tuple
 import redis.asyncio as aioredis
-from lib.redis import get_async_redis
+from lib.config import get_settings
+from lib.redis import PubSubMultiplexer, get_async_redis
 from lib.logger import log
 
+# Appends a message to the job's log and publishes it with its stream id.
+# The node recorded in the job hash overrides the route given by the worker.
+# KEYS: job log stream, job hash
+# ARGV: channel, routed to a node ('1' or '0'), job id, message, max log
+#       entries, log ttl
+LOG_SCRIPT = """
+local channel = ARGV[1]
+local routed = ARGV[2] == '1'
+local node = redis.call('HGET', KEYS[2], 'node_id')
+if node then
+    channel = 'node:' .. node .. ':output'
+    routed = true
+end
+
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[5], '*', 'm', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+
+local head = '{"id": "' .. id .. '", '
+if routed then
+    head = head .. '"job_id": "' .. ARGV[3] .. '", '
+end
+redis.call('PUBLISH', channel, head .. string.sub(ARGV[4], 2))
+return id
+"""
+
 
 class PubSubService:
 
-    def __init__(self):
-        self._pubsubs: Dict[str, aioredis.client.PubSub] = {}
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or get_settings().node_id or f"ws-{uuid.uuid4().hex[:8]}"
+
+        # Subscriber side: one connection and channel for every client of the node
+        self._multiplexer: Optional[PubSubMultiplexer] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._subscriptions: Dict[str, asyncio.Queue] = {}
+
+        # Publisher side: job_id -> node channel of the jobs being run
+        self._routes: Dict[str, str] = {}
+        self._log_script = None
+
+        # Stats
+        self.unroutable = 0
+
+    def route(self, job_id: str, node_id: Optional[str]):
+        """Publish the job's messages to the node that queued it"""
+        if node_id:
+            self._routes[job_id] = self._node_channel(node_id)
+
+    def unroute(self, job_id: str):
+        self._routes.pop(job_id, None)
 
     async def publish_output(self, job_id: str, stream: str, data: str):
         """
@@ -21,87 +90,234 @@ class PubSubService:
             stream: Either 'stdout' or 'stderr'
             data: Output data to publish
         """
-        redis = await get_async_redis()
-        channel = self._output_channel(job_id)
-        message = json.dumps({"type": "output", "stream": stream, "data": data})
-        await redis.publish(channel, message)
-        log.debug(f"Published to {channel}: {stream}")
+        await self._publish(job_id, self._output_channel(job_id), self._output(stream, data))
+        log.debug(f"Published output for job {job_id}: {stream}")
 
-    async def publish_complete(
-        self, job_id: str, exit_code: int, execution_time: float
+    async def add_output(
+        self, pipe: aioredis.client.Pipeline, job_id: str, stream: str, data: str
     ):
-        redis = await get_async_redis()
-        channel = self._complete_channel(job_id)
-        message = json.dumps(
-            {
-                "type": "complete",
-                "exit_code": exit_code,
-                "execution_time": execution_time,
-            }
+        """
+        Queue an output message on a pipeline instead of publishing immediately.
+        Used by OutputPublisher to send batches in a single round trip.
+        """
+        await self._publish(
+            job_id, self._output_channel(job_id), self._output(stream, data), pipe
         )
-        await redis.publish(channel, message)
+
+    async def publish_resources(self, job_id: str, sample: Dict[str, Any]):
+        """Publish a live resource sample on the job's output channel"""
+        payload = {"type": "resources", **sample}
+        await self._publish(job_id, self._output_channel(job_id), payload)
+
+    async def publish_complete(
+        self,
+        job_id: str,
+        exit_code: int,
+        execution_time: float,
+        resources: Optional[Dict[str, Any]] = None,
+        cancelled: bool = False,
+    ):
+        payload: Dict[str, Any] = {
+            "type": "complete",
+            "exit_code": exit_code,
+            "execution_time": execution_time,
+        }
+        if resources is not None:
+            payload["resources"] = resources
+        if cancelled:
+            payload["cancelled"] = True
+        await self._publish(job_id, self._complete_channel(job_id), payload)
         log.info(f"Published completion for job {job_id}")
 
     async def publish_error(self, job_id: str, error_message: str):
-        redis = await get_async_redis()
-        channel = self._output_channel(job_id)
-        message = json.dumps({"type": "error", "message": error_message})
-        await redis.publish(channel, message)
+        payload = {"type": "error", "message": error_message}
+        await self._publish(job_id, self._output_channel(job_id), payload)
         log.error(f"Published error for job {job_id}: {error_message}")
 
+    async def start(self):
+        """Subscribe the node channel, once. Call before queueing jobs."""
+        if self._multiplexer:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._multiplexer:
+                return
+            multiplexer = PubSubMultiplexer(await get_async_redis(), self.node_id)
+            await multiplexer.start()
+            await multiplexer.subscribe(self._node_channel(self.node_id), self._dispatch)
+            self._multiplexer = multiplexer
+            log.info(f"Receiving output for node {self.node_id}")
+
     async def subscribe_to_channels(
-        self, job_id: str, on_message: Callable[[Dict[str, Any]], Awaitable[None]]
+        self,
+        job_id: str,
+        on_message: Callable[[Dict[str, Any]], Awaitable[None]],
+        last_id: Optional[str] = None,
     ) -> None:
         """
-        Subscribe to all job-related channels and handle messages
+        Handle the messages of a job, replaying its output log first
+
+        Live messages arrive on the node channel and reach this job through
+        its own queue. A later subscription to the same job, a client that
+        resumed, takes the live messages over and ends this one.
 
         Args:
             job_id: Job identifier
             on_message: Async callback function to handle received messages
+            last_id: Id of the last message the client received, if resuming
         """
-        redis = await get_async_redis()
-        pubsub = redis.pubsub()
+        messages: asyncio.Queue = asyncio.Queue()
+        replaced = self._subscriptions.get(job_id)
+        self._subscriptions[job_id] = messages
+        if replaced is not None:
+            replaced.put_nowait(None)  # Its client resumed, possibly on a new socket
 
-        channels = [self._output_channel(job_id), self._complete_channel(job_id)]
+        try:
+            await self.start()
+            log.info(f"Subscribed to messages for job {job_id}")
 
-        await pubsub.subscribe(*channels)
-        self._pubsubs[job_id] = pubsub
+            # Registered before reading the log, so nothing falls in between
+            redis = await get_async_redis()
+            pipe = redis.pipeline()
+            pipe.hset(self._job_key(job_id), "node_id", self.node_id)
+            pipe.expire(self._job_key(job_id), get_settings().redis_ttl)
+            pipe.xrange(self._log_key(job_id), min=f"({last_id}" if last_id else "-")
+            _, _, entries = await pipe.execute()
 
-        log.info(f"Subscribed to channels for job {job_id}")
+            cursor = self._parse_id(last_id) if last_id else (0, 0)
+            for entry_id, fields in entries:
+                data = json.loads(fields["m"])
+                data["id"] = entry_id
+                cursor = self._parse_id(entry_id)
+                if await self._deliver(job_id, data, on_message):
+                    return
 
-        try:
-            async for message in pubsub.listen():
-                if message["type"] == "message":
-                    try:
-                        data = json.loads(message["data"])
-                        await on_message(data)
-
-                        # Break the loop on job completion
-                        if data.get("type") == "complete":
-                            log.info(f"Job {job_id} completed, stopping subscription")
-                            break
-                    except json.JSONDecodeError:
-                        log.error(f"Failed to decode message: {message['data']}")
-                    except Exception as e:
-                        log.error(f"Error handling message: {str(e)}")
+            while True:
+                data = await messages.get()
+                if data is None:
+                    break  # Unsubscribed
+                if self._parse_id(data.get("id", "0-0")) <= cursor:
+                    continue  # Already replayed from the log
+                if await self._deliver(job_id, data, on_message):
+                    break
         finally:
-            await self.unsubscribe(job_id)
+            await self.unsubscribe(job_id, messages)
+
+    async def _deliver(
+        self,
+        job_id: str,
+        data: Dict[str, Any],
+        on_message: Callable[[Dict[str, Any]], Awaitable[None]],
+    ) -> bool:
+        """Hand a message to the client, True once the job completed"""
+        try:
+            await on_message(data)
+        except Exception as e:
+            log.error(f"Error handling message: {str(e)}")
+            return False
+
+        if data.get("type") == "complete":
+            log.info(f"Job {job_id} completed, stopping subscription")
+            return True
+        return False
 
-    async def unsubscribe(self, job_id: str):
+    async def job_node(self, job_id: str) -> Optional[str]:
+        """Node receiving the job's live messages, the last one to subscribe"""
+        redis = await get_async_redis()
+        return await redis.hget(self._job_key(job_id), "node_id")  # type: ignore[misc]
 
-        if job_id in self._pubsubs:
-            pubsub = self._pubsubs[job_id]
-            await pubsub.unsubscribe()
-            await pubsub.close()
-            del self._pubsubs[job_id]
-            log.info(f"Unsubscribed from channels for job {job_id}")
+    async def unsubscribe(self, job_id: str, messages: Optional[asyncio.Queue] = None):
+        """
+        Args:
+            job_id: Job identifier
+            messages: Only end this subscription, not one that replaced it
+        """
+        if messages is not None and self._subscriptions.get(job_id) is not messages:
+            return
+        messages = self._subscriptions.pop(job_id, None)
+        if messages:
+            # Ends the job's subscribe_to_channels loop if still running
+            messages.put_nowait(None)
+            log.info(f"Unsubscribed from messages for job {job_id}")
 
     async def close(self):
-        for job_id in list(self._pubsubs.keys()):
+        for job_id in list(self._subscriptions.keys()):
             await self.unsubscribe(job_id)
+        if self._multiplexer:
+            await self._multiplexer.close()
+            self._multiplexer = None
 
         log.info("Pub/Sub subscriptions closed")
 
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": 1 if self._multiplexer else 0,
+            "subscribed_jobs": len(self._subscriptions),
+            "messages": self._multiplexer.messages if self._multiplexer else 0,
+            "unroutable": self.unroutable,
+        }
+
+    def _dispatch(self, raw: str):
+        """Hand a node channel message to the subscription of its job"""
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            log.error(f"Failed to decode message: {raw}")
+            return
+
+        messages = self._subscriptions.get(data.pop("job_id", None))
+        if messages is None:
+            # The client went away, or the message was meant for a restarted node
+            self.unroutable += 1
+            return
+        messages.put_nowait(data)
+
+    async def _publish(
+        self,
+        job_id: str,
+        channel: str,
+        payload: Dict[str, Any],
+        pipe: Optional[aioredis.client.Pipeline] = None,
+    ):
+        """Log a job's message and publish it, to its node if routed"""
+        client = pipe if pipe is not None else await get_async_redis()
+        if self._log_script is None:
+            self._log_script = client.register_script(LOG_SCRIPT)
+
+        node_channel = self._routes.get(job_id)
+        settings = get_settings()
+        await self._log_script(
+            keys=[self._log_key(job_id), self._job_key(job_id)],
+            args=[
+                node_channel or channel,
+                "1" if node_channel else "0",
+                job_id,
+                json.dumps(payload),
+                settings.output_log_max_entries,
+                settings.redis_ttl,
+            ],
+            client=client,
+        )
+
+    def _output(self, stream: str, data: str) -> Dict[str, Any]:
+        return {"type": "output", "stream": stream, "data": data}
+
+    @staticmethod
+    def _parse_id(stream_id: str) -> Tuple[int, int]:
+        milliseconds, _, sequence = stream_id.partition("-")
+        return int(milliseconds), int(sequence or 0)
+
+    def _job_key(self, job_id: str) -> str:
+        # The job's metadata hash, see JobService
+        return f"job:{job_id}"
+
+    def _log_key(self, job_id: str) -> str:
+        return f"job:{job_id}:log"
+
+    def _node_channel(self, node_id: str) -> str:
+        return f"node:{node_id}:output"
+
     def _output_channel(self, job_id: str) -> str:
         return f"job:{job_id}:output"
 
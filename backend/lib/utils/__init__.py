@@ -1,3 +1,4 @@
 from .output_formatter import format_error_message
+from .stream_processor import OutputStreamProcessor
 
-__all__ = ["format_error_message"]
+__all__ = ["format_error_message", "OutputStreamProcessor"]
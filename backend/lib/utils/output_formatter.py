@@ -45,6 +45,7 @@ def filter_stack_trace(text: str, language: str) -> str:
             r"at wrapModuleLoad",
             r"at Function\.executeUserEntryPoint",
             r"at node:internal",
+            r"at .*\(node:internal",  # Any frame inside Node's own modules
             r"Node\.js v\d+\.",  # Version line
         ]
 
@@ -0,0 +1,293 @@
+"""
+Stateful processing of a job's output stream
+
+PTY output arrives in arbitrary chunks, so anything that spans a chunk
+boundary needs state carried between chunks:
+- UTF-8 sequences, decoded with an incremental decoder
+- ANSI escape sequences, stripped by a small state machine
+- Tracebacks, buffered as one region and passed to format_error_message once
+
+Text outside of a traceback only pays for a few substring checks, regexes
+are reserved for the (rare) traceback regions.
+
+Holding output back must never break an interactive program. A JavaScript
+region opened by an error-looking line is only a traceback once an "at"
+frame follows; it is released as plain text after MAX_JS_PREAMBLE_LINES
+lines without one, after UNCONFIRMED_TIMEOUT seconds (flush_stale), or as
+soon as the program stops mid-line, since a trailing partial line outside
+of a traceback is a prompt waiting for input.
+"""
+
+import codecs
+import re
+import time
+from typing import List, Optional, Tuple
+
+from .output_formatter import clean_file_paths, format_error_message
+
+PYTHON_TRACEBACK = "Traceback (most recent call last):"
+
+# Node prints "<path>.js:<line>" above uncaught errors, then the error and its frames
+_JS_HEADER = re.compile(r"^\S+\.js:\d+$")
+_JS_ERROR = re.compile(r"^(Uncaught )?[A-Za-z]*(Error|Exception)\b")
+
+# CSI parameter/intermediate bytes, anything else ends the sequence
+_CSI_BODY = set("0123456789;:<=>? !\"#$%&'()*+,-./")
+_MAX_ESCAPE_LENGTH = 32
+
+
+class OutputStreamProcessor:
+    """Cleans one job's PTY output incrementally"""
+
+    MAX_REGION_BYTES = 64 * 1024
+    MAX_JS_PREAMBLE_LINES = 8
+    UNCONFIRMED_TIMEOUT = 0.5
+
+    def __init__(self, language: str, workdir: str):
+        self.language = language
+        self.workdir = workdir
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._escape = ""  # Incomplete escape sequence from the previous chunk
+        self._partial = ""  # Incomplete line that may start (or is inside) a traceback
+        self._region: Optional[List[str]] = None
+        self._region_size = 0
+        self._region_opened = 0.0
+        self._js_frames = False
+
+    @property
+    def holds_unconfirmed(self) -> bool:
+        """Whether output is held back for a region that may not be a traceback"""
+        return self._region is not None and not self._confirmed()
+
+    def feed(self, data: memoryview) -> str:
+        """Process a chunk of raw output, returning the text ready to send"""
+        text = self._strip_ansi(self._decoder.decode(data))
+        return self._process(text)
+
+    def finish(self) -> str:
+        """Flush everything still held back once the program has exited"""
+        text = self._strip_ansi(self._decoder.decode(b"", final=True)) + self._escape
+        self._escape = ""
+
+        output = self._process(text)
+        if self._partial:
+            if self._region is not None:
+                self._append_region(self._partial)
+            else:
+                output += self._clean_paths(self._partial)
+            self._partial = ""
+
+        if self._region is not None:
+            output += self._close_region()
+        return output
+
+    def flush_stale(self) -> str:
+        """Release a region still unconfirmed UNCONFIRMED_TIMEOUT seconds after it opened"""
+        if (
+            not self.holds_unconfirmed
+            or time.monotonic() - self._region_opened < self.UNCONFIRMED_TIMEOUT
+        ):
+            return ""
+        return self._close_region()
+
+    # ------------------------------------------------------------------
+    # ANSI escape sequences
+    # ------------------------------------------------------------------
+
+    def _strip_ansi(self, text: str) -> str:
+        if self._escape:
+            text = self._escape + text
+            self._escape = ""
+
+        if "\x1b" not in text:
+            return text
+
+        parts: List[str] = []
+        pos = 0
+        while True:
+            esc = text.find("\x1b", pos)
+            if esc == -1:
+                parts.append(text[pos:])
+                break
+
+            parts.append(text[pos:esc])
+            end, is_csi = self._escape_end(text, esc)
+            if end is None:
+                # Sequence continues in the next chunk
+                self._escape = text[esc:]
+                break
+
+            if not is_csi:
+                parts.append(text[esc:end])
+            pos = end
+
+        return "".join(parts)
+
+    def _escape_end(self, text: str, esc: int) -> Tuple[Optional[int], bool]:
+        """Index just past the escape sequence at esc, None if it is incomplete"""
+        if esc + 1 >= len(text):
+            return None, False
+        if text[esc + 1] != "[":
+            return esc + 1, False
+
+        i = esc + 2
+        while i < len(text) and text[i] in _CSI_BODY:
+            i += 1
+            if i - esc > _MAX_ESCAPE_LENGTH:
+                return esc + 1, False
+
+        if i == len(text):
+            return None, False
+        if "@" <= text[i] <= "~":
+            return i + 1, True
+        return esc + 1, False
+
+    # ------------------------------------------------------------------
+    # Traceback regions
+    # ------------------------------------------------------------------
+
+    def _process(self, text: str) -> str:
+        text = self._partial + text
+        self._partial = ""
+
+        if self._region is None and not self._may_start_region(text):
+            return self._clean_paths(text)
+
+        output: List[str] = []
+        for line in text.splitlines(keepends=True):
+            if not line.endswith(("\n", "\r")):
+                # Last, incomplete line: hold it only if it matters for a traceback
+                if self._region is not None and not self._holds_in_region(line):
+                    # The program stopped mid-line outside of a traceback: a prompt
+                    output.append(self._close_region())
+                if self._region is not None or self._may_start_line(line):
+                    self._partial = line
+                else:
+                    output.append(self._clean_paths(line))
+                continue
+
+            body = line.rstrip("\r\n")
+            if self._region is None:
+                if self._starts_region(body):
+                    self._open_region(line)
+                else:
+                    output.append(self._clean_paths(line))
+                continue
+
+            ended, included = self._ends_region(body)
+            if included:
+                self._append_region(line)
+            if ended or self._region_size > self.MAX_REGION_BYTES:
+                output.append(self._close_region())
+                if not included:
+                    if self._starts_region(body):
+                        self._open_region(line)
+                    else:
+                        output.append(self._clean_paths(line))
+
+        return "".join(output)
+
+    def _may_start_region(self, text: str) -> bool:
+        """Cheap check for whether text could contain the start of a traceback"""
+        tail = text[text.rfind("\n") + 1 :]
+        if self.language == "python":
+            return "Traceback" in text or self._may_start_line(tail)
+        if self.language == "javascript":
+            return (
+                ".js:" in text
+                or "Error" in text
+                or "Exception" in text
+                or self._may_start_line(tail)
+            )
+        return False
+
+    def _may_start_line(self, partial: str) -> bool:
+        """Whether an incomplete line could still become a traceback start"""
+        if not partial:
+            return False
+        if self.language == "python":
+            return PYTHON_TRACEBACK.startswith(partial)
+        if self.language == "javascript":
+            return partial.startswith("/") and " " not in partial
+        return False
+
+    def _starts_region(self, line: str) -> bool:
+        if self.language == "python":
+            return line.startswith(PYTHON_TRACEBACK)
+        if self.language == "javascript":
+            return bool(_JS_HEADER.match(line) or _JS_ERROR.match(line))
+        return False
+
+    def _confirmed(self) -> bool:
+        """Whether the open region is a traceback for sure"""
+        return self.language != "javascript" or self._js_frames
+
+    def _holds_in_region(self, partial: str) -> bool:
+        """Whether an incomplete line may continue the open region"""
+        if self.language == "python":
+            # Python writes a traceback in one go, the exception line closes it
+            return True
+        if not self._js_frames:
+            return False
+        frame = partial.lstrip()
+        return (
+            frame.startswith("at ")
+            or "at ".startswith(frame)
+            or partial.startswith("Node.js v")
+            or "Node.js v".startswith(partial)
+        )
+
+    def _ends_region(self, line: str) -> Tuple[bool, bool]:
+        """Returns (region ended, line belongs to the region)"""
+        if self.language == "python":
+            # Frames are indented, the unindented exception line closes the traceback
+            if not line or line[0] in " \t" or line.startswith("Traceback"):
+                return False, True
+            return True, True
+
+        # javascript
+        if line.startswith("Node.js v"):
+            return True, True
+        if line.lstrip().startswith("at "):
+            self._js_frames = True
+            return False, True
+        if not line.strip():
+            return False, True
+        if self._js_frames:
+            return True, False
+        if self._region and len(self._region) >= self.MAX_JS_PREAMBLE_LINES:
+            return True, False
+        return False, True
+
+    def _open_region(self, line: str) -> None:
+        self._region = []
+        self._region_opened = time.monotonic()
+        self._append_region(line)
+
+    def _append_region(self, line: str) -> None:
+        assert self._region is not None
+        self._region.append(line)
+        self._region_size += len(line)
+
+    def _close_region(self) -> str:
+        raw = "".join(self._region or [])
+        confirmed = self._confirmed()
+        self._region = None
+        self._region_size = 0
+        self._js_frames = False
+
+        if not confirmed:
+            # No stack frame followed, ordinary output after all
+            return self._clean_paths(raw)
+
+        text = raw.replace("\r\n", "\n")
+        formatted = format_error_message(text, self.language, self.workdir)
+        if not formatted:
+            return ""
+        return formatted.replace("\n", "\r\n") + "\r\n"
+
+    def _clean_paths(self, text: str) -> str:
+        if self.workdir and self.workdir in text:
+            return clean_file_paths(text, self.workdir)
+        return text
@@ -25,6 +25,7 @@ from .middleware.rate_limiter import limiter
 # Import from shared lib
 from lib.redis import AsyncRedisManager, get_async_redis
 from lib.services import JobService
+from lib.services.pubsub_service import get_pubsub_service
 from lib.config import get_settings
 settings = get_settings()
 
@@ -52,6 +53,7 @@ async def lifespan(app: FastAPI):
     yield
 
     log.info("Shutting down websocket server...")
+    await get_pubsub_service().close()
     await AsyncRedisManager.close_connection()
 
 
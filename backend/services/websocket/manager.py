@@ -2,7 +2,7 @@
 Manages active WebSocket connections and message broadcasting
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from fastapi import WebSocket
 from lib.logger import log
 
@@ -16,13 +16,16 @@ class ConnectionManager:
         self.active_connections[job_id] = websocket
         log.info(f"WebSocket registered for job {job_id}")
 
-    def disconnect(self, job_id: str) -> None:
+    def disconnect(self, job_id: str, websocket: Optional[WebSocket] = None) -> None:
         """
         Remove a WebSocket connection.
 
         Args:
             job_id: Job identifier to disconnect
+            websocket: Only remove this connection, not one that replaced it
         """
+        if websocket is not None and self.active_connections.get(job_id) is not websocket:
+            return
         if job_id in self.active_connections:
             del self.active_connections[job_id]
             log.info(f"WebSocket disconnected for job {job_id}")
@@ -16,12 +16,15 @@ class JobTokenManager:
     def __init__(self):
         self.settings = get_settings()
 
-    def create_job_token(self, job_id: str) -> Dict[str, str]:
+    def create_job_token(
+        self, job_id: str, subject: Optional[str] = None
+    ) -> Dict[str, str]:
         """
         Create a new job token.
 
         Args:
             job_id: Unique job identifier
+            subject: Client the job is created for, the queue's tenant
 
         Returns:
             Dict with job_id, job_token, and expires_at
@@ -36,6 +39,8 @@ class JobTokenManager:
             "exp": expiration,  # Expiration
             "jti": str(uuid.uuid4()),  # JWT ID (for single-use tracking)
         }
+        if subject:
+            payload["sub"] = subject  # Shares the queue fairly between clients
 
         # Sign the token
         token = jwt.encode(
@@ -3,16 +3,16 @@ WebSocket endpoint for real-time bidirectional code execution
 """
 
 import asyncio
-import json
+import re
 import time
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from .manager import ConnectionManager
-from lib.services import JobService
+from lib.services import JobQueue, JobService, QueueFullError
 from lib.services.pubsub_service import get_pubsub_service
 from lib.redis import get_async_redis
 from lib.models.schema import CodeSubmission
@@ -26,6 +26,12 @@ from lib.executors import get_default_filename
 router = APIRouter()
 manager = ConnectionManager()
 
+# Redis Stream message id, the "id" of every output message
+STREAM_ID = re.compile(r"\d+-\d+")
+
+# Jobs of disconnected clients waiting out the grace period to resume
+_pending_cancels: Set[asyncio.Task] = set()
+
 
 # Request/Response models for job creation
 class CreateJobRequest(BaseModel):
@@ -45,6 +51,7 @@ class CreateJobResponse(BaseModel):
 
 @router.post("/api/jobs/create", response_model=CreateJobResponse)
 async def create_job(
+    http_request: Request,
     request: Optional[CreateJobRequest] = None,
     _: bool = Depends(verify_api_key),  # Require API key for job creation
 ):
@@ -58,13 +65,20 @@ async def create_job(
     - API key required (prevents unauthorized job creation)
     - Job token expires in 15 minutes
     - Job token can only be used once (single-use)
+    - Job token names the end user as subject, the queue shares workers
+      fairly between subjects. Its address comes in the tenant_header the
+      frontend proxy sets (this request's peer is the proxy); without it the
+      token has no subject.
     """
     # Generate unique job ID
     job_id = str(uuid.uuid4())
 
     # Create signed JWT token
+    client_ip = http_request.headers.get(get_settings().tenant_header)
     token_manager = get_token_manager()
-    token_data = token_manager.create_job_token(job_id)
+    token_data = token_manager.create_job_token(
+        job_id, subject=f"ip:{client_ip}" if client_ip else None
+    )
 
     log.info(f"Created job {job_id} with token (expires: {token_data['expires_at']})")
 
@@ -78,8 +92,31 @@ async def websocket_execute(websocket: WebSocket):
 
     Authentication:
     - First message must contain: {type: 'execute', job_id, job_token, code, language}
+      and may contain a compile profile: {profile: 'fast' | 'optimized'}
+      and a queue priority: {priority: 'interactive' | 'batch'}
     - job_token is verified before any code execution
     - Tokens are single-use and expire after 15 minutes
+
+    Reconnecting:
+    - Every output message carries an "id". A client whose connection dropped
+      reconnects with {type: 'resume', job_id, job_token, last_id} and
+      receives the job's messages after last_id, then the live ones.
+    - Resuming reuses the job's token until it expires, and runs no code
+
+    Queueing:
+    - Jobs of different clients (token subject) take turns, and a client
+      runs at most tenant_max_running jobs at once. Jobs of tokens without a
+      subject share one line, which is not capped.
+    - Submissions are refused with an error carrying retry_after (seconds)
+      when max_queue_size jobs are queued or the estimated wait is longer
+      than max_queue_wait_seconds
+    - While waiting, the client receives {type: 'queued', position,
+      eta_seconds} every queue_status_interval seconds
+
+    Cancelling:
+    - {type: 'stop'} kills the running program
+    - A job whose client disconnected is cancelled unless the client resumes
+      within disconnect_cancel_grace seconds
     """
 
     job_id: Optional[str] = None
@@ -94,6 +131,7 @@ async def websocket_execute(websocket: WebSocket):
         )
 
         # Extract authentication fields (JWT token replaces API key)
+        resuming = data.get("type") == "resume"
         job_id = data.get("job_id")
         job_token = data.get("job_token")
 
@@ -117,16 +155,18 @@ async def websocket_execute(websocket: WebSocket):
                 await websocket.close(code=1008)
                 return
 
-            # Check if token already used (single-use enforcement)
-            if await token_manager.is_token_used(jti):
-                await websocket.send_json(
-                    {"type": "error", "message": "Job token has already been used"}
-                )
-                await websocket.close(code=1008)
-                return
+            # Check if token already used (single-use enforcement),
+            # a resume attaches to the job its first use started
+            if not resuming:
+                if await token_manager.is_token_used(jti):
+                    await websocket.send_json(
+                        {"type": "error", "message": "Job token has already been used"}
+                    )
+                    await websocket.close(code=1008)
+                    return
 
-            # Mark token as used
-            await token_manager.mark_token_used(jti)
+                # Mark token as used
+                await token_manager.mark_token_used(jti)
 
             log.info(f"Job {job_id} authenticated successfully")
 
@@ -138,53 +178,79 @@ async def websocket_execute(websocket: WebSocket):
             await websocket.close(code=1008)
             return
 
-        # Extract code submission data
-        code = data.get("code", "")
-        language = data.get("language", "")
-
-        # Validate submission
-        if not code or not language:
-            await websocket.send_json(
-                {"type": "error", "message": "Code and language are required"}
-            )
-            await websocket.close()
-            return
+        redis = await get_async_redis()
+        job_service = JobService(redis)
+        settings = get_settings()
+        last_id = data.get("last_id")
 
-        filename = get_default_filename(language)
+        if resuming:
+            if not await job_service.job_exists(job_id) or (
+                last_id is not None and not STREAM_ID.fullmatch(str(last_id))
+            ):
+                await websocket.send_json(
+                    {"type": "error", "message": "Unknown job or invalid last_id"}
+                )
+                await websocket.close(code=1008)
+                return
+            log.info(f"Job {job_id} resuming after {last_id}")
+        else:
+            # Extract code submission data
+            code = data.get("code", "")
+            language = data.get("language", "")
+
+            # Validate submission
+            if not code or not language:
+                await websocket.send_json(
+                    {"type": "error", "message": "Code and language are required"}
+                )
+                await websocket.close()
+                return
 
-        # Create code submission
-        try:
-            submission = CodeSubmission(code=code, language=language, filename=filename)
-        except Exception as e:
-            await websocket.send_json(
-                {"type": "error", "message": f"Invalid submission: {str(e)}"}
-            )
-            await websocket.close()
-            return
+            filename = get_default_filename(language)
 
-        validator = CodeValidator()
-        is_valid, error_message = validator.validate(
-            submission.code, submission.language
-        )
+            # Create code submission
+            try:
+                submission = CodeSubmission(
+                    code=code,
+                    language=language,
+                    filename=filename,
+                    profile=data.get("profile"),
+                    priority=data.get("priority"),
+                )
+            except Exception as e:
+                await websocket.send_json(
+                    {"type": "error", "message": f"Invalid submission: {str(e)}"}
+                )
+                await websocket.close()
+                return
 
-        # Validate
-        if not is_valid:
-            await websocket.send_json(
-                {"type": "error", "message": f"Code validation failed: {error_message}"}
+            validator = CodeValidator()
+            is_valid, error_message = validator.validate(
+                submission.code, submission.language
             )
-            await websocket.close()
-            return
 
-        # Create job
-        redis = await get_async_redis()
-        job_service = JobService(redis)
-        settings = get_settings()
+            # Validate
+            if not is_valid:
+                await websocket.send_json(
+                    {"type": "error", "message": f"Code validation failed: {error_message}"}
+                )
+                await websocket.close()
+                return
 
-        job_id = await job_service.create_job(
-            submission.code, submission.language, submission.filename
-        )
+            # Admission control, an honest answer now beats a timeout later
+            if settings.max_queue_wait_seconds:
+                wait = await JobQueue(redis).expected_wait(submission.queue_priority)
+                if wait is not None and wait > settings.max_queue_wait_seconds:
+                    log.warning(f"Refused job {job_id}, estimated wait {wait:.0f}s")
+                    await _send_busy(websocket, wait)
+                    return
+
+            # Create job
+            await job_service.create_job(
+                submission.code, submission.language, submission.filename, job_id
+            )
 
-        log.info(f"Created job {job_id} for PTY streaming execution")
+            log.info(f"Created job {job_id} for PTY streaming execution")
 
         # Register connection
         manager.active_connections[job_id] = websocket
@@ -197,25 +263,35 @@ async def websocket_execute(websocket: WebSocket):
             await manager.send_message(job_id, message)
 
         subscription_task = asyncio.create_task(
-            pubsub_service.subscribe_to_channels(job_id, handle_pubsub_message)
+            pubsub_service.subscribe_to_channels(
+                job_id, handle_pubsub_message, last_id
+            )
         )
 
-        await redis.lpush(  # type: ignore[misc]
-            "codr:job_queue",
-            json.dumps(
-                {
-                    "job_id": job_id,
-                    "code": submission.code,
-                    "language": submission.language,
-                    "filename": submission.filename,
-                    "queued_at": time.time(),
-                }
-            ),
-        )
+        if not resuming:
+            queue = JobQueue(redis)
+            job = {
+                "job_id": job_id,
+                "code": submission.code,
+                "language": submission.language,
+                "filename": submission.filename,
+                "profile": submission.profile,
+                "priority": submission.queue_priority,
+                "node_id": pubsub_service.node_id,
+                "tenant": payload.get("sub"),  # Named on job creation only
+                "queued_at": time.time(),
+            }
+            try:
+                queue_depth = await queue.enqueue(job, settings.max_queue_size)
+            except QueueFullError as e:
+                log.warning(f"Refused job {job_id}: {e}")
+                await _send_busy(websocket, await queue.expected_wait())
+                return
 
-        log.info(
-            f"Job {job_id} queued for worker (queue depth: {await redis.llen('codr:job_queue')})"  # type: ignore[misc]
-        )
+            log.info(f"Job {job_id} queued for worker (queue depth: {queue_depth})")
+            status_task = asyncio.create_task(
+                _report_queue_position(websocket, queue, job)
+            )
 
         # Handle incoming messages - put input directly into queue
         try:
@@ -237,11 +313,19 @@ async def websocket_execute(websocket: WebSocket):
                     log.debug(
                         f"Published input to worker for job {job_id}: {input_data[:50]}"
                     )
+                elif message.get("type") == "stop":
+                    await _cancel_job(job_id)
+                    log.info(f"Client stopped job {job_id}")
                 else:
                     log.warning(f"Unknown message type: {message.get('type')}")
 
         except WebSocketDisconnect:
             log.info(f"WebSocket disconnected for job {job_id}")
+            if not subscription_task.done():
+                # Still running, nobody is left to watch it unless the client resumes
+                task = asyncio.create_task(_cancel_abandoned_job(job_id))
+                _pending_cancels.add(task)
+                task.add_done_callback(_pending_cancels.discard)
         except Exception as e:
             log.error(f"Error in WebSocket message loop: {_sanitize_error(e)}")
             await websocket.send_json(
@@ -261,10 +345,12 @@ async def websocket_execute(websocket: WebSocket):
     finally:
         # Cleanup
         if job_id:
-            manager.disconnect(job_id)
+            manager.disconnect(job_id, websocket)
             # Cancel tasks if still running
             if "subscription_task" in locals() and not subscription_task.done():
                 subscription_task.cancel()
+            if "status_task" in locals() and not status_task.done():
+                status_task.cancel()
 
 
 @router.get("/api/websocket/status")
@@ -275,10 +361,67 @@ async def websocket_status(request: Request):
         content={
             "active_connections": len(manager.active_connections),
             "job_ids": list(manager.active_connections.keys()),
+            "pubsub": get_pubsub_service().stats(),
         }
     )
 
 
+async def _send_busy(websocket: WebSocket, wait: Optional[float]) -> None:
+    """Refuse a submission, telling the client when to try again"""
+    await websocket.send_json(
+        {
+            "type": "error",
+            "message": "Too many jobs are waiting, please try again shortly",
+            "retry_after": round(wait or get_settings().queue_status_interval),
+        }
+    )
+    await websocket.close(code=1013)  # Try again later
+
+
+async def _report_queue_position(
+    websocket: WebSocket, queue: JobQueue, job: Dict[str, Any]
+) -> None:
+    """Tell a waiting client its place in line until a worker takes the job"""
+    interval = get_settings().queue_status_interval
+    while True:
+        status = await queue.position(job)
+        if status is None:
+            return  # Running, output takes over
+        position, eta = status
+        try:
+            await websocket.send_json(
+                {
+                    "type": "queued",
+                    "position": position,
+                    "eta_seconds": round(eta, 1) if eta is not None else None,
+                }
+            )
+        except Exception:
+            return  # Client went away, the disconnect is handled by the endpoint
+        await asyncio.sleep(interval)
+
+
+async def _cancel_job(job_id: str) -> None:
+    """Drop the job if still queued, or tell the worker running it to kill it"""
+    redis = await get_async_redis()
+    await JobQueue(redis).abandon(job_id)
+    await redis.publish(f"job:{job_id}:control", "cancel")
+
+
+async def _cancel_abandoned_job(job_id: str) -> None:
+    """Cancel a disconnected client's job, unless it resumed in time"""
+    await asyncio.sleep(get_settings().disconnect_cancel_grace)
+
+    pubsub_service = get_pubsub_service()
+    if manager.is_connected(job_id):
+        return  # Resumed on this node
+    if await pubsub_service.job_node(job_id) not in (None, pubsub_service.node_id):
+        return  # Resumed on another node
+
+    await _cancel_job(job_id)
+    log.info(f"Cancelled job {job_id}, its client did not come back")
+
+
 def _sanitize_error(error: Exception) -> str:
     if get_settings().env == "development":
         return str(error)
@@ -1,12 +1,23 @@
 """
 Worker Service Entry Point
 Starts the code execution worker process
+
+Usage:
+    python -m services.worker                  # One worker
+    python -m services.worker --processes 4    # Supervisor with 4 workers
+    python -m services.worker --processes auto # One worker per CPU
 """
 
+import argparse
 import asyncio
+import os
 import signal
+import sys
+import uuid
+from typing import Any, Dict, Optional
 from lib.logger import log
 from lib.config import get_settings
+from .supervisor import WorkerSupervisor, parse_processes
 from .worker import CodeExecutionWorker
 
 
@@ -22,7 +33,7 @@ def setup_signal_handlers(worker: CodeExecutionWorker):
     signal.signal(signal.SIGTERM, signal_handler)  # Kill
 
 
-async def main():
+async def main(worker_id: Optional[str] = None) -> CodeExecutionWorker:
 
     settings = get_settings()
 
@@ -32,7 +43,7 @@ async def main():
         sys.exit(1)
 
     # Create worker
-    worker = CodeExecutionWorker()
+    worker = CodeExecutionWorker(worker_id)
 
     # Setup signal handlers for graceful shutdown
     setup_signal_handlers(worker)
@@ -45,9 +56,38 @@ async def main():
         raise
     finally:
         log.info("Worker shutdown complete")
+    return worker
+
+
+def run_worker(worker_id: str) -> Dict[str, Any]:
+    """Run one worker in a supervised process, returns its stats"""
+    return asyncio.run(main(worker_id)).stats()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Codr code execution worker")
+    parser.add_argument(
+        "--processes",
+        type=parse_processes,
+        default=1,
+        help="Worker processes to run under a supervisor, 'auto' for one per CPU",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+
+    if args.processes > 1:
+        supervisor = WorkerSupervisor(
+            args.processes,
+            run_worker,
+            os.getenv("WORKER_ID", f"worker-{uuid.uuid4().hex[:8]}"),
+        )
+        supervisor.install_signal_handlers()
+        supervisor.run()
+        sys.exit(0)
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
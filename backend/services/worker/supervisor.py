@@ -0,0 +1,169 @@
+"""
+Pre-forking supervisor for running several workers on one machine
+
+One CodeExecutionWorker runs on one event loop, so it uses about one core.
+The supervisor forks N worker processes, each with its own worker_id
+(<base id>-<index>), and keeps them running:
+- A worker that exits while the supervisor is running is restarted with
+  the same worker_id
+- SIGTERM/SIGINT are forwarded to every worker, which drain their running
+  jobs before exiting
+- Each worker reports its stats to the supervisor over a pipe when it
+  exits, and the supervisor logs the totals
+
+Workers are forked before any event loop or Redis connection exists.
+"""
+
+import json
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from lib.logger import log
+
+# Workers exiting sooner than this after starting are restarted with a delay
+MIN_UPTIME = 5.0
+
+
+@dataclass
+class WorkerProcess:
+    index: int
+    worker_id: str
+    stats_fd: int
+    started_at: float
+
+
+class WorkerSupervisor:
+
+    def __init__(
+        self,
+        processes: int,
+        target: Callable[[str], Dict[str, Any]],
+        base_id: str,
+        restart_delay: float = 1.0,
+    ):
+        """
+        Args:
+            processes: Number of worker processes
+            target: Runs a worker with the given worker_id until it is told
+                to stop, returns its stats (run in the forked process)
+            base_id: Worker ids are <base_id>-<index>
+            restart_delay: Seconds to wait before restarting a worker that
+                exited right after starting
+        """
+        self.processes = processes
+        self.target = target
+        self.base_id = base_id
+        self.restart_delay = restart_delay
+        self.children: Dict[int, WorkerProcess] = {}
+        self.running = True
+
+        # Stats
+        self.restarts = 0
+        self.totals: Dict[str, float] = {}
+
+    def run(self) -> None:
+        """Fork the workers and supervise them until stopped and all have exited"""
+        log.info(f"Supervisor starting {self.processes} workers")
+        for index in range(self.processes):
+            if self.running:
+                self._spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            self._collect_stats(child)
+            exit_code = os.waitstatus_to_exitcode(status)
+
+            if not self.running:
+                log.info(f"Worker {child.worker_id} exited with code {exit_code}")
+                continue
+
+            log.error(
+                f"Worker {child.worker_id} exited with code {exit_code}, restarting"
+            )
+            self.restarts += 1
+            if time.monotonic() - child.started_at < MIN_UPTIME:
+                # Crashing on startup, don't spin
+                time.sleep(self.restart_delay)
+            if self.running:
+                self._spawn(child.index)
+
+        log.info(f"Supervisor stopped. Stats: {self.stats()}")
+
+    def stop(self, sig: int = signal.SIGTERM) -> None:
+        """Stop restarting workers and tell every worker to drain and exit"""
+        self.running = False
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def install_signal_handlers(self) -> None:
+        def signal_handler(sig, frame):
+            log.info(f"Supervisor received {signal.Signals(sig).name}")
+            self.stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.totals, "restarts": self.restarts}
+
+    def _spawn(self, index: int) -> None:
+        worker_id = f"{self.base_id}-{index}"
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for sibling in self.children.values():
+                os.close(sibling.stats_fd)
+            os._exit(self._run_child(worker_id, write_fd))
+
+        os.close(write_fd)
+        self.children[pid] = WorkerProcess(index, worker_id, read_fd, time.monotonic())
+        log.debug(f"Supervisor started worker {worker_id} (pid {pid})")
+
+    def _run_child(self, worker_id: str, stats_fd: int) -> int:
+        # The worker installs its own handlers
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            stats = self.target(worker_id)
+            with os.fdopen(stats_fd, "w") as f:
+                json.dump(stats, f)
+            return 0
+        except KeyboardInterrupt:
+            return 0
+        except BaseException as e:
+            log.error(f"Worker {worker_id} crashed: {e}")
+            return 1
+
+    def _collect_stats(self, child: WorkerProcess) -> None:
+        with os.fdopen(child.stats_fd, "r") as f:
+            data = f.read()
+        if not data:
+            return  # Crashed before reporting
+        for key, value in json.loads(data).items():
+            if isinstance(value, (int, float)):
+                self.totals[key] = self.totals.get(key, 0) + value
+
+
+def parse_processes(value: str) -> int:
+    """Parse --processes: a positive count or 'auto' for one per CPU"""
+    if value == "auto":
+        return os.cpu_count() or 1
+    count = int(value)
+    if count < 1:
+        raise ValueError("processes must be at least 1")
+    return count
@@ -7,14 +7,43 @@ import json
 import time
 import uuid
 import os
-from typing import Dict, Any, Optional
-import queue as sync_queue
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Any, List, Optional, Set, Union
 
 from lib.logger import log
 from lib.config import get_settings
-from lib.redis import get_async_redis
+from lib.models import ResourceSample
+from lib.redis import PubSubMultiplexer, get_async_redis
+from lib.services.job_queue import JobQueue
 from lib.services.pubsub_service import get_pubsub_service
+from lib.services.output_publisher import OutputPublisher
 from lib.executors import get_executor
+from lib.executors.artifact_cache import get_artifact_cache
+from lib.executors.compiled_base import CompiledExecutor
+from lib.executors.engine_pool import EngineJob, get_engine_pool
+from lib.executors.pty_session import PtySession
+from lib.executors.sandbox import get_sandbox_backend
+from lib.executors.warm_pool import get_warm_pool
+from lib.executors.workspace_pool import get_workspace_pool
+
+
+@dataclass
+class WorkerSlot:
+    """One concurrent execution slot of a worker"""
+
+    slot_id: int
+    current_job_id: Optional[str] = None
+    jobs_completed: int = 0
+    jobs_failed: int = 0
+    busy_time: float = 0.0  # Seconds spent running jobs
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.jobs_completed,
+            "failed": self.jobs_failed,
+            "busy_seconds": round(self.busy_time, 2),
+        }
 
 
 class CodeExecutionWorker:
@@ -24,10 +53,28 @@ class CodeExecutionWorker:
             "WORKER_ID", f"worker-{uuid.uuid4().hex[:8]}"
         )
         self.running = True
-        self.current_job_id = None
         self.jobs_completed = 0
         self.jobs_failed = 0
+        self.jobs_cancelled = 0
         self.settings = get_settings()
+        self.publisher = OutputPublisher()
+
+        # Concurrent execution slots, most interactive jobs wait on input or sleep
+        self.slots = [
+            WorkerSlot(slot_id) for slot_id in range(self.settings.worker_concurrency)
+        ]
+        self._free_slots: Deque[WorkerSlot] = deque(self.slots)
+        self._slot_semaphore = asyncio.Semaphore(len(self.slots))
+        self._slot_tasks: Set[asyncio.Task] = set()
+        if len(self.slots) > 1 and not self.settings.cgroup_root:
+            log.warning(
+                f"Worker {self.worker_id} runs {len(self.slots)} jobs at once without "
+                "cgroups, they share one process limit (sandbox_max_processes)"
+            )
+        self.queue: Optional[JobQueue] = None
+        # One Pub/Sub connection carrying the input and control channels of every
+        # running job
+        self.inputs: Optional[PubSubMultiplexer] = None
 
         log.debug(f"Worker {self.worker_id} initializing")
 
@@ -35,147 +82,295 @@ class CodeExecutionWorker:
 
         log.info(f"Worker {self.worker_id} started and listening for jobs")
         redis = await get_async_redis()
+        self.queue = queue = JobQueue(redis)
+        self.inputs = PubSubMultiplexer(redis, f"{self.worker_id}:input")
+        await self.inputs.start()
+
+        # Jobs left behind by a previous run under the same id go back to the queue
+        await self._fail_lost_jobs(await queue.recover(self.worker_id))
+        await queue.heartbeat(self.worker_id, len(self.slots))
+        keep_alive_task = asyncio.create_task(self._keep_alive())
+        # Languages whose toolchains and caches this worker keeps warm
+        affinity = self.settings.get_worker_affinity_list()
+
+        # Precompile headers in the background, jobs compile without them until ready
+        warm_up_task = asyncio.create_task(asyncio.to_thread(self._prepare_toolchains))
+
+        # Engines park their own interpreters and own their workspaces
+        engines = get_engine_pool()
+        pool = None if engines else get_warm_pool()
+        if engines:
+            await engines.start()
+
+        # Park sandboxed interpreters before taking the first job
+        if pool:
+            await pool.fill()
 
         while self.running:
+            # Only take a job off the queue once a slot is free to run it
+            await self._slot_semaphore.acquire()
+            if not self.running:
+                self._slot_semaphore.release()
+                break
+
             try:
-                result = await redis.brpop(
-                    self.settings.job_queue_name,
-                    timeout=self.settings.worker_poll_timeout,
+                raw_job = await queue.dequeue(
+                    self.worker_id, self.settings.worker_poll_timeout, affinity
                 )
-
-                if result:
-                    queue_name, job_data_json = result
-                    job_data = json.loads(job_data_json)
-
-                    # Track current job for graceful shutdown
-                    self.current_job_id = job_data["job_id"]
-
-                    # Execute the job
-                    await self.execute_job(job_data)
-
-                    self.current_job_id = None
-                else:
-                    # Timeout - no jobs available (normal when queue is empty)
-                    pass
-
             except asyncio.CancelledError:
+                self._slot_semaphore.release()
                 log.info(f"Worker {self.worker_id} cancelled")
                 break
             except (ConnectionError, asyncio.TimeoutError) as e:
                 # Redis connection issues or timeouts - don't spam logs
+                self._slot_semaphore.release()
                 log.debug(f"Worker {self.worker_id} connection issue: {e}")
                 await asyncio.sleep(1)
+                continue
 
-        log.info(
-            f'''Worker {self.worker_id} stopped. Stats: {self.jobs_completed}
-                completed, {self.jobs_failed} failed'''
-        )
+            if not raw_job:
+                # Timeout - no jobs available (normal when queue is empty)
+                self._slot_semaphore.release()
+                continue
 
-    async def execute_job(self, job_data: Dict[str, Any]):
-
-        job_id = job_data["job_id"]
-        code = job_data["code"]
-        language = job_data["language"]
-        filename = job_data["filename"]
-        queued_at = job_data.get("queued_at", time.time())
-
-        queue_wait_time = time.time() - queued_at
-        log.info(
-            f'''Worker {self.worker_id} executing job {job_id}
-                (waited {queue_wait_time:.2f}s in queue)'''
-        )
+            slot = self._free_slots.popleft()
+            task = asyncio.create_task(self._run_in_slot(slot, raw_job))
+            self._slot_tasks.add(task)
+            task.add_done_callback(self._slot_tasks.discard)
 
+        # Graceful shutdown: let every running job finish
+        if self._slot_tasks:
+            log.info(
+                f"Worker {self.worker_id} draining {len(self._slot_tasks)} running jobs"
+            )
+            await asyncio.gather(*self._slot_tasks, return_exceptions=True)
+
+        warm_up_task.cancel()
+        keep_alive_task.cancel()
+        await self._fail_lost_jobs(await queue.unregister(self.worker_id))
+        await self.inputs.close()
+        await self.publisher.flush()
+        log.info(f"Worker {self.worker_id} stopped. Stats: {self.stats()}")
+        for slot in self.slots:
+            log.info(f"Worker {self.worker_id} slot {slot.slot_id}: {slot.stats()}")
+        cache = get_artifact_cache()
+        if cache:
+            log.info(f"Worker {self.worker_id} artifact cache: {cache.stats()}")
+        if engines:
+            log.info(f"Worker {self.worker_id} engines: {engines.stats()}")
+            await engines.close()
+            return
+        if pool:
+            log.info(f"Worker {self.worker_id} warm pool: {pool.stats()}")
+            await pool.close()
+
+        workspaces = get_workspace_pool()
+        await workspaces.drain()
+        log.info(f"Worker {self.worker_id} workspaces: {workspaces.stats()}")
+        workspaces.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.jobs_completed,
+            "failed": self.jobs_failed,
+            "cancelled": self.jobs_cancelled,
+            "abandoned_skipped": self.queue.skipped if self.queue else 0,
+            "output_chunks": self.publisher.chunks_received,
+            "redis_round_trips": self.publisher.round_trips,
+        }
+
+    @property
+    def current_job_ids(self) -> List[str]:
+        return [slot.current_job_id for slot in self.slots if slot.current_job_id]
+
+    async def _run_in_slot(self, slot: WorkerSlot, raw_job: str):
+        started = time.monotonic()
         try:
-            executor = await asyncio.to_thread(get_executor, language)
+            try:
+                job_data = json.loads(raw_job)
+                slot.current_job_id = job_data["job_id"]
+            except (ValueError, KeyError, TypeError) as e:
+                # No client to tell, redelivering it would only fail again
+                log.error(f"Worker {self.worker_id} dropped a malformed job: {e!r}")
+                self.jobs_failed += 1
+                if self.queue:
+                    await self.queue.ack(self.worker_id, raw_job)
+                return
+
+            completed = await self.execute_job(job_data)
+            if completed:
+                slot.jobs_completed += 1
+            else:
+                slot.jobs_failed += 1
+            # Completed or failed, either way the client has been told.
+            # Run times of completed jobs feed the queue's wait estimates.
+            if self.queue:
+                await self.queue.ack(
+                    self.worker_id,
+                    raw_job,
+                    job_data["language"] if completed else None,
+                    time.monotonic() - started,
+                )
+        except Exception as e:
+            # Not acked, the reaper redelivers it
+            log.error(f"Worker {self.worker_id} slot {slot.slot_id} failed: {e}")
+        finally:
+            slot.busy_time += time.monotonic() - started
+            slot.current_job_id = None
+            self._free_slots.append(slot)
+            self._slot_semaphore.release()
+
+    async def execute_job(self, job_data: Dict[str, Any]) -> bool:
+        """
+        Run a job and publish its output and completion
 
-            # Get event loop for scheduling coroutines from sync executor
-            loop = asyncio.get_event_loop()
-            pubsub = get_pubsub_service()
+        Returns:
+            True if the job completed, False if it failed
+        """
 
-            input_channel = f"job:{job_id}:input"
-            input_queue: asyncio.Queue[str] = asyncio.Queue()
+        job_id = job_data["job_id"]
 
-            async def input_listener():
-                """
-                Listen for user input from WebSocket server via Redis Pub/Sub.
-                Runs in background while job executes.
-                """
-                redis = await get_async_redis()
-                ps = redis.pubsub()
-                await ps.subscribe(input_channel)
-
-                log.debug(f"Worker {self.worker_id} subscribed to {input_channel}")
-
-                try:
-                    async for message in ps.listen():
-                        if message["type"] == "message":
-                            input_data = message["data"]  # Current redis uses strings
-                            await input_queue.put(input_data)
-                            log.debug(
-                                f'''Worker {self.worker_id} received
-                                    input for {job_id}: {input_data[:50]}'''
-                            )
-                except asyncio.CancelledError:
-                    await ps.unsubscribe(input_channel)
-                    await ps.close()
-                    log.debug(
-                        f"Worker {self.worker_id} unsubscribed from {input_channel}"
-                    )
+        try:
+            pubsub = get_pubsub_service()
+            # Output goes to the WebSocket node that queued the job
+            pubsub.route(job_id, job_data.get("node_id"))
+
+            missing = [
+                field
+                for field in ("code", "language", "filename")
+                if field not in job_data
+            ]
+            if missing:
+                log.error(f"Job {job_id} lacks {', '.join(missing)}, not running it")
+                await pubsub.publish_error(job_id, "Invalid job, it cannot be run")
+                self.jobs_failed += 1
+                return False
+            code = job_data["code"]
+            language = job_data["language"]
+            filename = job_data["filename"]
+
+            queue_wait_time = time.time() - job_data.get("queued_at", time.time())
+            log.info(
+                f'''Worker {self.worker_id} executing job {job_id}
+                    (waited {queue_wait_time:.2f}s in queue)'''
+            )
 
-            # Start input listener in background
-            input_task = asyncio.create_task(input_listener())
+            if queue_wait_time > self.settings.jwt_expiration_minutes * 60:
+                # Its token expired meanwhile, the client can no longer resume it
+                log.warning(f"Job {job_id} expired in the queue, not running it")
+                await pubsub.publish_error(job_id, "Job expired before it could run")
+                self.jobs_failed += 1
+                return False
+
+            # Engines look the executor up themselves
+            engines = get_engine_pool()
+            executor = (
+                None
+                if engines
+                else await asyncio.to_thread(
+                    get_executor, language, None, job_data.get("profile")
+                )
+            )
 
-            # Bridge async input queue to sync queue for executor
-            sync_input_queue: sync_queue.Queue[str] = sync_queue.Queue()
+            input_channel = f"job:{job_id}:input"
+            control_channel = f"job:{job_id}:control"
+
+            # Input received before the process starts is held until it does
+            session: Optional[Union[PtySession, EngineJob]] = None
+            pending_input: List[str] = []
+            cancelled = False
+
+            def on_start(started: Union[PtySession, EngineJob]):
+                nonlocal session
+                session = started
+                if cancelled:
+                    session.kill()
+                    return
+                for item in pending_input:
+                    session.write(item)
+                pending_input.clear()
+
+            def on_input(input_data: str):
+                """Write user input from the WebSocket server straight to the PTY"""
+                if session:
+                    session.write(input_data)
+                else:
+                    pending_input.append(input_data)
+                log.debug(
+                    f'''Worker {self.worker_id} received
+                        input for {job_id}: {input_data[:50]}'''
+                )
 
-            async def bridge_input():
-                """Transfer items from async queue to sync queue"""
-                try:
-                    while True:
-                        item = await input_queue.get()
-                        sync_input_queue.put(item)
-                except asyncio.CancelledError:
-                    pass
+            def on_control(command: str):
+                """Kill the program once its client stopped it or went away"""
+                nonlocal cancelled
+                if command != "cancel" or cancelled:
+                    return
+                cancelled = True
+                log.info(f"Worker {self.worker_id} cancelling job {job_id}")
+                if session:
+                    session.kill()
 
-            bridge_task = asyncio.create_task(bridge_input())
+            assert self.inputs, "worker not started"
+            await self.inputs.subscribe(input_channel, on_input)
+            await self.inputs.subscribe(control_channel, on_control)
 
             # Callback for output streaming
-            def on_output(data: bytes):
+            def on_output(text: str):
                 """
-                Called when PTY produces output.
-                Publishes to Redis Pub/Sub for WebSocket server to receive.
+                Called on the event loop when PTY produces output.
+                Batched by the publisher for the WebSocket server to receive.
                 """
-                asyncio.run_coroutine_threadsafe(
-                    pubsub.publish_output(
-                        job_id, "stdout", data.decode("utf-8", errors="replace")
-                    ),
-                    loop,
-                )
+                if not self.publisher.publish(job_id, text) and session:
+                    # Publisher buffer is full, stop reading until Redis catches up
+                    session.pause_reading()
+                    self.publisher.when_drained(session.resume_reading)
+
+            async def on_sample(sample: ResourceSample):
+                # After the output buffered so far, so samples interleave in order
+                await self.publisher.flush()
+                await pubsub.publish_resources(job_id, sample.model_dump())
 
             # Execute code in sandboxed environment
             log.info(f"Worker {self.worker_id} starting execution for job {job_id}")
-            result = await asyncio.to_thread(
-                executor.execute,
-                code=code,
-                filename=filename,
-                on_output=on_output,
-                input_queue=sync_input_queue,
+            try:
+                if engines:
+                    result = await engines.execute(
+                        job_data, on_output, on_start, on_sample
+                    )
+                else:
+                    result = await executor.execute(
+                        code=code,
+                        filename=filename,
+                        on_output=on_output,
+                        on_start=on_start,
+                        on_sample=on_sample,
+                    )
+            finally:
+                # Cleanup
+                await self.inputs.unsubscribe(input_channel, on_input)
+                await self.inputs.unsubscribe(control_channel, on_control)
+
+            # Publish completion event after any buffered output
+            await self.publisher.flush()
+            # Samples were already streamed live, keep the completion message small
+            resources = (
+                result.resources.model_dump(exclude={"samples"})
+                if result.resources
+                else None
             )
-
-            # Cleanup
-            input_task.cancel()
-            bridge_task.cancel()
-
-            # Publish completion event
             await pubsub.publish_complete(
-                job_id, result.exit_code, result.execution_time
+                job_id, result.exit_code, result.execution_time, resources, cancelled
             )
 
+            if cancelled:
+                self.jobs_cancelled += 1
             self.jobs_completed += 1
             log.info(
                 f'''Worker {self.worker_id} completed job {job_id} in
                  {result.execution_time:.2f}s (exit code: {result.exit_code})'''
             )
+            return True
         except Exception as e:
             import traceback
 
@@ -184,19 +379,73 @@ class CodeExecutionWorker:
                 traceback.print_exc()
 
             # Publish error
+            await self.publisher.flush()
             await get_pubsub_service().publish_error(job_id, str(e))
             self.jobs_failed += 1
+            return False
+        finally:
+            get_pubsub_service().unroute(job_id)
+
+    async def _keep_alive(self):
+        """Heartbeat, and recover the jobs of workers whose heartbeat expired"""
+        assert self.queue
+        last_reap = 0.0
+        while True:
+            try:
+                await self.queue.heartbeat(self.worker_id, len(self.slots))
+                if time.monotonic() - last_reap >= self.settings.queue_reap_interval:
+                    last_reap = time.monotonic()
+                    _, failed = await self.queue.reap()
+                    await self._fail_lost_jobs(failed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Worker {self.worker_id} heartbeat failed: {e}")
+            await asyncio.sleep(self.settings.worker_heartbeat_interval)
+
+    async def _fail_lost_jobs(self, raw_jobs: List[str]):
+        """Tell the clients of jobs that ran out of delivery attempts"""
+        pubsub = get_pubsub_service()
+        for raw_job in raw_jobs:
+            job = json.loads(raw_job)
+            job_id = job["job_id"]
+            log.error(f"Job {job_id} was lost with its worker too many times")
+            pubsub.route(job_id, job.get("node_id"))
+            try:
+                await pubsub.publish_error(
+                    job_id, "Execution failed: the worker running it stopped responding"
+                )
+            finally:
+                pubsub.unroute(job_id)
+
+    def _prepare_toolchains(self):
+        # Informational only, a broken probe must not keep headers from building
+        try:
+            sandbox = get_sandbox_backend()
+            cost = sandbox.measure_launch_cost()
+            log.info(
+                f"Worker {self.worker_id} sandbox {sandbox.name}: "
+                f"{cost * 1000:.1f}ms per launch"
+            )
+        except Exception as e:
+            log.warning(f"Worker {self.worker_id} could not measure sandbox launch: {e}")
+
+        for language in ("c", "cpp"):
+            executor = get_executor(language)
+            if isinstance(executor, CompiledExecutor):
+                executor.prepare_precompiled_headers()
 
     def stop(self):
         """
         Request graceful shutdown
 
-        If a job is currently executing, it will complete before stopping.
+        Jobs currently executing in any slot complete before stopping.
         """
         log.info(f"Worker {self.worker_id} received shutdown signal")
-        if self.current_job_id:
+        if self.current_job_ids:
             log.info(
-                f'''Worker {self.worker_id} will stop after completing job
-                {self.current_job_id}'''
+                f'''Worker {self.worker_id} will stop after completing jobs
+                {", ".join(self.current_job_ids)}'''
             )
         self.running = False
+
@@ -0,0 +1,105 @@
+"""
+Compare C++ compile times with and without precompiled headers.
+
+Runs locally against the worker's compiler, no server needed:
+    python tests/benchmarking/pch_benchmark.py --samples 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from lib.executors.pch import PrecompiledHeaders, parse_bundles  # noqa: E402
+
+PROGRAMS = {
+    "stdc++": (
+        "#include <bits/stdc++.h>\n"
+        "using namespace std;\n"
+        "int main() { vector<int> v{3, 1, 2}; sort(v.begin(), v.end());"
+        " cout << v[0] << endl; }\n"
+    ),
+    "iostream+vector": (
+        "#include <iostream>\n"
+        "#include <vector>\n"
+        "int main() { std::vector<int> v{1, 2}; std::cout << v.size() << std::endl; }\n"
+    ),
+}
+
+COMPILER = "g++"
+FLAGS = ["-std=c++17", "-lstdc++"]
+
+
+class PchBenchmark:
+
+    def __init__(self, bundles: str):
+        self.workdir = tempfile.mkdtemp(prefix="codr-pch-bench-")
+        self.pch = PrecompiledHeaders(
+            os.path.join(self.workdir, "pch"), {"cpp": parse_bundles(bundles)}
+        )
+
+    def print_header(self, title):
+        print(f"\n{'='*60}")
+        print(f"{title}")
+        print(f"{'='*60}\n")
+
+    def compile_time(self, source: str, extra_flags) -> float:
+        path = os.path.join(self.workdir, "main.cpp")
+        with open(path, "w") as f:
+            f.write(source)
+
+        start = time.perf_counter()
+        subprocess.run(
+            [COMPILER, path, "-o", os.path.join(self.workdir, "program")]
+            + FLAGS
+            + extra_flags,
+            check=True,
+            capture_output=True,
+        )
+        return time.perf_counter() - start
+
+    def run(self, samples: int):
+        self.print_header("BUILDING PRECOMPILED HEADERS")
+        start = time.perf_counter()
+        self.pch.build_all("cpp", COMPILER, FLAGS)
+        print(f"Built in {time.perf_counter() - start:.2f}s")
+
+        self.print_header(f"COMPILE LATENCY: {samples} samples")
+        for name, source in PROGRAMS.items():
+            pch_flags = self.pch.flags_for(source, "cpp", COMPILER, FLAGS)
+            if not pch_flags:
+                print(f"{name}: no matching bundle, skipped")
+                continue
+
+            plain = [self.compile_time(source, []) for _ in range(samples)]
+            with_pch = [self.compile_time(source, pch_flags) for _ in range(samples)]
+
+            plain_ms = statistics.median(plain) * 1000
+            pch_ms = statistics.median(with_pch) * 1000
+            print(f"{name}:")
+            print(f"  Without PCH: {plain_ms:.0f}ms (median)")
+            print(f"  With PCH:    {pch_ms:.0f}ms (median)")
+            print(f"  Saved:       {(1 - pch_ms / plain_ms) * 100:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark C++ precompiled headers")
+    parser.add_argument("--samples", "-s", type=int, default=5)
+    parser.add_argument(
+        "--bundles",
+        "-b",
+        default="bits/stdc++.h;iostream,string,vector,algorithm",
+        help="Bundles to precompile (';'-separated, headers ','-separated)",
+    )
+    args = parser.parse_args()
+
+    PchBenchmark(args.bundles).run(args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the launch overhead of the sandbox backends.
+
+Runs the same trivial Python job through every backend available on this
+host, no server needed:
+    python tests/benchmarking/sandbox_benchmark.py --samples 20
+
+The "none" backend is the baseline, the difference to it is the part of a
+job's latency spent starting the sandbox.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Measure cold launches only, and allow running outside the deployment env
+os.environ["WARM_POOL_PYTHON"] = "0"
+os.environ["WARM_POOL_JAVASCRIPT"] = "0"
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from lib.executors import get_executor  # noqa: E402
+from lib.executors.sandbox import SANDBOX_BACKENDS, get_sandbox_backend  # noqa: E402
+
+BACKENDS = ["none", "unshare", "bubblewrap", "firejail"]
+JOB = "print('ok')\n"
+
+
+class SandboxBenchmark:
+
+    def print_header(self, title):
+        print(f"\n{'='*60}")
+        print(f"{title}")
+        print(f"{'='*60}\n")
+
+    async def job_time(self, executor) -> float:
+        output = []
+        start = time.perf_counter()
+        result = await executor.execute(JOB, "main.py", output.append)
+        elapsed = time.perf_counter() - start
+
+        if result.exit_code != 0 or "ok" not in "".join(output):
+            raise RuntimeError(f"job failed: {result.stderr or ''.join(output)!r}")
+        return elapsed
+
+    async def run(self, samples: int, backends):
+        self.print_header(f"SANDBOX LAUNCH OVERHEAD: {samples} samples")
+        results = {}
+
+        for name in backends:
+            sandbox = get_sandbox_backend(name)
+            if not sandbox.available():
+                print(f"{name}: not available on this host, skipped")
+                continue
+
+            executor = get_executor("python", sandbox)
+            try:
+                timings = [await self.job_time(executor) for _ in range(samples)]
+            except Exception as e:
+                print(f"{name}: failed ({e}), skipped")
+                continue
+
+            launch = sandbox.measure_launch_cost(samples)
+            results[name] = (statistics.median(timings), launch)
+
+        baseline = results.get("none")
+        for name, (job, launch) in results.items():
+            print(f"{name}:")
+            print(f"  Launch (no-op): {launch * 1000:.1f}ms (median)")
+            print(f"  Python job:     {job * 1000:.1f}ms (median)")
+            if baseline and name != "none":
+                overhead = job - baseline[0]
+                print(
+                    f"  Sandbox cost:   {overhead * 1000:.1f}ms "
+                    f"({overhead / job * 100:.0f}% of the job)"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sandbox backends")
+    parser.add_argument("--samples", "-s", type=int, default=10)
+    parser.add_argument(
+        "--backends",
+        "-b",
+        default=",".join(BACKENDS),
+        help=f"Comma-separated backends ({', '.join(sorted(SANDBOX_BACKENDS))})",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(SandboxBenchmark().run(args.samples, args.backends.split(",")))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ This file contains shared fixtures used across all tests.
 import asyncio
 import os
 import sys
+import tempfile
 from pathlib import Path
 from typing import AsyncGenerator, Generator
 import pytest
@@ -22,6 +23,9 @@ os.environ["API_KEY"] = "test-api-key-12345"
 os.environ["JWT_SECRET"] = "test-secret-key-for-testing"
 os.environ["REDIS_URL"] = "redis://localhost:6379/1"
 os.environ["EXECUTION_TIMEOUT"] = "5"
+os.environ["ARTIFACT_CACHE_DIR"] = tempfile.mkdtemp(prefix="codr-artifacts-")
+os.environ["PCH_DIR"] = tempfile.mkdtemp(prefix="codr-pch-")
+os.environ["WORKSPACE_ROOT"] = tempfile.mkdtemp(prefix="codr-workspaces-")
 
 
 # ============================================================================
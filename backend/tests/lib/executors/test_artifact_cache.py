@@ -0,0 +1,171 @@
+"""
+Tests for Compiled Artifact Cache
+
+Covers:
+- Cache keys
+- Binary and compile failure entries, failures expiring
+- Entries evicted before they were copied counting as misses
+- LRU eviction
+- Cache hits skipping compilation in compiled executors
+- Only compiler diagnostics cached as failures
+- Retrying without the precompiled header when a compile with it fails
+"""
+
+import os
+import pytest
+from lib.executors.artifact_cache import ArtifactCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+
+
+@pytest.fixture
+def binary(tmp_path):
+    path = tmp_path / "program"
+    path.write_bytes(b"\x7fELF" + b"\0" * 100)
+    return str(path)
+
+
+class TestArtifactCache:
+
+    def test_key_depends_on_source_and_flags(self, cache):
+        key = cache.make_key(b"int main(){}", "main.c", "gcc", ["-std=c11"])
+
+        assert key == cache.make_key(b"int main(){}", "main.c", "gcc", ["-std=c11"])
+        assert key != cache.make_key(b"int main(){ }", "main.c", "gcc", ["-std=c11"])
+        assert key != cache.make_key(b"int main(){}", "main.c", "gcc", ["-O2"])
+
+    def test_miss_then_hit(self, cache, binary, tmp_path):
+        destination = str(tmp_path / "copy")
+        assert cache.get("ab" * 32, destination) is None
+
+        cache.put_binary("ab" * 32, binary)
+        cached = cache.get("ab" * 32, destination)
+
+        assert cached.binary_path == destination
+        assert open(destination, "rb").read() == open(binary, "rb").read()
+        assert os.access(cached.binary_path, os.X_OK)
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_caches_compile_failures(self, cache, tmp_path):
+        cache.put_failure("cd" * 32, "main.c:1: error: expected ';'")
+
+        cached = cache.get("cd" * 32, str(tmp_path / "copy"))
+
+        assert cached.binary_path is None
+        assert cached.error == "main.c:1: error: expected ';'"
+        assert cache.stats()["failure_hits"] == 1
+
+    def test_compile_failures_expire(self, cache, tmp_path):
+        cache.put_failure("cd" * 32, "main.c:1: error: expected ';'")
+        os.utime(cache._path("cd" * 32, ".err"), (1, 1))
+
+        assert cache.get("cd" * 32, str(tmp_path / "copy")) is None
+
+    def test_entry_evicted_before_copy_is_a_miss(self, cache, binary, tmp_path):
+        cache.put_binary("ab" * 32, binary)
+        os.unlink(cache._path("ab" * 32, ".bin"))  # Evicted by another worker
+
+        assert cache.get("ab" * 32, str(tmp_path / "copy")) is None
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self, tmp_path, binary):
+        cache = ArtifactCache(str(tmp_path / "small"), max_bytes=250)
+        cache.put_binary("01" * 32, binary)
+        cache.put_binary("02" * 32, binary)
+        os.utime(cache._path("01" * 32, ".bin"), (1, 1))
+
+        cache.put_binary("03" * 32, binary)
+
+        assert cache.get("01" * 32, str(tmp_path / "copy")) is None
+        assert cache.get("03" * 32, str(tmp_path / "copy")) is not None
+        assert cache.stats()["evictions"] >= 1
+
+
+class TestCompiledExecutorCache:
+
+    def test_second_compile_is_a_cache_hit(self, c_executor, sample_c_code, tmp_path):
+        from lib.executors.artifact_cache import get_artifact_cache
+
+        cache = get_artifact_cache()
+        hits = cache.hits
+
+        for run in ("first", "second"):
+            workdir = tmp_path / run
+            workdir.mkdir()
+            filepath = workdir / "main.c"
+            filepath.write_text(sample_c_code)
+
+            command = c_executor._build_command(str(filepath), str(workdir))
+
+            assert os.access(command[0], os.X_OK)
+
+        assert cache.hits == hits + 1
+
+    def test_compile_failure_is_cached(self, c_executor, tmp_path):
+        from lib.executors.artifact_cache import get_artifact_cache
+
+        cache = get_artifact_cache()
+        failure_hits = cache.failure_hits
+
+        for run in ("first", "second"):
+            workdir = tmp_path / run
+            workdir.mkdir()
+            filepath = workdir / "main.c"
+            filepath.write_text("int main() { return }")
+
+            with pytest.raises(Exception, match="Compilation failed"):
+                c_executor._build_command(str(filepath), str(workdir))
+
+        assert cache.failure_hits == failure_hits + 1
+
+    def test_transient_compile_failure_is_not_cached(
+        self, c_executor, tmp_path, monkeypatch
+    ):
+        import subprocess
+        from lib.executors import compiled_base
+        from lib.executors.artifact_cache import get_artifact_cache
+
+        cache = get_artifact_cache()
+        failure_hits = cache.failure_hits
+        killed = subprocess.CompletedProcess(
+            [], 1, "", "gcc: fatal error: Killed signal terminated program cc1\n"
+        )
+        monkeypatch.setattr(compiled_base.subprocess, "run", lambda *a, **k: killed)
+
+        for run in ("first", "second"):
+            workdir = tmp_path / run
+            workdir.mkdir()
+            filepath = workdir / "main.c"
+            filepath.write_text("int main() { return 0; } /* oom */")
+
+            with pytest.raises(Exception, match="Compilation failed"):
+                c_executor._build_command(str(filepath), str(workdir))
+
+        assert cache.failure_hits == failure_hits
+
+    def test_retries_without_pch(self, c_executor, sample_c_code, tmp_path, monkeypatch):
+        from lib.executors.artifact_cache import get_artifact_cache
+
+        cache = get_artifact_cache()
+        failure_hits = cache.failure_hits
+        broken = tmp_path / "broken.h"
+        broken.write_text("#define main not_main\n")
+        monkeypatch.setattr(
+            c_executor, "_pch_flags", lambda *args: ["-include", str(broken)]
+        )
+
+        for run in ("first", "second"):
+            workdir = tmp_path / run
+            workdir.mkdir()
+            filepath = workdir / "main.c"
+            filepath.write_text(sample_c_code + "/* pch retry */\n")
+
+            command = c_executor._build_command(str(filepath), str(workdir))
+
+            assert os.access(command[0], os.X_OK)
+
+        assert cache.failure_hits == failure_hits
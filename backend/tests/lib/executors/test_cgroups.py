@@ -0,0 +1,76 @@
+"""
+Tests for cgroup v2 Resource Control
+
+Covers:
+- Enabling controllers on the delegated root
+- Per-job limits (memory.max, cpu.max, pids.max)
+- Reading memory.peak, cpu.stat and OOM kills
+- Memory limits move from RLIMIT_AS to the cgroup
+"""
+
+import os
+import pytest
+from lib.executors import cgroups
+from lib.executors.cgroups import CgroupController, CgroupLimits
+
+LIMITS = CgroupLimits(memory_bytes=100 * 1024 * 1024, cpus=0.5, max_processes=60)
+
+
+@pytest.fixture
+def cgroup_root(tmp_path):
+    """Directory standing in for a delegated cgroup v2 hierarchy"""
+    (tmp_path / "cgroup.controllers").write_text("cpuset cpu io memory pids\n")
+    (tmp_path / "cgroup.subtree_control").write_text("")
+    return tmp_path
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestCgroups:
+
+    def test_enables_controllers(self, cgroup_root):
+        CgroupController(str(cgroup_root), LIMITS)
+
+        assert read(cgroup_root / "cgroup.subtree_control") == "+memory +cpu +pids"
+
+    def test_rejects_root_without_controllers(self, cgroup_root):
+        (cgroup_root / "cgroup.controllers").write_text("cpu pids\n")
+
+        with pytest.raises(RuntimeError, match="lacks controllers: memory"):
+            CgroupController(str(cgroup_root), LIMITS)
+
+    def test_applies_job_limits(self, cgroup_root):
+        cgroup = CgroupController(str(cgroup_root), LIMITS).create()
+
+        assert os.path.dirname(cgroup.path) == str(cgroup_root)
+        assert read(os.path.join(cgroup.path, "memory.max")) == str(100 * 1024 * 1024)
+        assert read(os.path.join(cgroup.path, "memory.swap.max")) == "0"
+        assert read(os.path.join(cgroup.path, "cpu.max")) == "50000 100000"
+        assert read(os.path.join(cgroup.path, "pids.max")) == "60"
+
+    def test_reads_stats(self, cgroup_root):
+        cgroup = CgroupController(str(cgroup_root), LIMITS).create()
+        with open(os.path.join(cgroup.path, "memory.peak"), "w") as f:
+            f.write("52428800\n")
+        with open(os.path.join(cgroup.path, "cpu.stat"), "w") as f:
+            f.write("usage_usec 120000\nuser_usec 100000\nthrottled_usec 3000\n")
+        with open(os.path.join(cgroup.path, "memory.events"), "w") as f:
+            f.write("low 0\nhigh 0\nmax 4\noom 1\noom_kill 1\n")
+
+        stats = cgroup.stats()
+
+        assert stats.memory_peak_bytes == 52428800
+        assert stats.cpu_usage_usec == 120000
+        assert stats.cpu_throttled_usec == 3000
+        assert stats.oom_kills == 1
+
+    def test_memory_limit_moves_to_cgroup(self, python_executor, javascript_executor):
+        assert python_executor._sandbox_limits().memory_bytes is not None
+        assert python_executor._sandbox_limits(cgroup=True).memory_bytes is None
+        assert javascript_executor._sandbox_limits().memory_bytes is None
+
+    def test_disabled_without_root(self):
+        assert cgroups.get_cgroup_controller() is None
@@ -0,0 +1,67 @@
+"""
+Tests for Compile Profiles
+
+Covers:
+- Profile flags per compiler
+- Profile timeouts and defaults
+- Building with every profile
+"""
+
+import pytest
+from lib.executors import get_executor
+from lib.executors.compile_profiles import get_compile_profile
+
+
+class TestCompileProfiles:
+
+    def test_defaults_to_settings_profile(self):
+        assert get_compile_profile().name == "fast"
+
+    def test_rejects_unknown_profile(self):
+        with pytest.raises(ValueError, match="Unknown compile profile"):
+            get_compile_profile("turbo")
+
+    def test_gcc_flags_per_profile(self):
+        fast = get_executor("cpp", profile="fast")._get_compiler_config()[1]
+        optimized = get_executor("cpp", profile="optimized")._get_compiler_config()[1]
+
+        assert "-O0" in fast and "-pipe" in fast
+        assert "-O2" in optimized
+        assert "-std=c++17" in fast and "-std=c++17" in optimized
+
+    def test_rustc_flags_per_profile(self):
+        fast = get_executor("rust", profile="fast")._get_compiler_config()[1]
+        optimized = get_executor("rust", profile="optimized")._get_compiler_config()[1]
+
+        assert "opt-level=0" in fast
+        assert optimized == ["-O"]
+
+    def test_profile_sets_timeouts(self, monkeypatch):
+        from lib.config import get_settings
+
+        monkeypatch.setattr(get_settings(), "optimized_execution_timeout", 12)
+        executor = get_executor("c", profile="optimized")
+
+        assert executor.profile.compile_timeout == 30
+        assert executor.timeout == 12
+        assert get_executor("c", profile="fast").timeout == get_settings().execution_timeout
+
+    @pytest.mark.executor
+    @pytest.mark.parametrize("profile", ["fast", "optimized"])
+    @pytest.mark.parametrize(
+        "language,filename,source",
+        [
+            ("c", "main.c", '#include <stdio.h>\nint main() { puts("hi"); }\n'),
+            ("cpp", "main.cpp", "#include <iostream>\nint main() { std::cout << 1; }\n"),
+            ("rust", "main.rs", 'fn main() { println!("hi"); }\n'),
+        ],
+    )
+    def test_builds_with_profile(self, tmp_path, profile, language, filename, source):
+        filepath = tmp_path / filename
+        filepath.write_text(source)
+
+        command = get_executor(language, profile=profile)._build_command(
+            str(filepath), str(tmp_path)
+        )
+
+        assert command == [str(tmp_path / "program")]
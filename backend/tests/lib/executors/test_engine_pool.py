@@ -0,0 +1,151 @@
+"""
+Tests for the Execution Engine Pool
+
+Covers:
+- Jobs run in engine processes with output streamed back as frames
+- User input forwarded to the engine's PTY
+- Killing a running program from the worker
+- Errors raised by the engine surfaced as EngineError
+- Engines restarted after exiting mid-job
+- Drain waiters kept referenced until they ran
+"""
+
+import asyncio
+import os
+import pytest
+from lib.executors.engine import ExecutionEngine
+from lib.executors.engine_pool import EngineError, EnginePool
+
+
+def ignore_output(text: str):
+    pass
+
+
+def job(job_id: str, code: str, language: str = "python") -> dict:
+    return {
+        "job_id": job_id,
+        "language": language,
+        "code": code,
+        "filename": "main.py",
+    }
+
+
+@pytest.fixture
+async def engine_pool(monkeypatch):
+    # Engines are separate processes, configured through the environment
+    monkeypatch.setenv("SANDBOX_BACKEND", "none")
+    monkeypatch.setenv("WARM_POOL_PYTHON", "0")
+    monkeypatch.setenv("WARM_POOL_JAVASCRIPT", "0")
+
+    pool = EnginePool(2)
+    await pool.start()
+    yield pool
+    await pool.close()
+
+
+class TestEnginePool:
+
+    @pytest.mark.asyncio
+    async def test_streams_output_from_engine(self, engine_pool):
+        output = []
+
+        result = await engine_pool.execute(
+            job("job-1", "print('hello')\n"), output.append
+        )
+
+        assert result.exit_code == 0
+        assert "".join(output) == "hello\r\n"
+        assert engine_pool.stats()["jobs"] == [1, 0]
+
+    @pytest.mark.asyncio
+    async def test_spreads_jobs_across_engines(self, engine_pool):
+        code = "import time\ntime.sleep(0.3)\n"
+
+        await asyncio.gather(
+            engine_pool.execute(job("job-1", code), ignore_output),
+            engine_pool.execute(job("job-2", code), ignore_output),
+        )
+
+        assert engine_pool.stats()["jobs"] == [1, 1]
+
+    @pytest.mark.asyncio
+    async def test_forwards_input(self, engine_pool):
+        output = []
+
+        def on_start(handle):
+            handle.write("Ada\n")
+
+        result = await engine_pool.execute(
+            job("job-1", "name = input()\nprint('Hello', name)\n"),
+            output.append,
+            on_start,
+        )
+
+        assert result.exit_code == 0
+        assert "Hello Ada" in "".join(output)
+
+    @pytest.mark.asyncio
+    async def test_kills_running_program(self, engine_pool):
+        def on_start(handle):
+            handle.kill()
+
+        result = await asyncio.wait_for(
+            engine_pool.execute(
+                job("job-1", "while True:\n    pass\n"), ignore_output, on_start
+            ),
+            timeout=3,
+        )
+
+        assert result.exit_code != 0
+
+    @pytest.mark.asyncio
+    async def test_reports_engine_errors(self, engine_pool):
+        with pytest.raises(EngineError, match="Unsupported language"):
+            await engine_pool.execute(job("job-1", "", language="cobol"), ignore_output)
+
+    @pytest.mark.asyncio
+    async def test_restarts_exited_engine(self, engine_pool):
+        engine = engine_pool.engines[0]
+        pid = engine.process.pid
+
+        def on_start(handle):
+            os.kill(pid, 9)
+
+        with pytest.raises(EngineError, match="exited"):
+            await engine_pool.execute(
+                job("job-1", "import time\ntime.sleep(5)\n"), ignore_output, on_start
+            )
+
+        result = await engine_pool.execute(job("job-2", "print('back')\n"), ignore_output)
+
+        assert result.exit_code == 0
+        assert engine.running and engine.process.pid != pid
+        assert engine_pool.stats()["restarts"] == [1, 0]
+
+
+class TestExecutionEngine:
+
+    @pytest.mark.asyncio
+    async def test_keeps_drain_waiters_until_done(self):
+        drained = asyncio.Event()
+
+        class Writer:
+            async def drain(self):
+                await drained.wait()
+
+        engine = ExecutionEngine(asyncio.StreamReader(), Writer())
+        resumed = []
+
+        def fail():
+            raise RuntimeError("session closed")
+
+        engine.when_drained(lambda: resumed.append(True))
+        engine.when_drained(fail)
+        assert len(engine._drain_waiters) == 2
+
+        drained.set()
+        await asyncio.sleep(0.01)
+
+        assert resumed == [True]
+        assert engine._drain_waiters == set()
+
@@ -0,0 +1,61 @@
+"""
+Tests for Output Capture
+
+Covers:
+- Stream-only mode
+- Head + tail ring capture
+- Truncation marker
+"""
+
+import pytest
+from lib.executors.output_capture import OutputCapture
+
+
+def feed(capture, data: bytes, chunk_size: int):
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    for i in range(0, len(data), chunk_size):
+        chunk = data[i : i + chunk_size]
+        buffer[: len(chunk)] = chunk
+        capture.append(view[: len(chunk)])
+
+
+class TestOutputCapture:
+
+    def test_stream_mode_keeps_nothing(self):
+        capture = OutputCapture("stream")
+        feed(capture, b"x" * 10000, 4096)
+
+        assert capture.getvalue() == b""
+        assert capture.total_bytes == 10000
+
+    def test_ring_keeps_small_output_whole(self):
+        capture = OutputCapture("ring", limit_bytes=100)
+        feed(capture, b"hello world", 4)
+
+        assert capture.getvalue() == b"hello world"
+        assert capture.dropped_bytes == 0
+
+    def test_ring_keeps_head_and_tail(self):
+        data = bytes(range(256)) * 40
+        capture = OutputCapture("ring", limit_bytes=200)
+        feed(capture, data, 37)
+
+        value = capture.getvalue()
+        assert value.startswith(data[:100])
+        assert value.endswith(data[-100:])
+        assert capture.dropped_bytes == len(data) - 200
+        assert f"[{len(data) - 200} bytes truncated]".encode() in value
+
+    def test_ring_handles_chunks_larger_than_tail(self):
+        data = b"a" * 50 + b"b" * 1000 + b"c" * 50
+        capture = OutputCapture("ring", limit_bytes=100)
+        feed(capture, data, 4096)
+
+        value = capture.getvalue()
+        assert value.startswith(b"a" * 50)
+        assert value.endswith(b"c" * 50)
+
+    def test_rejects_unknown_mode(self):
+        with pytest.raises(ValueError, match="Invalid capture mode"):
+            OutputCapture("everything")
@@ -0,0 +1,88 @@
+"""
+Tests for Precompiled Headers
+
+Covers:
+- Bundle configuration parsing
+- Include scanning
+- Bundle matching
+- Building and injecting a PCH
+"""
+
+import pytest
+from lib.executors.pch import (
+    HeaderBundle,
+    PrecompiledHeaders,
+    parse_bundles,
+    scan_includes,
+)
+
+
+class TestHeaderBundles:
+
+    def test_parses_bundle_spec(self):
+        bundles = parse_bundles("bits/stdc++.h; iostream, vector ;")
+
+        assert bundles == [
+            HeaderBundle(frozenset({"bits/stdc++.h"})),
+            HeaderBundle(frozenset({"iostream", "vector"})),
+        ]
+
+    def test_scans_includes(self):
+        source = "#include <iostream>\n#include<vector>\nint main() {}\n"
+
+        assert scan_includes(source) == frozenset({"iostream", "vector"})
+
+    def test_refuses_directives_before_includes(self):
+        source = "#define _GLIBCXX_DEBUG\n#include <vector>\nint main() {}\n"
+
+        assert scan_includes(source) is None
+
+    def test_allows_directives_after_includes(self):
+        source = "#include <vector>\n#define N 100\nint main() {}\n"
+
+        assert scan_includes(source) == frozenset({"vector"})
+
+    def test_covers_exact_includes_only(self):
+        bundle = HeaderBundle(frozenset({"iostream", "vector", "string"}))
+
+        assert bundle.covers(frozenset({"iostream", "vector", "string"}))
+        # Extra headers would change name lookup in the program
+        assert not bundle.covers(frozenset({"iostream"}))
+        assert not bundle.covers(frozenset({"iostream", "map"}))
+
+    def test_stdcpp_bundle_covers_anything_alongside_it(self):
+        bundle = HeaderBundle(frozenset({"bits/stdc++.h"}))
+
+        assert bundle.covers(frozenset({"bits/stdc++.h", "iostream"}))
+        assert not bundle.covers(frozenset({"iostream"}))
+
+
+class TestPrecompiledHeaders:
+
+    @pytest.mark.executor
+    def test_builds_and_injects_pch(self, tmp_path):
+        pch = PrecompiledHeaders(
+            str(tmp_path), {"cpp": [HeaderBundle(frozenset({"vector"}))]}
+        )
+        flags = ["-std=c++17", "-lstdc++"]
+
+        assert pch.flags_for("#include <vector>\n", "cpp", "g++", flags) == []
+
+        pch.build_all("cpp", "g++", flags)
+        injected = pch.flags_for("#include <vector>\n", "cpp", "g++", flags)
+
+        assert injected[0] == "-include"
+        assert injected[1].endswith(".h")
+        assert pch.flags_for("#include <map>\n", "cpp", "g++", flags) == []
+        assert pch.flags_for("#include <vector>\n", "cpp", "g++", ["-std=c++20"]) == []
+
+    @pytest.mark.executor
+    def test_does_not_inject_headers_the_program_did_not_include(self, tmp_path):
+        pch = PrecompiledHeaders(
+            str(tmp_path), {"cpp": [HeaderBundle(frozenset({"iostream", "algorithm"}))]}
+        )
+        pch.build_all("cpp", "g++", ["-std=c++17"])
+        source = "#include <iostream>\nusing namespace std;\nint count;\n"
+
+        # <algorithm> would make count ambiguous with std::count
+        assert pch.flags_for(source, "cpp", "g++", ["-std=c++17"]) == []
@@ -0,0 +1,95 @@
+"""
+Tests for PTY Session
+
+Covers:
+- Output streaming from the event loop
+- Writing user input to the PTY
+- Exit codes
+- Timeout enforcement
+- Closing a running session reaps it from the loop, without blocking
+"""
+
+import asyncio
+import sys
+import pytest
+from lib.executors.pty_session import PtySession
+
+
+def run_python(code: str):
+    return [sys.executable, "-c", code]
+
+
+class TestPtySession:
+
+    @pytest.mark.asyncio
+    async def test_streams_output(self, tmp_path):
+        chunks = []
+        session = PtySession(
+            run_python("print('hello')"),
+            str(tmp_path),
+            lambda data: chunks.append(bytes(data)),
+        )
+
+        session.start()
+        exit_code = await session.wait(timeout=5)
+        session.close()
+
+        assert exit_code == 0
+        assert b"hello" in b"".join(chunks)
+
+    @pytest.mark.asyncio
+    async def test_writes_input_to_process(self, tmp_path):
+        chunks = []
+        session = PtySession(
+            run_python("name = input(); print('hi ' + name)"),
+            str(tmp_path),
+            lambda data: chunks.append(bytes(data)),
+        )
+
+        session.start()
+        session.write("codr\n")
+        exit_code = await session.wait(timeout=5)
+        session.close()
+
+        assert exit_code == 0
+        assert b"hi codr" in b"".join(chunks)
+
+    @pytest.mark.asyncio
+    async def test_reports_exit_code(self, tmp_path):
+        session = PtySession(run_python("raise SystemExit(3)"), str(tmp_path), lambda _: None)
+
+        session.start()
+        exit_code = await session.wait(timeout=5)
+        session.close()
+
+        assert exit_code == 3
+
+    @pytest.mark.asyncio
+    async def test_kills_process_on_timeout(self, tmp_path):
+        session = PtySession(
+            run_python("import time; time.sleep(30)"), str(tmp_path), lambda _: None
+        )
+
+        session.start()
+        exit_code = await session.wait(timeout=0.2)
+        session.close()
+
+        assert exit_code != 0
+        assert session.process.poll() is not None
+
+    @pytest.mark.asyncio
+    async def test_close_reaps_running_process_from_loop(self, tmp_path):
+        session = PtySession(run_python("import time; time.sleep(30)"), str(tmp_path))
+        session.start()
+
+        session.close()
+        assert session.process.returncode is None  # Killed, not waited for
+
+        for _ in range(100):
+            if session.process.returncode is not None:
+                break
+            await asyncio.sleep(0.02)
+
+        assert session.process.returncode == -9
+        assert session._pidfd is None
+
@@ -0,0 +1,58 @@
+"""
+Tests for Resource Accounting
+
+Covers:
+- rusage collected from wait4 when the session's process exits
+- Process tree accounting through a launcher process
+- Live samples from /proc
+"""
+
+import sys
+import pytest
+from lib.config import get_settings
+from lib.executors import base, get_executor
+from lib.executors.pty_session import PtySession
+from lib.executors.sandbox import NoSandboxBackend
+
+BURN_CPU = "import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass\n"
+
+
+class TestResourceMonitor:
+
+    @pytest.mark.asyncio
+    async def test_collects_rusage_of_process_tree(self, tmp_path):
+        # The measured work happens in a grandchild, like behind a sandbox launcher
+        launcher = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {BURN_CPU!r}])"
+        session = PtySession([sys.executable, "-c", launcher], str(tmp_path))
+
+        session.start()
+        exit_code = await session.wait(timeout=5)
+        session.close()
+
+        assert exit_code == 0
+        assert session.rusage is not None
+        assert session.rusage.ru_utime + session.rusage.ru_stime >= 0.3
+        assert session.rusage.ru_maxrss > 0
+
+    @pytest.mark.asyncio
+    async def test_reports_usage_and_live_samples(self, monkeypatch):
+        monkeypatch.setattr(base, "get_sandbox_backend", NoSandboxBackend)
+        monkeypatch.setattr(base, "get_warm_pool", lambda: None)
+        monkeypatch.setattr(get_settings(), "resource_sample_interval_ms", 50)
+        live = []
+
+        async def on_sample(sample):
+            live.append(sample)
+
+        result = await get_executor("python").execute(
+            BURN_CPU + "print('done')\n", "main.py", lambda text: None, on_sample=on_sample
+        )
+
+        resources = result.resources
+        assert resources is not None
+        assert resources.cpu_time >= 0.3
+        assert resources.max_rss_kb > 0
+        assert resources.output_bytes == len(b"done\r\n")
+        assert live and resources.samples == live
+        assert live[-1].processes == 1
+        assert live[-1].cpu_time > 0
@@ -0,0 +1,123 @@
+"""
+Tests for Sandbox Backends
+
+Covers:
+- Firejail command building (limits, wall timeout, Node memory exemption)
+- Process limits left to the job's cgroup when there is one
+- Bubblewrap workspace binding
+- Rlimits applied in the child by namespace/no-sandbox backends
+- Backend lookup
+"""
+
+import subprocess
+import sys
+import pytest
+from lib.executors.sandbox import (
+    BubblewrapBackend,
+    FirejailBackend,
+    NoSandboxBackend,
+    SandboxLimits,
+    get_sandbox_backend,
+)
+
+LIMITS = SandboxLimits(
+    cpu_seconds=5,
+    file_size_bytes=1024 * 1024,
+    max_processes=60,
+    memory_bytes=100 * 1024 * 1024,
+    wall_timeout=5,
+)
+
+
+class TestSandboxBackends:
+
+    def test_firejail_applies_limits(self):
+        launch = FirejailBackend(profile="/etc/sandbox.profile").wrap(
+            ["python3", "/tmp/ws/main.py"], "/tmp/ws", LIMITS
+        )
+
+        assert launch.command[0] == "/usr/bin/firejail"
+        assert "--profile=/etc/sandbox.profile" in launch.command
+        assert "--private=/tmp/ws" in launch.command
+        assert "--rlimit-cpu=5" in launch.command
+        assert "--timeout=00:00:05" in launch.command
+        assert f"--rlimit-as={100 * 1024 * 1024}" in launch.command
+        assert launch.command[-2:] == ["python3", "/tmp/ws/main.py"]
+        assert launch.preexec_fn is None
+
+    def test_firejail_formats_long_wall_timeouts(self):
+        limits = SandboxLimits(
+            cpu_seconds=90, file_size_bytes=1024, max_processes=60, wall_timeout=3725
+        )
+
+        launch = FirejailBackend(profile="p").wrap(["./program"], "/tmp/ws", limits)
+
+        assert "--timeout=01:02:05" in launch.command
+
+    def test_firejail_omits_unset_limits(self):
+        limits = SandboxLimits(cpu_seconds=5, file_size_bytes=1024, max_processes=60)
+
+        launch = FirejailBackend(profile="p").wrap(["node", "main.js"], "/tmp/ws", limits)
+
+        assert not any(arg.startswith("--timeout") for arg in launch.command)
+        assert not any(arg.startswith("--rlimit-as") for arg in launch.command)
+
+    def test_process_limit_left_to_cgroup(self, python_executor):
+        limits = python_executor._sandbox_limits(cgroup=True)
+
+        launch = FirejailBackend(profile="p").wrap(["python3", "main.py"], "/tmp/ws", limits)
+
+        assert limits.max_processes is None
+        assert not any(arg.startswith("--rlimit-nproc") for arg in launch.command)
+        assert python_executor._sandbox_limits().max_processes == 60
+
+    def test_javascript_executor_skips_memory_limit(self, javascript_executor):
+        limits = javascript_executor._sandbox_limits()
+
+        assert limits.memory_bytes is None
+
+    def test_bubblewrap_binds_only_workspace_writable(self):
+        launch = BubblewrapBackend().wrap(["python3", "main.py"], "/tmp/ws", LIMITS)
+
+        command = launch.command
+        bind = command.index("--bind")
+        assert command[bind + 1 : bind + 3] == ["/tmp/ws", "/tmp/ws"]
+        assert "--unshare-all" in command
+        assert command[-2:] == ["python3", "main.py"]
+        assert launch.preexec_fn is not None
+
+    def test_no_sandbox_applies_rlimits(self):
+        launch = NoSandboxBackend().wrap(
+            [
+                sys.executable,
+                "-c",
+                "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])",
+            ],
+            "/tmp",
+            LIMITS,
+        )
+
+        result = subprocess.run(
+            launch.command,
+            preexec_fn=launch.preexec_fn,
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.stdout.strip() == "5"
+
+    def test_measures_launch_cost(self):
+        backend = NoSandboxBackend()
+
+        cost = backend.measure_launch_cost(samples=2)
+
+        assert cost > 0
+        assert backend.launch_cost == cost
+
+    def test_get_sandbox_backend(self):
+        assert get_sandbox_backend("none").name == "none"
+        assert get_sandbox_backend("bwrap").name == "bubblewrap"
+        assert get_sandbox_backend("none") is get_sandbox_backend("none")
+
+        with pytest.raises(ValueError, match="Unknown sandbox backend"):
+            get_sandbox_backend("docker")
@@ -0,0 +1,114 @@
+"""
+Tests for Warm Pool
+
+Covers:
+- Jobs served by a parked interpreter run as if started directly
+- The activation line echoed by the PTY is not part of the output
+- Pool hits, misses and background refill
+- Discarding the interpreter when the job fails before it starts
+"""
+
+import shutil
+import pytest
+from lib.executors import get_executor
+from lib.executors import base
+from lib.executors.sandbox import NoSandboxBackend
+from lib.executors.warm_pool import WarmPool
+
+
+@pytest.fixture
+def warm_pool(monkeypatch):
+    """Warm pool with the sandbox bypassed (firejail is not available in tests)"""
+    monkeypatch.setattr(base, "get_sandbox_backend", NoSandboxBackend)
+    pool = WarmPool({"python": 1, "javascript": 1})
+    monkeypatch.setattr(base, "get_warm_pool", lambda: pool)
+    return pool
+
+
+async def run(language: str, code: str, filename: str, user_input: str = ""):
+    output = []
+
+    def on_start(session):
+        if user_input:
+            session.write(user_input)
+
+    result = await get_executor(language).execute(
+        code=code, filename=filename, on_output=output.append, on_start=on_start
+    )
+    return result, "".join(output)
+
+
+class TestWarmPool:
+
+    @pytest.mark.asyncio
+    async def test_runs_python_as_main_script(self, warm_pool):
+        await warm_pool.fill()
+        code = (
+            "import sys\n"
+            "name = input()\n"
+            "print(__name__, sys.argv[0].endswith('main.py'), name)\n"
+        )
+
+        result, output = await run("python", code, "main.py", "codr\n")
+        await warm_pool.close()
+
+        assert result.exit_code == 0
+        assert warm_pool.hits == 1
+        assert "__main__ True codr" in output
+        assert "codr-warm-" not in output
+
+    @pytest.mark.asyncio
+    async def test_hides_bootstrap_from_python_traceback(self, warm_pool):
+        await warm_pool.fill()
+
+        result, output = await run("python", "x = 1\nprint(1 / 0)\n", "main.py")
+        await warm_pool.close()
+
+        assert result.exit_code == 1
+        assert 'File "main.py", line 2' in output
+        assert "<string>" not in output
+        assert "ZeroDivisionError" in output
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(shutil.which("node") is None, reason="node not installed")
+    async def test_runs_javascript_as_main_module(self, warm_pool):
+        await warm_pool.fill()
+        code = "console.log(require.main === module, process.argv[1].endsWith('main.js'));\n"
+
+        result, output = await run("javascript", code, "main.js")
+        await warm_pool.close()
+
+        assert result.exit_code == 0
+        assert warm_pool.hits == 1
+        assert "true true" in output
+
+    @pytest.mark.asyncio
+    async def test_miss_falls_back_and_refills(self, warm_pool):
+        result, output = await run("python", "print('cold')\n", "main.py")
+
+        assert result.exit_code == 0
+        assert "cold" in output
+        assert warm_pool.misses == 1
+
+        # The miss scheduled a refill in the background
+        await warm_pool.fill()
+        assert warm_pool.stats()["idle"] == 2
+        await warm_pool.close()
+        assert warm_pool.stats()["idle"] == 0
+
+    @pytest.mark.asyncio
+    async def test_discards_interpreter_when_job_cannot_start(self, warm_pool):
+        await warm_pool.fill()
+        warm = warm_pool._idle["python"][0]
+
+        with pytest.raises(ValueError, match="Invalid filename"):
+            await run("python", "print(1)\n", "../main.py")
+        await warm_pool.close()
+
+        assert warm_pool.hits == 1
+        assert warm.session.process.returncode is not None
+        assert warm.session._master_fd is None
+
+    def test_unpooled_language_is_not_served(self, warm_pool):
+        assert warm_pool.acquire("rust") is None
+        assert warm_pool.misses == 0
@@ -0,0 +1,84 @@
+"""
+Tests for Workspace Pool
+
+Covers:
+- Workspaces are reused after a background wipe
+- Wiping contents the program made unwritable
+- Disk quota enforcement while a program runs
+"""
+
+import os
+import pytest
+from lib.executors import base, get_executor
+from lib.executors.sandbox import NoSandboxBackend
+from lib.executors.workspace_pool import WorkspacePool
+
+
+@pytest.fixture
+def workspaces(tmp_path):
+    pool = WorkspacePool(str(tmp_path), size=1, quota_bytes=1024 * 1024)
+    yield pool
+    pool.close()
+
+
+class TestWorkspacePool:
+
+    @pytest.mark.asyncio
+    async def test_reuses_wiped_workspace(self, workspaces):
+        workspace = workspaces.acquire()
+        os.makedirs(os.path.join(workspace.path, "nested"))
+        with open(os.path.join(workspace.path, "nested", "out.txt"), "w") as f:
+            f.write("data")
+
+        workspaces.release(workspace)
+        await workspaces.drain()
+
+        assert workspaces.acquire() is workspace
+        assert os.listdir(workspace.path) == []
+        assert workspaces.stats()["reused"] == 2
+
+    @pytest.mark.asyncio
+    async def test_wipes_unwritable_directories(self, workspaces):
+        workspace = workspaces.acquire()
+        locked = os.path.join(workspace.path, "locked")
+        os.makedirs(os.path.join(locked, "inner"))
+        os.chmod(locked, 0)
+
+        workspaces.release(workspace)
+        await workspaces.drain()
+
+        assert os.listdir(workspace.path) == []
+        assert workspaces.stats()["dropped"] == 0
+
+    @pytest.mark.asyncio
+    async def test_creates_workspace_when_pool_is_empty(self, workspaces):
+        first = workspaces.acquire()
+        second = workspaces.acquire()
+
+        assert first.path != second.path
+
+        workspaces.release(first)
+        workspaces.release(second)
+        await workspaces.drain()
+
+        # Only the configured number of workspaces is kept
+        assert workspaces.stats()["free"] == 1
+
+    @pytest.mark.asyncio
+    async def test_kills_program_over_quota(self, workspaces, monkeypatch):
+        monkeypatch.setattr(base, "get_sandbox_backend", NoSandboxBackend)
+        monkeypatch.setattr(base, "get_warm_pool", lambda: None)
+        monkeypatch.setattr(base, "get_workspace_pool", lambda: workspaces)
+        code = (
+            "import time\n"
+            "with open('big.bin', 'wb') as f:\n"
+            "    f.write(b'x' * 2 * 1024 * 1024)\n"
+            "time.sleep(10)\n"
+        )
+        output = []
+
+        result = await get_executor("python").execute(code, "main.py", output.append)
+
+        assert result.exit_code != 0
+        assert result.execution_time < 5
+        assert "Disk quota of 1MB exceeded" in "".join(output)
@@ -0,0 +1,66 @@
+"""
+Tests for the Pub/Sub Multiplexer
+
+Covers:
+- Dispatching messages of many channels over one connection
+- Several handlers per channel
+- Unsubscribing once the last handler is removed
+"""
+
+import asyncio
+import pytest
+from lib.redis import PubSubMultiplexer
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def multiplexer(redis_client):
+    mux = PubSubMultiplexer(redis_client, "test")
+    await mux.start()
+    yield mux
+    await mux.close()
+
+
+class TestPubSubMultiplexer:
+
+    @pytest.mark.asyncio
+    async def test_dispatches_by_channel(self, multiplexer, redis_client):
+        received = {"a": [], "b": []}
+        await multiplexer.subscribe("job:a:input", received["a"].append)
+        await multiplexer.subscribe("job:b:input", received["b"].append)
+
+        await redis_client.publish("job:a:input", "to a")
+        await redis_client.publish("job:b:input", "to b")
+        await wait_for(lambda: received["a"] and received["b"])
+
+        assert received == {"a": ["to a"], "b": ["to b"]}
+        assert multiplexer.channel_count == 2
+
+    @pytest.mark.asyncio
+    async def test_shares_channel_between_handlers(self, multiplexer, redis_client):
+        first, second = [], []
+        await multiplexer.subscribe("job:a:input", first.append)
+        await multiplexer.subscribe("job:a:input", second.append)
+
+        await multiplexer.unsubscribe("job:a:input", first.append)
+        await redis_client.publish("job:a:input", "hello")
+        await wait_for(lambda: second)
+
+        assert first == []
+        assert second == ["hello"]
+
+    @pytest.mark.asyncio
+    async def test_unsubscribes_last_handler(self, multiplexer, redis_client):
+        handler = [].append
+        await multiplexer.subscribe("job:a:input", handler)
+        await multiplexer.unsubscribe("job:a:input", handler)
+
+        assert multiplexer.channel_count == 0
+        assert await redis_client.publish("job:a:input", "nobody") == 0
@@ -0,0 +1,275 @@
+"""
+Tests for the Reliable Job Queue
+
+Covers:
+- FIFO delivery into a per-worker processing list
+- Weighted pick across priority classes and worker affinity
+- Tenants taking turns, and the cap on each tenant's running jobs
+- Unidentified clients left uncapped, freed tenants waking workers
+- Every key in the queue's cluster slot
+- Blocking until a job is queued
+- Ack removing finished jobs
+- Dropping abandoned jobs in the same pick
+- Refusing jobs past the maximum depth
+- Queue position and wait estimates from recent run times
+- Reaping jobs of workers whose heartbeat expired
+- Failing jobs that ran out of delivery attempts
+"""
+
+import asyncio
+import json
+import pytest
+from lib.services import job_queue
+from lib.services.job_queue import JobQueue, QueueFullError
+
+
+@pytest.fixture
+def queue(redis_client):
+    return JobQueue(redis_client)
+
+
+def job(
+    job_id: str,
+    language: str = "python",
+    priority: str = "interactive",
+    tenant: str = "ip:1.1.1.1",
+) -> dict:
+    return {
+        "job_id": job_id,
+        "code": "print(1)",
+        "language": language,
+        "priority": priority,
+        "tenant": tenant,
+    }
+
+
+class TestJobQueue:
+
+    @pytest.mark.asyncio
+    async def test_delivers_in_order_into_processing_list(self, queue, redis_client):
+        await queue.enqueue(job("a"))
+        await queue.enqueue(job("b"))
+
+        first = await queue.dequeue("w1", timeout=1)
+        second = await queue.dequeue("w1", timeout=1)
+
+        assert json.loads(first)["job_id"] == "a"
+        assert json.loads(second)["job_id"] == "b"
+        assert await queue.depth() == 0
+        assert await redis_client.llen(queue._processing_key("w1")) == 2
+
+    @pytest.mark.asyncio
+    async def test_weighs_priority_classes(self, queue, monkeypatch):
+        # Interactive weighs 8, batch 1: [0, 8/9) picks interactive
+        await queue.enqueue(job("compile", "rust", "batch"))
+        await queue.enqueue(job("script", "python"))
+
+        monkeypatch.setattr(job_queue.random, "random", lambda: 0.95)
+        first = await queue.dequeue("w1", timeout=1)
+        await queue.enqueue(job("script", "python"))
+        monkeypatch.setattr(job_queue.random, "random", lambda: 0.5)
+        second = await queue.dequeue("w1", timeout=1)
+
+        assert json.loads(first)["job_id"] == "compile"
+        assert json.loads(second)["job_id"] == "script"
+
+    @pytest.mark.asyncio
+    async def test_prefers_affinity_languages(self, queue, monkeypatch):
+        monkeypatch.setattr(job_queue.random, "random", lambda: 0.4)
+        await queue.enqueue(job("script", "python"))
+        await queue.enqueue(job("compile", "rust"))
+
+        # Python then rust, weighing 8 and 4 * 8
+        raw = await queue.dequeue("w1", timeout=1, affinity=["rust"])
+
+        assert json.loads(raw)["job_id"] == "compile"
+
+    @pytest.mark.asyncio
+    async def test_takes_turns_between_tenants(self, queue):
+        for job_id in ("n1", "n2", "n3"):
+            await queue.enqueue(job(job_id, tenant="noisy"))
+        await queue.enqueue(job("q1", tenant="quiet"))
+
+        # One of noisy's jobs ahead, the others wait for their turn
+        assert await queue.position(job("q1", tenant="quiet")) == (2, None)
+        order = [
+            json.loads(await queue.dequeue("w1", timeout=1))["job_id"]
+            for _ in range(4)
+        ]
+
+        assert order == ["n1", "q1", "n2", "n3"]
+        assert await queue.depth() == 0
+
+    @pytest.mark.asyncio
+    async def test_caps_running_jobs_per_tenant(self, queue, redis_client, monkeypatch):
+        monkeypatch.setattr(queue.settings, "tenant_max_running", 1)
+        await queue.enqueue(job("a1", tenant="a"))
+        await queue.enqueue(job("a2", tenant="a"))
+        await queue.enqueue(job("b1", tenant="b"))
+
+        first = await queue.dequeue("w1", timeout=1)
+        second = await queue.dequeue("w1", timeout=1)
+        assert await queue.dequeue("w1", timeout=0.1) is None  # a is at its cap
+
+        await queue.ack("w1", first)
+        third = await queue.dequeue("w1", timeout=1)
+
+        assert [json.loads(raw)["job_id"] for raw in (first, second, third)] == [
+            "a1",
+            "b1",
+            "a2",
+        ]
+        assert sorted(await redis_client.hvals(queue._running_key())) == ["1", "1"]
+
+    @pytest.mark.asyncio
+    async def test_does_not_cap_anonymous_jobs(self, queue, monkeypatch):
+        monkeypatch.setattr(queue.settings, "tenant_max_running", 1)
+        await queue.enqueue(job("x1", tenant=None))
+        await queue.enqueue(job("x2", tenant=None))
+
+        assert await queue.dequeue("w1", timeout=1) is not None
+        assert await queue.dequeue("w1", timeout=1) is not None
+
+    @pytest.mark.asyncio
+    async def test_ack_wakes_worker_for_capped_tenant(self, queue, monkeypatch):
+        monkeypatch.setattr(queue.settings, "tenant_max_running", 1)
+        await queue.enqueue(job("a1", tenant="a"))
+        await queue.enqueue(job("a2", tenant="a"))
+        first = await queue.dequeue("w1", timeout=1)
+
+        # Blocks on the wakeup list, a2 is held back by the cap
+        waiting = asyncio.create_task(queue.dequeue("w2", timeout=5))
+        await asyncio.sleep(0.1)
+        await queue.ack("w1", first)
+        raw = await asyncio.wait_for(waiting, timeout=1)
+
+        assert json.loads(raw)["job_id"] == "a2"
+
+    def test_keys_share_cluster_slot(self, queue):
+        tag = "{" + queue.name + "}"
+
+        assert queue._running_key().startswith(tag + ":")
+        assert queue._processing_key("w1").startswith(tag + ":")
+        assert all(key.startswith(tag + ":") for key in queue._ring_keys()[:-1])
+
+    @pytest.mark.asyncio
+    async def test_takes_jobs_from_legacy_list(self, queue, redis_client):
+        await redis_client.lpush(queue.name, json.dumps(job("old")))
+
+        raw = await queue.dequeue("w1", timeout=1)
+
+        assert json.loads(raw)["job_id"] == "old"
+
+    @pytest.mark.asyncio
+    async def test_blocks_until_job_is_queued(self, queue):
+        assert await queue.dequeue("w1", timeout=1) is None
+
+        waiting = asyncio.create_task(queue.dequeue("w1", timeout=2))
+        await asyncio.sleep(0.1)
+        await queue.enqueue(job("a"))
+        raw = await asyncio.wait_for(waiting, timeout=1)
+
+        assert json.loads(raw)["job_id"] == "a"
+
+    @pytest.mark.asyncio
+    async def test_ack_removes_job(self, queue, redis_client):
+        await queue.enqueue(job("a"))
+        raw = await queue.dequeue("w1", timeout=1)
+
+        await queue.ack("w1", raw)
+
+        assert await redis_client.llen(queue._processing_key("w1")) == 0
+
+    @pytest.mark.asyncio
+    async def test_drops_abandoned_jobs(self, queue, redis_client):
+        await queue.enqueue(job("a"))
+        await queue.enqueue(job("b"))
+        await queue.enqueue(job("c"))
+        await queue.abandon("a")
+        await queue.abandon("b")
+
+        raw = await queue.dequeue("w1", timeout=1)
+
+        assert json.loads(raw)["job_id"] == "c"
+        assert queue.skipped == 2
+        assert await redis_client.lrange(queue._processing_key("w1"), 0, -1) == [raw]
+        assert await queue.dequeue("w1", timeout=1) is None
+
+    @pytest.mark.asyncio
+    async def test_refuses_jobs_past_max_depth(self, queue):
+        assert await queue.enqueue(job("a"), max_depth=2) == 1
+        assert await queue.enqueue(job("b", "rust"), max_depth=2) == 2
+
+        with pytest.raises(QueueFullError) as refused:
+            await queue.enqueue(job("c"), max_depth=2)
+
+        assert refused.value.depth == 2
+        assert await queue.depth() == 2
+
+    @pytest.mark.asyncio
+    async def test_estimates_position_and_wait(self, queue, monkeypatch):
+        monkeypatch.setattr(job_queue.random, "random", lambda: 0.0)
+        assert await queue.expected_wait() is None  # No workers yet
+
+        await queue.heartbeat("w1", capacity=2)
+        await queue.ack("w1", "done", "python", 2.0)
+        await queue.ack("w1", "done", "python", 4.0)
+        for job_id in ("a", "b", "c"):
+            await queue.enqueue(job(job_id))
+        await queue.enqueue(job("compile", "rust", "batch"))
+
+        # Two python jobs ahead at 3s each, over two slots
+        assert await queue.position(job("c")) == (3, 3.0)
+        # Batch waits for the interactive lists too, rust has no samples (1s)
+        assert await queue.position(job("compile", "rust", "batch")) == (4, 4.5)
+        assert await queue.expected_wait() == 4.5
+
+        await queue.dequeue("w1", timeout=1)
+        assert await queue.position(job("c")) == (2, 1.5)
+        assert await queue.position(job("a")) is None
+
+    @pytest.mark.asyncio
+    async def test_reaps_jobs_of_dead_workers(self, queue, redis_client):
+        await queue.heartbeat("alive")
+        await queue.heartbeat("dead")
+        await queue.enqueue(job("a"))
+        await queue.enqueue(job("b"))
+        await queue.enqueue(job("c"))
+        await queue.dequeue("alive", timeout=1)
+        await queue.dequeue("dead", timeout=1)
+        await redis_client.delete(queue._heartbeat_key("dead"))
+
+        dead, failed = await queue.reap()
+
+        assert dead == ["dead"]
+        assert failed == []
+        assert await redis_client.hvals(queue._running_key()) == ["1"]
+        # The recovered job is next in line, ahead of c
+        recovered = await queue.dequeue("alive", timeout=1)
+        assert json.loads(recovered)["job_id"] == "b"
+        assert await redis_client.hget(queue._attempts_key(), recovered) == "1"
+        assert await redis_client.smembers(queue._workers_key()) == {"alive"}
+
+    @pytest.mark.asyncio
+    async def test_recovery_bounds_wakeup_tokens(self, queue, redis_client, monkeypatch):
+        monkeypatch.setattr(job_queue, "WAKEUP_MAX", 2)
+        for i in range(4):
+            await queue.enqueue(job(f"j{i}", tenant=f"t{i}"))
+            await queue.dequeue("dead", timeout=1)
+
+        await queue.recover("dead")
+
+        assert await redis_client.llen(queue._wakeup_key()) == 2
+
+    @pytest.mark.asyncio
+    async def test_fails_jobs_out_of_attempts(self, queue, monkeypatch):
+        monkeypatch.setattr(queue.settings, "job_max_attempts", 2)
+        await queue.enqueue(job("a"))
+
+        await queue.dequeue("w1", timeout=1)
+        assert await queue.recover("w1") == []
+        raw = await queue.dequeue("w2", timeout=1)
+        failed = await queue.recover("w2")
+
+        assert failed == [raw]
+        assert await queue.depth() == 0
@@ -0,0 +1,103 @@
+"""
+Tests for Output Publisher
+
+Covers:
+- Merging chunks per job into one message
+- Size and time based flushing
+- Bounded buffer backpressure
+"""
+
+import asyncio
+import json
+import pytest
+from lib.services.output_publisher import OutputPublisher
+
+
+@pytest.fixture
+def publisher(redis_client, pubsub_service, monkeypatch):
+    async def fake_get_async_redis():
+        return redis_client
+
+    monkeypatch.setattr(
+        "lib.services.output_publisher.get_async_redis", fake_get_async_redis
+    )
+    return OutputPublisher(
+        pubsub=pubsub_service,
+        batch_bytes=64,
+        flush_interval=0.02,
+        max_buffer_bytes=256,
+    )
+
+
+async def collect_messages(redis_client, channel, count, timeout=1.0):
+    ps = redis_client.pubsub()
+    await ps.subscribe(channel)
+    messages = []
+
+    async def read():
+        while len(messages) < count:
+            message = await ps.get_message(ignore_subscribe_messages=True, timeout=0.05)
+            if message:
+                messages.append(json.loads(message["data"]))
+
+    try:
+        await asyncio.wait_for(read(), timeout)
+    finally:
+        await ps.unsubscribe()
+        await ps.close()
+    return messages
+
+
+class TestOutputPublisher:
+
+    @pytest.mark.asyncio
+    async def test_merges_chunks_into_single_message(self, publisher, redis_client):
+        reader = asyncio.create_task(collect_messages(redis_client, "job:a:output", 1))
+        await asyncio.sleep(0.05)
+
+        for chunk in ["he", "ll", "o"]:
+            publisher.publish("a", chunk)
+        await asyncio.sleep(0.05)
+
+        messages = await reader
+        assert [message.pop("id") for message in messages] == [
+            entry_id for entry_id, _ in await redis_client.xrange("job:a:log")
+        ]
+        assert messages == [{"type": "output", "stream": "stdout", "data": "hello"}]
+        assert publisher.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_flushes_when_batch_size_reached(self, publisher):
+        publisher.flush_interval = 60  # Only the size threshold can trigger
+
+        publisher.publish("a", "x" * 64)
+        await asyncio.sleep(0.01)
+
+        assert publisher.messages_published == 1
+
+    @pytest.mark.asyncio
+    async def test_flush_publishes_every_job(self, publisher):
+        publisher.flush_interval = 60
+        publisher.publish("a", "one")
+        publisher.publish("b", "two")
+
+        await publisher.flush()
+
+        assert publisher.messages_published == 2
+        assert publisher.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_signals_backpressure_when_full(self, publisher):
+        publisher.flush_interval = 60
+        publisher.batch_bytes = 1024
+
+        assert publisher.publish("a", "x" * 100) is True
+        assert publisher.publish("a", "x" * 200) is False
+
+        drained = []
+        publisher.when_drained(lambda: drained.append(True))
+        assert drained == []
+
+        await publisher.flush()
+        assert drained == [True]
+        assert not publisher.is_full
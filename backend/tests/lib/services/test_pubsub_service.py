@@ -0,0 +1,167 @@
+"""
+Tests for the Pub/Sub Service
+
+Covers:
+- Job messages routed over the node channel to the subscribed job only
+- Jobs without a node falling back to their own channels
+- Replaying the output log to late and resuming subscribers
+- Subscriptions ending on completion or unsubscribe
+- A resumed subscription outliving the one it replaced
+"""
+
+import asyncio
+import json
+import pytest
+from lib.redis import AsyncRedisManager
+
+
+@pytest.fixture
+async def service(pubsub_service, redis_client, monkeypatch):
+    monkeypatch.setattr(AsyncRedisManager, "_instance", redis_client)
+    yield pubsub_service
+    await pubsub_service.close()
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.01)
+
+
+class TestPubSubService:
+
+    @pytest.mark.asyncio
+    async def test_routes_jobs_over_node_channel(self, service):
+        received = {"a": [], "b": []}
+
+        async def collect(job_id):
+            async def on_message(message):
+                received[job_id].append(message)
+
+            await service.subscribe_to_channels(job_id, on_message)
+
+        tasks = [asyncio.create_task(collect(job_id)) for job_id in received]
+        await wait_for(lambda: service.stats()["subscribed_jobs"] == 2)
+
+        # The worker side of the same service, routing to this node
+        service.route("a", service.node_id)
+        service.route("b", service.node_id)
+        service.route("gone", service.node_id)
+        await service.publish_output("gone", "stdout", "nobody listens")
+        await service.publish_output("a", "stdout", "for a")
+        await service.publish_complete("a", 0, 0.1)
+        await service.publish_complete("b", 1, 0.2)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=2)
+
+        assert [message["type"] for message in received["a"]] == ["output", "complete"]
+        assert received["a"][0]["data"] == "for a"
+        assert received["b"][0].pop("id")
+        assert received["b"] == [
+            {"type": "complete", "exit_code": 1, "execution_time": 0.2}
+        ]
+        assert service.stats() == {
+            "connections": 1,
+            "subscribed_jobs": 0,
+            "messages": 4,
+            "unroutable": 1,
+        }
+
+    @pytest.mark.asyncio
+    async def test_unrouted_jobs_use_job_channels(self, service, redis_client):
+        ps = redis_client.pubsub()
+        await ps.subscribe("job:a:output", "job:a:complete")
+
+        await service.publish_output("a", "stdout", "hi")
+        await service.publish_complete("a", 0, 0.1)
+
+        messages = []
+        while len(messages) < 2:
+            message = await ps.get_message(ignore_subscribe_messages=True, timeout=0.2)
+            if message:
+                data = json.loads(message["data"])
+                del data["id"]
+                messages.append((message["channel"], data))
+        await ps.close()
+
+        assert messages == [
+            ("job:a:output", {"type": "output", "stream": "stdout", "data": "hi"}),
+            ("job:a:complete", {"type": "complete", "exit_code": 0, "execution_time": 0.1}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_ends_subscription(self, service, redis_client):
+        async def on_message(message):
+            pass
+
+        task = asyncio.create_task(service.subscribe_to_channels("a", on_message))
+        await wait_for(lambda: service.stats()["subscribed_jobs"] == 1)
+
+        await service.unsubscribe("a")
+        await asyncio.wait_for(task, timeout=1)
+
+        assert service.stats()["subscribed_jobs"] == 0
+
+    @pytest.mark.asyncio
+    async def test_old_subscription_leaves_resumed_one(self, service):
+        received = []
+
+        async def on_message(message):
+            received.append(message)
+
+        old = asyncio.create_task(service.subscribe_to_channels("a", on_message))
+        await wait_for(lambda: service.stats()["subscribed_jobs"] == 1)
+
+        # Resumed before the old socket's teardown, which then unsubscribes
+        new = asyncio.create_task(service.subscribe_to_channels("a", on_message))
+        await asyncio.wait_for(old, timeout=1)
+        assert service.stats()["subscribed_jobs"] == 1
+
+        service.route("a", service.node_id)
+        await service.publish_output("a", "stdout", "live")
+        await service.publish_complete("a", 0, 0.1)
+        await asyncio.wait_for(new, timeout=1)
+
+        assert [message["type"] for message in received] == ["output", "complete"]
+
+    @pytest.mark.asyncio
+    async def test_replays_output_published_before_subscribing(self, service):
+        service.route("a", service.node_id)
+        await service.publish_output("a", "stdout", "early")
+        received = []
+
+        async def on_message(message):
+            received.append(message)
+            if len(received) == 1:
+                await service.publish_output("a", "stdout", "live")
+                await service.publish_complete("a", 0, 0.1)
+
+        await asyncio.wait_for(service.subscribe_to_channels("a", on_message), timeout=2)
+
+        assert [message.get("data") for message in received] == ["early", "live", None]
+        assert received[0]["id"] < received[1]["id"] < received[2]["id"]
+
+    @pytest.mark.asyncio
+    async def test_resumes_after_last_id(self, service):
+        await service.publish_output("a", "stdout", "seen")
+        await service.publish_output("a", "stdout", "missed")
+        await service.publish_complete("a", 0, 0.1)
+        first = []
+
+        async def collect_first(message):
+            first.append(message)
+
+        await asyncio.wait_for(service.subscribe_to_channels("a", collect_first), timeout=2)
+        resumed = []
+
+        async def collect_resumed(message):
+            resumed.append(message)
+
+        await asyncio.wait_for(
+            service.subscribe_to_channels("a", collect_resumed, first[0]["id"]),
+            timeout=2,
+        )
+
+        assert resumed == first[1:]
+        assert [message.get("data") for message in resumed] == ["missed", None]
@@ -0,0 +1,122 @@
+"""
+Tests for Output Stream Processor
+
+Covers:
+- UTF-8 sequences split across chunks
+- ANSI escape sequences split across chunks
+- Traceback regions formatted once
+- Prompts without a trailing newline are not held back
+- Error-looking JavaScript lines without stack frames released as plain text
+"""
+
+import pytest
+from lib.utils.stream_processor import OutputStreamProcessor
+
+WORKDIR = "/tmp/tmpabc123"
+
+
+def run(processor, chunks):
+    output = "".join(processor.feed(memoryview(chunk)) for chunk in chunks)
+    return output + processor.finish()
+
+
+class TestOutputStreamProcessor:
+
+    def test_decodes_utf8_split_across_chunks(self):
+        data = "héllo → wörld\n".encode("utf-8")
+        chunks = [data[i : i + 1] for i in range(len(data))]
+
+        output = run(OutputStreamProcessor("c", WORKDIR), chunks)
+
+        assert output == "héllo → wörld\n"
+
+    def test_strips_ansi_split_across_chunks(self):
+        chunks = [b"\x1b[1;3", b"1mred\x1b", b"[0m plain\n"]
+
+        output = run(OutputStreamProcessor("python", WORKDIR), chunks)
+
+        assert output == "red plain\n"
+
+    def test_emits_prompt_without_newline_immediately(self):
+        processor = OutputStreamProcessor("python", WORKDIR)
+
+        assert processor.feed(memoryview(b"Enter your name: ")) == "Enter your name: "
+
+    def test_formats_python_traceback_once(self, monkeypatch):
+        calls = []
+        from lib.utils import stream_processor
+
+        original = stream_processor.format_error_message
+
+        def spy(text, language, workdir):
+            calls.append(text)
+            return original(text, language, workdir)
+
+        monkeypatch.setattr(stream_processor, "format_error_message", spy)
+
+        traceback = (
+            "before\r\n"
+            "Traceback (most recent call last):\r\n"
+            f'  File "{WORKDIR}/main.py", line 3, in <module>\r\n'
+            "    print(1/0)\r\n"
+            "ZeroDivisionError: division by zero\r\n"
+        ).encode()
+        chunks = [traceback[i : i + 7] for i in range(0, len(traceback), 7)]
+
+        output = run(OutputStreamProcessor("python", WORKDIR), chunks)
+
+        assert len(calls) == 1
+        assert output.startswith("before\r\nTraceback (most recent call last):\r\n")
+        assert '  File "main.py", line 3' in output
+        assert WORKDIR not in output
+        assert output.endswith("ZeroDivisionError: division by zero\r\n")
+
+    def test_filters_node_internals_from_javascript_errors(self):
+        error = (
+            f"{WORKDIR}/main.js:1\r\n"
+            'throw new Error("boom");\r\n'
+            "^\r\n"
+            "\r\n"
+            "Error: boom\r\n"
+            f"    at Object.<anonymous> ({WORKDIR}/main.js:1:7)\r\n"
+            "    at Module._compile (node:internal/modules/cjs/loader:1256:14)\r\n"
+            "    at node:internal/main/run_main_module:23:47\r\n"
+            "\r\n"
+            "Node.js v20.10.0\r\n"
+        ).encode()
+
+        output = run(OutputStreamProcessor("javascript", WORKDIR), [error])
+
+        assert "Error: boom" in output
+        assert "at Object.<anonymous> (main.js:1:7)" in output
+        assert "Module._compile" not in output
+        assert "Node.js v" not in output
+
+    def test_releases_javascript_error_lines_before_a_prompt(self):
+        processor = OutputStreamProcessor("javascript", WORKDIR)
+
+        assert processor.feed(memoryview(b"Error: no such user\r\n")) == ""
+        assert processor.holds_unconfirmed
+        output = processor.feed(memoryview(b"Try again: "))
+
+        assert output == "Error: no such user\r\nTry again: "
+        assert not processor.holds_unconfirmed
+
+    def test_releases_unconfirmed_javascript_region_when_stale(self, monkeypatch):
+        processor = OutputStreamProcessor("javascript", WORKDIR)
+        processor.feed(memoryview(b"RangeError reported, retrying\r\n"))
+
+        assert processor.flush_stale() == ""  # Frames may still follow
+        monkeypatch.setattr(processor, "UNCONFIRMED_TIMEOUT", 0)
+
+        assert processor.flush_stale() == "RangeError reported, retrying\r\n"
+        assert processor.finish() == ""
+
+    @pytest.mark.parametrize("language", ["c", "cpp", "rust"])
+    def test_passes_compiled_language_output_through(self, language):
+        output = run(
+            OutputStreamProcessor(language, WORKDIR),
+            [b"Error: not a traceback\r\n", b"at the end\r\n"],
+        )
+
+        assert output == "Error: not a traceback\r\nat the end\r\n"
@@ -0,0 +1,61 @@
+"""
+Tests for the Worker Supervisor
+
+Covers:
+- Distinct worker ids per process
+- Restarting crashed workers
+- Forwarding SIGTERM and aggregating worker stats
+- --processes parsing
+"""
+
+import os
+import signal
+import threading
+import time
+import pytest
+from services.worker.supervisor import WorkerSupervisor, parse_processes
+
+
+def make_target(tmp_path):
+    """Worker stand-in: crashes on its first start, then runs until SIGTERM"""
+
+    def target(worker_id: str):
+        marker = tmp_path / worker_id
+        if not marker.exists():
+            marker.write_text(str(os.getpid()))
+            os._exit(1)
+
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda sig, frame: stopped.set())
+        while not stopped.is_set():
+            time.sleep(0.01)
+        return {"completed": 3, "failed": 1}
+
+    return target
+
+
+class TestWorkerSupervisor:
+
+    def test_restarts_workers_and_aggregates_stats(self, tmp_path):
+        supervisor = WorkerSupervisor(
+            2, make_target(tmp_path), "test-worker", restart_delay=0.1
+        )
+        timer = threading.Timer(1.0, supervisor.stop)
+        timer.start()
+
+        supervisor.run()
+        timer.join()
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "test-worker-0",
+            "test-worker-1",
+        ]
+        assert supervisor.children == {}
+        assert supervisor.stats() == {"completed": 6, "failed": 2, "restarts": 2}
+
+    def test_parse_processes(self):
+        assert parse_processes("3") == 3
+        assert parse_processes("auto") == (os.cpu_count() or 1)
+
+        with pytest.raises(ValueError):
+            parse_processes("0")
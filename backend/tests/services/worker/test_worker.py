@@ -0,0 +1,240 @@
+"""
+Tests for Code Execution Worker
+
+Covers:
+- Concurrent execution slots
+- Per-slot stats
+- Graceful shutdown draining running jobs
+- Acking finished jobs and recovering jobs of dead workers
+- Malformed jobs dropped or failed without losing their slot
+- User input delivered over the shared Pub/Sub connection
+- Cancelling a job kills its whole process group
+- Toolchain warm-up surviving a failing sandbox probe
+"""
+
+import asyncio
+import json
+import os
+import time
+import pytest
+from lib.config import get_settings
+from lib.executors import base, workspace_pool
+from lib.executors.sandbox import NoSandboxBackend
+from lib.redis import AsyncRedisManager
+from lib.services.job_queue import JobQueue
+from services.worker import worker as worker_module
+from services.worker.worker import CodeExecutionWorker
+from lib.executors.compiled_base import CompiledExecutor
+
+# The fixture stubs warm-up out, kept for the test of warm-up itself
+prepare_toolchains = CodeExecutionWorker._prepare_toolchains
+
+
+@pytest.fixture
+def worker(redis_client, monkeypatch):
+    """Worker on fake Redis, running programs without a sandbox"""
+    monkeypatch.setattr(AsyncRedisManager, "_instance", redis_client)
+    monkeypatch.setattr(base, "get_sandbox_backend", NoSandboxBackend)
+    monkeypatch.setattr(base, "get_warm_pool", lambda: None)
+    monkeypatch.setattr(worker_module, "get_warm_pool", lambda: None)
+    monkeypatch.setattr(CodeExecutionWorker, "_prepare_toolchains", lambda self: None)
+    # The worker closes the workspace pool on shutdown, use a fresh one per test
+    monkeypatch.setattr(workspace_pool, "_workspace_pool", None)
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "worker_poll_timeout", 1)
+    monkeypatch.setattr(settings, "worker_concurrency", 3)
+    monkeypatch.setattr(settings, "worker_heartbeat_interval", 0.05)
+    return CodeExecutionWorker("test-worker")
+
+
+async def push_job(redis_client, job_id: str, code: str):
+    job = {
+        "job_id": job_id,
+        "code": code,
+        "language": "python",
+        "filename": "main.py",
+        "queued_at": time.time(),
+    }
+    await JobQueue(redis_client).enqueue(job)
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.02)
+
+
+class TestCodeExecutionWorker:
+
+    @pytest.mark.asyncio
+    async def test_runs_jobs_concurrently(self, worker, redis_client):
+        for i in range(3):
+            await push_job(redis_client, f"job-{i}", "import time\ntime.sleep(0.6)\n")
+
+        started = time.monotonic()
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.jobs_completed == 3)
+        elapsed = time.monotonic() - started
+
+        worker.stop()
+        await task
+
+        # Serially the three sleeps alone take 1.8s
+        assert elapsed < 1.5
+        assert [slot.jobs_completed for slot in worker.slots] == [1, 1, 1]
+        assert all(slot.busy_time >= 0.6 for slot in worker.slots)
+
+    @pytest.mark.asyncio
+    async def test_drains_running_jobs_on_stop(self, worker, redis_client):
+        await push_job(redis_client, "job-slow", "import time\ntime.sleep(0.5)\n")
+
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.current_job_ids == ["job-slow"])
+        worker.stop()
+        await task
+
+        assert worker.jobs_completed == 1
+        assert worker.current_job_ids == []
+
+    @pytest.mark.asyncio
+    async def test_acks_finished_jobs(self, worker, redis_client):
+        await push_job(redis_client, "job-1", "print('hi')\n")
+
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.jobs_completed == 1)
+        worker.stop()
+        await task
+
+        queue = JobQueue(redis_client)
+        assert await redis_client.llen(queue._processing_key("test-worker")) == 0
+        assert await redis_client.sismember(queue._workers_key(), "test-worker") == 0
+
+    @pytest.mark.asyncio
+    async def test_recovers_jobs_of_dead_workers(self, worker, redis_client):
+        # Taken by a worker that then died without acking it
+        queue = JobQueue(redis_client)
+        await push_job(redis_client, "job-lost", "print('recovered')\n")
+        await queue.dequeue("dead-worker", timeout=1)
+        await redis_client.sadd(queue._workers_key(), "dead-worker")
+
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.jobs_completed == 1)
+        worker.stop()
+        await task
+
+        assert await redis_client.llen(queue._processing_key("dead-worker")) == 0
+
+    @pytest.mark.asyncio
+    async def test_drops_malformed_jobs(self, worker, redis_client):
+        queue = JobQueue(redis_client)
+        # More bad payloads than slots, each must give its slot back
+        for raw in ["{truncated", "[]", '{"code": "print(1)"}', "null"]:
+            await redis_client.lpush(queue.name, raw)
+        await redis_client.lpush(queue.name, json.dumps({"job_id": "job-bad"}))
+        await push_job(redis_client, "job-good", "print('ok')\n")
+
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.jobs_completed == 1)
+        worker.stop()
+        await task
+
+        assert worker.jobs_failed == 5
+        assert await redis_client.llen(queue._processing_key("test-worker")) == 0
+        _, fields = (await redis_client.xrange("job:job-bad:log"))[-1]
+        assert json.loads(fields["m"])["type"] == "error"
+
+    @pytest.mark.asyncio
+    async def test_writes_published_input(self, worker, redis_client):
+        output = redis_client.pubsub()
+        await output.subscribe("job:job-input:output")
+        await push_job(redis_client, "job-input", "name = input()\nprint('Hello', name)\n")
+
+        task = asyncio.create_task(worker.start())
+        await wait_for(lambda: worker.inputs and worker.inputs.channel_count == 2)
+        await redis_client.publish("job:job-input:input", "Ada\n")
+        await wait_for(lambda: worker.jobs_completed == 1)
+        worker.stop()
+        await task
+
+        messages = []
+        while message := await output.get_message(timeout=0.2):
+            messages.append(message)
+        await output.close()
+        text = "".join(
+            json.loads(message["data"]).get("data", "")
+            for message in messages
+            if message["type"] == "message"
+        )
+        assert "Hello Ada" in text
+
+    @pytest.mark.asyncio
+    async def test_cancel_kills_process_group(self, worker, redis_client):
+        output = redis_client.pubsub()
+        await output.subscribe("job:job-loop:output", "job:job-loop:complete")
+        code = (
+            "import subprocess, time\n"
+            "child = subprocess.Popen(['sleep', '30'])\n"
+            "print('child', child.pid, flush=True)\n"
+            "while True:\n"
+            "    time.sleep(0.1)\n"
+        )
+        await push_job(redis_client, "job-loop", code)
+
+        task = asyncio.create_task(worker.start())
+        messages = []
+        child_pid = None
+        while child_pid is None:
+            message = await output.get_message(ignore_subscribe_messages=True, timeout=1)
+            if message:
+                messages.append(json.loads(message["data"]))
+                words = "".join(m.get("data", "") for m in messages).split()
+                if "child" in words[:-1]:
+                    child_pid = int(words[words.index("child") + 1])
+
+        started = time.monotonic()
+        await redis_client.publish("job:job-loop:control", "cancel")
+        await wait_for(lambda: worker.jobs_completed == 1)
+        elapsed = time.monotonic() - started
+        worker.stop()
+        await task
+
+        while message := await output.get_message(ignore_subscribe_messages=True, timeout=0.2):
+            messages.append(json.loads(message["data"]))
+        await output.close()
+
+        assert elapsed < get_settings().execution_timeout
+        assert messages[-1]["type"] == "complete"
+        assert messages[-1]["cancelled"] is True
+        assert worker.stats()["cancelled"] == 1
+        assert not process_alive(child_pid)
+
+    def test_prepares_headers_when_sandbox_probe_fails(self, worker, monkeypatch):
+        class BrokenSandbox:
+            name = "firejail"
+
+            def measure_launch_cost(self):
+                raise FileNotFoundError("firejail")
+
+        prepared = []
+        monkeypatch.setattr(worker_module, "get_sandbox_backend", BrokenSandbox)
+        monkeypatch.setattr(
+            CompiledExecutor,
+            "prepare_precompiled_headers",
+            lambda self: prepared.append(self.language),
+        )
+
+        prepare_toolchains(worker)
+
+        assert prepared == ["c", "cpp"]
+
+
+def process_alive(pid: int) -> bool:
+    """True unless the process is gone or a zombie left for init to reap"""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+    except FileNotFoundError:
+        return False
@@ -10,6 +10,11 @@ import { NextRequest, NextResponse } from 'next/server';
  * - API key stored in server environment variable (not NEXT_PUBLIC_)
  * - API key never sent to browser
  * - Backend validates API key before issuing job tokens
+ * - Forwards the browser's address (X-Client-IP), the backend queues jobs
+ *   per end user rather than per proxy. Only a header the hosting platform
+ *   sets itself is read (CLIENT_IP_HEADER, x-real-ip by default): the
+ *   client controls X-Forwarded-For and could pose as a new user each time.
+ *   Without it, jobs share one anonymous line.
  */
 export async function POST(request: NextRequest) {
   const isDev = process.env.NODE_ENV === 'development';
@@ -28,12 +33,18 @@ export async function POST(request: NextRequest) {
     );
   }
 
+  // Overwritten by the hosting platform's proxy, whatever the browser sent
+  const clientIp = request.headers.get(
+    process.env.CLIENT_IP_HEADER || 'x-real-ip'
+  );
+
   try {
     const response = await fetch(`${backendUrl}/api/jobs/create`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'X-API-Key': apiKey,  // API key stays server-side!
+        ...(clientIp ? { 'X-Client-IP': clientIp } : {}),
       },
     });
 
@@ -9,6 +9,7 @@ export type WebSocketMessageType =
   | 'input'
   | 'output'
   | 'complete'
+  | 'resources'
   | 'error';
  
 export interface WebSocketOutputMessage {
@@ -17,10 +18,33 @@ export interface WebSocketOutputMessage {
   data: string;
 }
  
+export interface ResourceUsage {
+  user_time: number;
+  sys_time: number;
+  cpu_time: number;
+  max_rss_kb: number;
+  voluntary_ctx_switches: number;
+  involuntary_ctx_switches: number;
+  io_write_bytes: number;
+  output_bytes: number;
+  memory_peak_kb?: number;
+  cpu_throttled_time?: number;
+  oom_killed: boolean;
+}
+
 export interface WebSocketCompleteMessage {
   type: 'complete';
   exit_code: number;
   execution_time: number;
+  resources?: ResourceUsage;
+}
+
+export interface WebSocketResourcesMessage {
+  type: 'resources';
+  elapsed: number;
+  cpu_time: number;
+  rss_kb: number;
+  processes: number;
 }
  
 export interface WebSocketErrorMessage {
@@ -31,4 +55,5 @@ export interface WebSocketErrorMessage {
 export type WebSocketMessage =
   | WebSocketOutputMessage
   | WebSocketCompleteMessage
+  | WebSocketResourcesMessage
   | WebSocketErrorMessage;